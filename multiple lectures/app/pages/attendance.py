@@ -9,6 +9,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from services.auth import get_auth
+from services.retention import RetentionJob
 from services.storage import get_storage
 from services.ui_theme import get_theme_manager
 import plotly.express as px
@@ -53,8 +54,18 @@ def show_student_attendance():
     
     st.title("📅 My Attendance")
     
-    # Get student's attendance records
-    attendance_records = storage.get_attendance(student_id=user['user_id'])
+    # Get student's attendance records; the archive tier is only read on request
+    retention = RetentionJob(storage)
+    show_archived = st.checkbox(
+        "🗄️ Show older history",
+        key="attendance_show_archived",
+        help=f"Include attendance archived after {retention.archive_after_days} days"
+    )
+    attendance_records = storage.get_attendance(
+        student_id=user['user_id'],
+        include_archive=show_archived,
+        archive_since=retention.identifiable_since() if show_archived else None
+    )
     
     if not attendance_records:
         st.info("📝 No attendance records yet. Attend lectures to see your attendance.")
@@ -137,6 +148,36 @@ def show_student_attendance():
         st.dataframe(df, use_container_width=True)
 
 
+def get_course_attendance(storage, course_id: str, include_archive: bool = False):
+    """
+    Get (lectures, {lecture_id: attendance records}) for a course.
+    Cached in the session and rebuilt only when lectures or attendance change.
+    """
+    versions = storage.get_collection_versions('lectures', 'attendance')
+    views = st.session_state.setdefault('course_attendance_views', {})
+    cached = views.get((course_id, include_archive))
+    if cached and cached[0] == versions:
+        return cached[1]
+    
+    lectures = storage.get_course_lectures(course_id)
+    by_lecture = {
+        lecture['lecture_id']: storage.get_attendance(lecture_id=lecture['lecture_id'])
+        for lecture in lectures
+    }
+    
+    # Archived records on request: one archive read for all lectures, skipping
+    # months before the course's first lecture was created
+    if include_archive and lectures:
+        since = min((lecture['created_at'] for lecture in lectures if lecture.get('created_at')),
+                    default=None)
+        hot_ids = {record['attendance_id'] for records in by_lecture.values() for record in records}
+        for record in storage.query_archive('attendance', since=since):
+            if record.get('lecture_id') in by_lecture and record['attendance_id'] not in hot_ids:
+                by_lecture[record['lecture_id']].append(record)
+    views[(course_id, include_archive)] = (versions, (lectures, by_lecture))
+    return lectures, by_lecture
+
+
 def show_teacher_attendance():
     """Show attendance overview for teacher"""
     storage = get_storage()
@@ -162,8 +203,13 @@ def show_teacher_attendance():
     course = courses[selected_course]
     st.markdown(f"### 📖 {course['name']}")
     
-    # Get lectures for this course
-    lectures = storage.get_course_lectures(selected_course)
+    # Get lectures and their attendance (re-read only after a change)
+    show_archived = st.checkbox(
+        "🗄️ Show older history",
+        key="course_attendance_show_archived",
+        help="Include attendance moved to the archive tier"
+    )
+    lectures, attendance_by_lecture = get_course_attendance(storage, selected_course, show_archived)
     
     if not lectures:
         st.info("📝 No lectures available yet.")
@@ -172,8 +218,7 @@ def show_teacher_attendance():
     # Get attendance for all students in this course
     all_attendance = []
     for lecture in lectures:
-        lecture_attendance = storage.get_attendance(lecture_id=lecture['lecture_id'])
-        all_attendance.extend(lecture_attendance)
+        all_attendance.extend(attendance_by_lecture[lecture['lecture_id']])
     
     if not all_attendance:
         st.info("📝 No attendance records yet.")
@@ -203,7 +248,7 @@ def show_teacher_attendance():
     st.markdown("### 📊 Attendance by Lecture")
     
     for lecture in lectures:
-        lecture_attendance = storage.get_attendance(lecture_id=lecture['lecture_id'])
+        lecture_attendance = attendance_by_lecture[lecture['lecture_id']]
         
         with st.expander(f"🎥 {lecture['title']}", expanded=False):
             if lecture_attendance:
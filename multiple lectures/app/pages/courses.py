@@ -380,8 +380,8 @@ def show_manage_students_form():
                     
                     with col2:
                         if st.button("❌ Remove", key=f"remove_{student_id}"):
-                            enrolled_ids.remove(student_id)
-                            storage.update_course(course_id, {'enrolled_students': enrolled_ids})
+                            remaining = [sid for sid in enrolled_ids if sid != student_id]
+                            storage.update_course(course_id, {'enrolled_students': remaining})
                             st.success(f"Removed {student['username']}")
                             st.rerun()
         else:
@@ -414,8 +414,8 @@ def show_manage_students_form():
                     
                     with col2:
                         if st.button("➕ Add", key=f"add_{student_id}"):
-                            enrolled_ids.append(student_id)
-                            storage.update_course(course_id, {'enrolled_students': enrolled_ids})
+                            storage.update_course(
+                                course_id, {'enrolled_students': [*enrolled_ids, student_id]})
                             st.success(f"Added {student['username']}")
                             st.rerun()
             else:
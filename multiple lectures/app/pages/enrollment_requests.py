@@ -13,6 +13,25 @@ from services.auth import get_auth
 from datetime import datetime
 
 
+def get_course_requests(storage, course_ids) -> dict:
+    """
+    Get {status: {request_id: request}} for the given courses.
+    Cached in the session and rebuilt only when enrollment requests change.
+    """
+    key = (storage.get_collection_version('enrollment_requests'), tuple(sorted(course_ids)))
+    cached = st.session_state.get('enrollment_requests_view')
+    if cached and cached[0] == key:
+        return cached[1]
+    
+    grouped = {'pending': {}, 'approved': {}, 'rejected': {}}
+    for request_id, request in storage.get_enrollment_requests().items():
+        if request.get('course_id') in course_ids and request.get('status') in grouped:
+            grouped[request['status']][request_id] = request
+    
+    st.session_state.enrollment_requests_view = (key, grouped)
+    return grouped
+
+
 def main():
     """Main enrollment requests page"""
     
@@ -42,25 +61,40 @@ def main():
         st.info("You don't have any courses yet.")
         st.stop()
     
+    course_ids = list(courses.keys())
+    requests = get_course_requests(storage, course_ids)
+    
     # Tabs for pending and processed requests
     tab1, tab2 = st.tabs(["⏳ Pending Requests", "✅ Processed Requests"])
     
     with tab1:
         st.subheader("Pending Enrollment Requests")
         
-        # Get pending requests for teacher's courses
-        all_pending = storage.get_enrollment_requests(status='pending')
-        
-        # Filter by teacher's courses
-        course_ids = list(courses.keys())
-        pending_requests = {
-            rid: r for rid, r in all_pending.items() 
-            if r.get('course_id') in course_ids
-        }
+        # Pending requests for teacher's courses
+        pending_requests = requests['pending']
         
         if pending_requests:
             st.markdown(f"**{len(pending_requests)} pending requests**")
-            
+
+            # Bulk actions: every request and enrollment is written in one batch
+            bulk_col1, bulk_col2, _ = st.columns([1, 1, 4])
+            with bulk_col1:
+                approve_all = st.button("✅ Approve All", key="approve_all",
+                                        use_container_width=True)
+            with bulk_col2:
+                reject_all = st.button("❌ Reject All", key="reject_all",
+                                       use_container_width=True)
+
+            if approve_all or reject_all:
+                status = 'approved' if approve_all else 'rejected'
+                with storage.batch():
+                    processed = sum(
+                        1 for request_id in pending_requests
+                        if storage.update_enrollment_request(request_id, status, user['user_id'])
+                    )
+                st.success(f"Processed {processed} requests ({status})")
+                st.rerun()
+
             for request_id, request in pending_requests.items():
                 course_id = request.get('course_id')
                 student_id = request.get('student_id')
@@ -120,20 +154,9 @@ def main():
     with tab2:
         st.subheader("Processed Requests")
         
-        # Get processed requests
-        approved_requests = storage.get_enrollment_requests(status='approved')
-        rejected_requests = storage.get_enrollment_requests(status='rejected')
-        
-        # Filter by teacher's courses
-        course_ids = list(courses.keys())
-        approved = {
-            rid: r for rid, r in approved_requests.items() 
-            if r.get('course_id') in course_ids
-        }
-        rejected = {
-            rid: r for rid, r in rejected_requests.items() 
-            if r.get('course_id') in course_ids
-        }
+        # Processed requests for teacher's courses
+        approved = requests['approved']
+        rejected = requests['rejected']
         
         # Display approved
         if approved:
@@ -161,18 +184,11 @@ def main():
     # Summary statistics
     st.sidebar.markdown("### 📊 Request Statistics")
     
-    all_pending = storage.get_enrollment_requests(status='pending')
-    pending_count = len([r for r in all_pending.values() if r.get('course_id') in course_ids])
-    
-    all_approved = storage.get_enrollment_requests(status='approved')
-    approved_count = len([r for r in all_approved.values() if r.get('course_id') in course_ids])
-    
-    all_rejected = storage.get_enrollment_requests(status='rejected')
-    rejected_count = len([r for r in all_rejected.values() if r.get('course_id') in course_ids])
-    
-    st.sidebar.metric("⏳ Pending", pending_count)
-    st.sidebar.metric("✅ Approved", approved_count)
-    st.sidebar.metric("❌ Rejected", rejected_count)
+    # Counts come from the same cached view (the tabs above may have just written)
+    requests = get_course_requests(storage, course_ids)
+    st.sidebar.metric("⏳ Pending", len(requests['pending']))
+    st.sidebar.metric("✅ Approved", len(requests['approved']))
+    st.sidebar.metric("❌ Rejected", len(requests['rejected']))
 
 
 if __name__ == "__main__":
@@ -10,11 +10,12 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from services.auth import get_auth
+from services.retention import RetentionJob
 from services.storage import get_storage
-from services.pip_webcam_live import render_pip_webcam, render_engagement_sidebar
 from services.behavioral_logger import get_behavioral_logger, cleanup_logger
 from services.anti_cheating import get_anti_cheating_monitor, cleanup_monitor, render_integrity_widget, check_browser_visibility
 from services.pdf_reader import get_pdf_reader
+from services.registry import get_service
 from datetime import datetime
 import uuid
 import re
@@ -174,6 +175,9 @@ def show_lecture_player(lecture):
         st.markdown("**🎥 Webcam Tracking:**")
         
         try:
+            # The webcam stack (WebRTC, OpenCV, MediaPipe) loads with the first player
+            from services.pip_webcam_live import render_pip_webcam, render_engagement_sidebar
+            
             # Render PiP webcam (bottom-right, always visible)
             pip_webcam = render_pip_webcam(lecture_id, course_id, student_id)
             
@@ -388,8 +392,7 @@ def show_lecture_player(lecture):
                 """.strip()
                 
                 # Perform NLP analysis
-                from services.nlp import get_nlp_service
-                nlp_service = get_nlp_service()
+                nlp_service = get_service('nlp')
                 sentiment_analysis = nlp_service.analyze_sentiment(combined_text)
                 keywords = nlp_service.extract_keywords(combined_text, top_n=10)
                 themes = nlp_service.detect_themes(combined_text)
@@ -476,15 +479,32 @@ def show_lecture_player(lecture):
         st.rerun()
 
 
-def render_lecture_card(lecture, course, user):
+def get_student_lecture_logs(storage, student_id: str, include_archive: bool = False) -> dict:
+    """
+    A student's engagement sessions grouped by lecture, oldest first; one
+    query for the whole list. With include_archive, sessions moved to the
+    archive tier are added so lectures watched long ago count as watched.
+    """
+    since = RetentionJob(storage).identifiable_since() if include_archive else None
+    by_lecture = {}
+    for log in storage.get_engagement_logs(student_id=student_id, include_archive=include_archive,
+                                           archive_since=since):
+        by_lecture.setdefault(log.get('lecture_id'), []).append(log)
+    for logs in by_lecture.values():
+        logs.sort(key=lambda log: log.get('created_at') or '')
+    return by_lecture
+
+
+def render_lecture_card(lecture, course, user, engagement_logs=None):
     """Render a lecture card with Streamlit native components"""
     storage = get_storage()
     
     # Check if student has watched
-    engagement_logs = storage.get_engagement_logs(
-        student_id=user['user_id'],
-        lecture_id=lecture['lecture_id']
-    )
+    if engagement_logs is None:
+        engagement_logs = storage.get_engagement_logs(
+            student_id=user['user_id'],
+            lecture_id=lecture['lecture_id']
+        )
     
     has_watched = len(engagement_logs) > 0
     latest_engagement = engagement_logs[-1] if engagement_logs else None
@@ -587,12 +607,12 @@ def show_lecture_list(course_id):
     user = st.session_state.user
     watched_count = 0
     total_engagement = 0
+    show_archived = st.checkbox("🗄️ Show older history", key="lecture_show_archived",
+                                help="Count sessions moved to the archive tier as watched")
+    logs_by_lecture = get_student_lecture_logs(storage, user['user_id'], show_archived)
     
     for lecture in lectures:
-        engagement_logs = storage.get_engagement_logs(
-            student_id=user['user_id'],
-            lecture_id=lecture['lecture_id']
-        )
+        engagement_logs = logs_by_lecture.get(lecture['lecture_id'])
         if engagement_logs:
             watched_count += 1
             total_engagement += engagement_logs[-1].get('engagement_score', 0)
@@ -631,12 +651,12 @@ def show_lecture_list(course_id):
     if filter_option == "Watched":
         filtered_lectures = [
             lec for lec in filtered_lectures
-            if storage.get_engagement_logs(user['user_id'], lec['lecture_id'])
+            if logs_by_lecture.get(lec['lecture_id'])
         ]
     elif filter_option == "Not Watched":
         filtered_lectures = [
             lec for lec in filtered_lectures
-            if not storage.get_engagement_logs(user['user_id'], lec['lecture_id'])
+            if not logs_by_lecture.get(lec['lecture_id'])
         ]
     
     st.markdown("---")
@@ -647,7 +667,8 @@ def show_lecture_list(course_id):
     else:
         st.subheader(f"🎥 Lectures ({len(filtered_lectures)})")
         for lecture in filtered_lectures:
-            render_lecture_card(lecture, course, user)
+            engagement_logs = logs_by_lecture.get(lecture['lecture_id'], [])
+            render_lecture_card(lecture, course, user, engagement_logs)
 
 
 def main():
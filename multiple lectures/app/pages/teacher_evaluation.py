@@ -9,8 +9,8 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from services.auth import get_auth
-from services.storage import get_storage
-from services.nlp import get_nlp_service
+from services.storage import get_storage, summarize_rating_stats
+from services.registry import get_service
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
@@ -166,13 +166,84 @@ def render_feedback_timeline(feedbacks: list):
     return fig
 
 
+def render_bucket_timeline(buckets: dict, period: str):
+    """Render rating/sentiment trends from the evaluation's daily or weekly buckets"""
+    if not buckets:
+        return None
+    
+    periods = sorted(buckets)
+    ratings = []
+    spreads = []
+    sentiments = []
+    for key in periods:
+        stats = summarize_rating_stats(buckets[key])
+        ratings.append(stats['mean'])
+        spreads.append(stats['std'])
+        sentiments.append(buckets[key]['sentiment_sum'] / buckets[key]['count'])
+    
+    fig = go.Figure()
+    
+    fig.add_trace(go.Scatter(
+        x=periods,
+        y=ratings,
+        error_y=dict(type='data', array=spreads, visible=True),
+        mode='lines+markers',
+        name='Composite Rating',
+        line=dict(color='blue', width=2),
+        yaxis='y1'
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=periods,
+        y=sentiments,
+        mode='lines+markers',
+        name='Sentiment Score',
+        line=dict(color='green', width=2, dash='dash'),
+        yaxis='y2'
+    ))
+    
+    fig.update_layout(
+        title=f"Feedback Trends ({period})",
+        xaxis=dict(title=period, type='category'),
+        yaxis=dict(title="Rating (1-5)", side='left', range=[0, 5]),
+        yaxis2=dict(title="Sentiment (-1 to 1)", side='right', overlaying='y', range=[-1, 1]),
+        height=350,
+        hovermode='x unified'
+    )
+    
+    return fig
+
+
+def get_evaluation_view(storage, nlp_service, teacher_id: str) -> dict:
+    """
+    Get a teacher's evaluation, feedback and NLP aggregate.
+    Cached in the session and rebuilt only when the underlying collections
+    change, so idle reruns skip the feedback walk and the NLP pass.
+    """
+    versions = storage.get_collection_versions('courses', 'lectures', 'feedback', 'evaluation')
+    views = st.session_state.setdefault('teacher_evaluation_views', {})
+    cached = views.get(teacher_id)
+    if cached and cached[0] == versions:
+        return cached[1]
+    
+    teacher_feedback = storage.get_teacher_feedback(teacher_id)
+    view = {
+        'evaluation': storage.get_teacher_evaluation(teacher_id),
+        'feedback': teacher_feedback,
+        'nlp_aggregate': (nlp_service.analyze_feedback_aggregate(teacher_feedback)
+                          if teacher_feedback else None)
+    }
+    views[teacher_id] = (versions, view)
+    return view
+
+
 def show_teacher_evaluation():
     """Display comprehensive teacher evaluation dashboard"""
     st.title("👨‍🏫 Teacher Evaluation Dashboard")
     st.markdown("### Comprehensive Analytics and Student Feedback")
     
     storage = get_storage()
-    nlp_service = get_nlp_service()
+    nlp_service = get_service('nlp')
     user = st.session_state.user
     
     # Determine which teacher to show
@@ -201,8 +272,9 @@ def show_teacher_evaluation():
     st.markdown("---")
     
     # Get teacher evaluation data
-    eval_data = storage.get_teacher_evaluation(selected_teacher_id)
-    teacher_feedback = storage.get_teacher_feedback(selected_teacher_id)
+    view = get_evaluation_view(storage, nlp_service, selected_teacher_id)
+    eval_data = view['evaluation']
+    teacher_feedback = view['feedback']
     
     if not eval_data or not teacher_feedback:
         st.info("📊 No feedback data available yet. Students haven't submitted feedback for your lectures.")
@@ -294,7 +366,12 @@ def show_teacher_evaluation():
     
     # Feedback Timeline
     st.markdown("## 📅 Performance Trends")
-    fig_timeline = render_feedback_timeline(teacher_feedback)
+    if eval_data.get('daily'):
+        period = st.radio("Group by", ["Daily", "Weekly"], horizontal=True, key="trend_period")
+        buckets = eval_data['daily' if period == "Daily" else 'weekly']
+        fig_timeline = render_bucket_timeline(buckets, period)
+    else:
+        fig_timeline = render_feedback_timeline(teacher_feedback)
     if fig_timeline:
         st.plotly_chart(fig_timeline, use_container_width=True)
     
@@ -304,7 +381,7 @@ def show_teacher_evaluation():
     st.markdown("## 🤖 AI-Powered Feedback Analysis")
     
     # Aggregate NLP analysis
-    nlp_aggregate = nlp_service.analyze_feedback_aggregate(teacher_feedback)
+    nlp_aggregate = view['nlp_aggregate']
     
     col1, col2 = st.columns(2)
     
@@ -339,10 +416,12 @@ def show_teacher_evaluation():
     for course_id, course_eval in eval_data['feedback_by_course'].items():
         course = storage.get_course(course_id)
         if course:
+            spread = summarize_rating_stats(course_eval)['std'] if 'sum_sq' in course_eval else None
             course_data.append({
                 'Course': course['name'],
                 'Feedback Count': course_eval['count'],
-                'Average Rating': f"{course_eval['avg_composite']:.2f}"
+                'Average Rating': f"{course_eval['avg_composite']:.2f}",
+                'Rating Spread': f"±{spread:.2f}" if spread is not None else "-"
             })
     
     if course_data:
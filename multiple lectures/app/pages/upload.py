@@ -569,10 +569,8 @@ def show_create_quiz():
                     'created_by': user['user_id']
                 })
                 
-                # Update lecture (need to implement update_lecture in storage)
-                lectures_data = storage._read_json(storage.storage_paths['lectures'])
-                lectures_data[selected_lecture]['quizzes'] = quizzes
-                storage._write_json(storage.storage_paths['lectures'], lectures_data)
+                # Update lecture
+                storage.update_lecture(selected_lecture, {'quizzes': quizzes})
                 
                 # Log teacher activity
                 storage.log_teacher_activity(
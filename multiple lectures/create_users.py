@@ -59,45 +59,49 @@ def create_initial_users():
     print("=" * 60)
     print()
     
+    # Hash the passwords before taking the users.json lock: bcrypt is slow
+    # and logins would wait on it
     for user_data in users_to_create:
-        user_id = user_data.pop('user_id')
-        username = user_data['username']
-        password = user_data.pop('password')
-        role = user_data['role']
-        
-        # Hash the password
-        password_hash = auth.hash_password(password)
-        
-        # Create user
-        success = storage.create_user(
-            user_id=user_id,
-            username=username,
-            password_hash=password_hash,
-            role=role,
-            email=user_data.get('email'),
-            full_name=user_data.get('full_name'),
-            department=user_data.get('department'),
-            qualification=user_data.get('qualification'),
-            specialization=user_data.get('specialization'),
-            year=user_data.get('year'),
-            semester=user_data.get('semester'),
-            enrollment_number=user_data.get('enrollment_number')
-        )
-        
-        if success:
-            print(f"✅ Created {role.upper()} account:")
-            print(f"   Username: {username}")
-            print(f"   User ID: {user_id}")
-            print(f"   Email: {user_data.get('email', 'N/A')}")
-            if role == 'teacher':
-                print(f"   Qualification: {user_data.get('qualification', 'N/A')}")
-            elif role == 'student':
-                print(f"   Enrollment: {user_data.get('enrollment_number', 'N/A')}")
-            print()
-        else:
-            print(f"❌ Failed to create {role} account: {username}")
-            print(f"   (User may already exist)")
-            print()
+        user_data['password_hash'] = auth.hash_password(user_data.pop('password'))
+    
+    # One write to users.json for the whole list
+    with storage.batch():
+        for user_data in users_to_create:
+            user_id = user_data.pop('user_id')
+            username = user_data['username']
+            password_hash = user_data.pop('password_hash')
+            role = user_data['role']
+            
+            # Create user
+            success = storage.create_user(
+                user_id=user_id,
+                username=username,
+                password_hash=password_hash,
+                role=role,
+                email=user_data.get('email'),
+                full_name=user_data.get('full_name'),
+                department=user_data.get('department'),
+                qualification=user_data.get('qualification'),
+                specialization=user_data.get('specialization'),
+                year=user_data.get('year'),
+                semester=user_data.get('semester'),
+                enrollment_number=user_data.get('enrollment_number')
+            )
+            
+            if success:
+                print(f"✅ Created {role.upper()} account:")
+                print(f"   Username: {username}")
+                print(f"   User ID: {user_id}")
+                print(f"   Email: {user_data.get('email', 'N/A')}")
+                if role == 'teacher':
+                    print(f"   Qualification: {user_data.get('qualification', 'N/A')}")
+                elif role == 'student':
+                    print(f"   Enrollment: {user_data.get('enrollment_number', 'N/A')}")
+                print()
+            else:
+                print(f"❌ Failed to create {role} account: {username}")
+                print(f"   (User may already exist)")
+                print()
     
     print("=" * 60)
     print("User Creation Complete!")
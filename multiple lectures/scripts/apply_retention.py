@@ -0,0 +1,47 @@
+"""
+Smart LMS - Data Retention
+Archive, anonymize and delete old data according to the privacy config
+
+Usage:
+    python scripts/apply_retention.py [--config config.yaml]
+
+Uses privacy.archive_after_days, anonymize_after_days and
+data_retention_days from config.yaml. Safe to re-run; schedule it daily
+(e.g. from cron).
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+from services.storage import create_storage_service
+from services.retention import RetentionJob
+
+
+def main():
+    """Apply the retention policy once"""
+    parser = argparse.ArgumentParser(description="Apply the privacy retention policy")
+    parser.add_argument('--config', default='config.yaml', help="Path to config.yaml")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🗄️  Smart LMS Data Retention")
+    print("=" * 60)
+
+    job = RetentionJob(create_storage_service(args.config))
+    print(f"📦 Archive after {job.archive_after_days} days, anonymize after "
+          f"{job.anonymize_after_days} days, delete after {job.retention_days} days")
+
+    report = job.run()
+
+    for name, counts in report.items():
+        print(f"   ✅ {name}: {counts['archived']} archived, "
+              f"{counts['anonymized']} anonymized, {counts['deleted']} deleted")
+
+    print()
+    print("✅ Retention complete!")
+
+
+if __name__ == "__main__":
+    main()
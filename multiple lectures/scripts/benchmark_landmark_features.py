@@ -0,0 +1,256 @@
+"""
+Smart LMS - Landmark Feature Benchmark
+Per-frame cost of OpenFaceProcessor's gaze, head pose, AU and expression features
+
+Usage:
+    python scripts/benchmark_landmark_features.py [--frames 2000] [--batch 500] [--seed 42]
+
+Runs on synthetic MediaPipe-like landmarks (no camera, no MediaPipe), so
+only feature extraction is timed. "before" is the original per-landmark
+attribute implementation, kept below as the reference; "after" is
+OpenFaceProcessor.extract_features, called once per frame (live
+processing, plain-float path) and once per batch (offline scoring,
+vectorized path). All must produce the same features, which is checked
+before anything is timed, along with AU rounding on exact ties.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from services.openface_processor import (
+    AU_COLUMNS, EXPRESSION_COLUMNS, FEATURE_COLUMNS, FEATURE_DIGITS, GAZE_COLUMNS, NUM_LANDMARKS,
+    OpenFaceProcessor, landmarks_to_array, round_exact
+)
+
+FRAME_WIDTH, FRAME_HEIGHT = 640, 480
+
+
+def synthetic_landmarks(frames: int, seed: int) -> np.ndarray:
+    """(frames, 478, 3) landmarks jittered around a neutral face"""
+    rng = np.random.default_rng(seed)
+    face = rng.uniform([0.35, 0.3, -0.05], [0.65, 0.75, 0.05], size=(NUM_LANDMARKS, 3))
+    # Put the pose landmarks where a frontal face has them so solvePnP converges
+    face[[1, 152, 33, 263, 61, 291], :2] = [(0.5, 0.5), (0.5, 0.72), (0.42, 0.4),
+                                            (0.58, 0.4), (0.45, 0.6), (0.55, 0.6)]
+    return face + rng.normal(0, 0.004, size=(frames, NUM_LANDMARKS, 3))
+
+
+def to_mediapipe(points: np.ndarray) -> list:
+    """Landmark objects with .x/.y/.z, like results.multi_face_landmarks[0].landmark"""
+    return [SimpleNamespace(x=x, y=y, z=z) for x, y, z in points.tolist()]
+
+
+# ==================== REFERENCE (BEFORE) ====================
+
+def reference_features(landmarks, w: int, h: int) -> dict:
+    """Original per-attribute feature extraction"""
+    features = reference_landmark_features(landmarks)
+    features.update(reference_head_pose(landmarks, w, h))
+    return features
+
+
+def reference_landmark_features(landmarks) -> dict:
+    """Original gaze, AU and expression features"""
+    lm = landmarks
+
+    # Gaze
+    left_eye_center = np.array([(lm[33].x + lm[133].x) / 2, (lm[33].y + lm[133].y) / 2,
+                                (lm[33].z + lm[133].z) / 2])
+    right_eye_center = np.array([(lm[263].x + lm[362].x) / 2, (lm[263].y + lm[362].y) / 2,
+                                 (lm[263].z + lm[362].z) / 2])
+    gaze_0 = np.array([lm[468].x, lm[468].y, lm[468].z]) - left_eye_center
+    gaze_1 = np.array([lm[473].x, lm[473].y, lm[473].z]) - right_eye_center
+    gaze_angle_x = np.mean([np.arctan2(gaze_0[0], gaze_0[2]),
+                            np.arctan2(gaze_1[0], gaze_1[2])]) * 180 / np.pi
+    gaze_angle_y = np.mean([np.arctan2(gaze_0[1], gaze_0[2]),
+                            np.arctan2(gaze_1[1], gaze_1[2])]) * 180 / np.pi
+    features = {
+        'gaze_0_x': round(gaze_0[0], 4), 'gaze_0_y': round(gaze_0[1], 4),
+        'gaze_0_z': round(gaze_0[2], 4),
+        'gaze_1_x': round(gaze_1[0], 4), 'gaze_1_y': round(gaze_1[1], 4),
+        'gaze_1_z': round(gaze_1[2], 4),
+        'gaze_angle_x': round(gaze_angle_x, 2), 'gaze_angle_y': round(gaze_angle_y, 2)
+    }
+
+    # Action Units
+    eye_openness = abs(lm[159].y - lm[145].y)
+    mouth_width = abs(lm[61].x - lm[291].x)
+    lip_distance = abs(lm[0].y - lm[17].y)
+    au01 = abs(lm[70].y - lm[159].y) * 100
+    au05 = eye_openness * 150
+    au12 = mouth_width * 30
+    raw = {
+        '01': au01, '02': abs(lm[46].y - lm[159].y) * 100, '04': max(0, 5 - au01), '05': au05,
+        '06': abs(lm[205].y - lm[145].y) * 50, '07': max(0, 5 - au05),
+        '09': abs(lm[1].y - lm[6].y) * 30,
+        '10': abs(lm[13].y - lm[2].y) * 80, '12': au12, '14': au12 * 0.7, '15': max(0, 5 - au12),
+        '17': abs(lm[152].y - lm[14].y) * 80, '20': mouth_width * 25,
+        '23': max(0, 5 - lip_distance * 100),
+        '25': lip_distance * 100, '26': abs(lm[152].y - lm[1].y) * 30,
+        '45': 5 if eye_openness < 0.01 else 0
+    }
+    aus = {f'AU{code}_r': round(min(5.0, max(0.0, value)), 2) for code, value in raw.items()}
+    features.update(aus)
+
+    # Expressions
+    features.update({
+        'smile_intensity': round((aus['AU06_r'] + aus['AU12_r']) / 2, 2),
+        'confusion_level': round((aus['AU01_r'] + aus['AU02_r'] + aus['AU04_r']) / 3, 2),
+        'drowsiness_level': round(max(0, aus['AU07_r'] + aus['AU45_r'] - aus['AU05_r']), 2)
+    })
+    return features
+
+
+def reference_head_pose(landmarks, w: int, h: int) -> dict:
+    """Original solvePnP head pose"""
+    lm = landmarks
+    model_points = np.array([(0.0, 0.0, 0.0), (0.0, -330.0, -65.0), (-225.0, 170.0, -135.0),
+                             (225.0, 170.0, -135.0), (-150.0, -150.0, -125.0),
+                             (150.0, -150.0, -125.0)])
+    image_points = np.array([(lm[i].x * w, lm[i].y * h) for i in (1, 152, 33, 263, 61, 291)],
+                            dtype="double")
+    camera_matrix = np.array([[w, 0, w / 2], [0, w, h / 2], [0, 0, 1]], dtype="double")
+    _, rotation_vec, translation_vec = cv2.solvePnP(model_points, image_points, camera_matrix,
+                                                    np.zeros((4, 1)), flags=cv2.SOLVEPNP_ITERATIVE)
+    rotation_mat, _ = cv2.Rodrigues(rotation_vec)
+    euler_angles = cv2.decomposeProjectionMatrix(cv2.hconcat((rotation_mat, translation_vec)))[6]
+    pitch, yaw, roll = euler_angles.flatten()[:3]
+    return {
+        'pose_Tx': round(translation_vec[0][0], 2), 'pose_Ty': round(translation_vec[1][0], 2),
+        'pose_Tz': round(translation_vec[2][0], 2),
+        'pose_Rx': round(pitch, 2), 'pose_Ry': round(yaw, 2), 'pose_Rz': round(roll, 2)
+    }
+
+
+# ==================== TIMING ====================
+
+def time_per_frame(function, items) -> float:
+    """Mean milliseconds per item"""
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return (time.perf_counter() - start) * 1000 / len(items)
+
+
+def check_equivalent(frames: list, points: np.ndarray) -> int:
+    """Compare before/after features (per frame and batched); returns the mismatch count"""
+    mismatches = 0
+    batched = OpenFaceProcessor.extract_features(points, FRAME_WIDTH, FRAME_HEIGHT)
+    for landmarks, frame_points, after_batch in zip(frames, points, batched):
+        before = reference_features(landmarks, FRAME_WIDTH, FRAME_HEIGHT)
+        after_frame = OpenFaceProcessor.extract_features(frame_points, FRAME_WIDTH, FRAME_HEIGHT)[0]
+        for column in FEATURE_COLUMNS:
+            if not before[column] == after_frame[column] == after_batch[column]:
+                mismatches += 1
+                print(f"   ⚠️  {column}: before {before[column]} "
+                      f"after {after_frame[column]} / {after_batch[column]}")
+    return mismatches
+
+
+def check_tie_rounding() -> int:
+    """
+    AUs are rounded before the expression features read them, so their
+    rounding has to match round() on exact ties too (3.185 -> 3.19), which
+    random landmarks practically never hit. Returns the number of mismatches.
+    """
+    values = np.round(np.arange(0, 5.0005, 0.001), 3)
+    return sum(round(value, 2) != rounded
+               for value, rounded in zip(values.tolist(), round_exact(values, 2).tolist()))
+
+
+def main():
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark landmark feature extraction")
+    parser.add_argument('--frames', type=int, default=2000, help="Frames to time")
+    parser.add_argument('--batch', type=int, default=500, help="Frames per offline batch")
+    parser.add_argument('--seed', type=int, default=42,
+                        help="Random seed for the synthetic landmarks")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📐 Smart LMS Landmark Feature Benchmark")
+    print("=" * 60)
+
+    points = synthetic_landmarks(args.frames, args.seed)
+    frames = [to_mediapipe(frame) for frame in points]
+
+    print(f"\n🔍 Checking before/after equivalence on {min(200, args.frames)} frames...")
+    mismatches = check_equivalent(frames[:200], points[:200])
+    if mismatches:
+        print(f"   ❌ {mismatches} mismatching values")
+    else:
+        print("   ✅ features match")
+    tie_mismatches = check_tie_rounding()
+    if tie_mismatches:
+        print(f"   ❌ {tie_mismatches} ties rounded differently")
+    else:
+        print("   ✅ AU tie rounding matches")
+    mismatches += tie_mismatches
+
+    processor = OpenFaceProcessor
+    w, h = FRAME_WIDTH, FRAME_HEIGHT
+
+    # extract_features without the head pose, down to the rounded dicts
+    columns = GAZE_COLUMNS + AU_COLUMNS + EXPRESSION_COLUMNS
+    digits = [FEATURE_DIGITS[FEATURE_COLUMNS.index(column)] for column in columns]
+
+    def single_landmark_features(points):
+        values = processor._extract_landmark_features_single(points)
+        return dict(zip(columns, map(round, values, digits)))
+
+    def vectorized_landmark_features(points):
+        points = points.reshape(-1, NUM_LANDMARKS, 3)
+        action_units = processor._extract_action_units(points)
+        rows = np.concatenate([processor._extract_gaze_features(points), action_units,
+                               processor._extract_expression_features(action_units)], axis=-1)
+        return [dict(zip(columns, map(round, row, digits))) for row in rows.tolist()]
+
+    pose_state = {}
+    batches = [points[i:i + args.batch] for i in range(0, args.frames, args.batch)]
+    per_batch = len(batches) / args.frames
+    rows = [
+        ("all features", [
+            ("before", time_per_frame(lambda lm: reference_features(lm, w, h), frames)),
+            ("after, per frame", time_per_frame(
+                lambda lm: processor.extract_features(landmarks_to_array(lm), w, h), frames)),
+            (f"after, batches of {args.batch}", time_per_frame(
+                lambda batch: processor.extract_features(batch, w, h), batches) * per_batch)
+        ]),
+        ("gaze + AUs + expressions", [
+            ("before", time_per_frame(reference_landmark_features, frames)),
+            ("after, per frame", time_per_frame(
+                lambda lm: single_landmark_features(landmarks_to_array(lm)), frames)),
+            (f"after, batches of {args.batch}",
+             time_per_frame(vectorized_landmark_features, batches) * per_batch)
+        ]),
+        # solvePnP runs once per frame either way; live sessions start each
+        # solve from the previous pose
+        ("head pose (solvePnP)", [
+            ("before", time_per_frame(lambda lm: reference_head_pose(lm, w, h), frames)),
+            ("after", time_per_frame(lambda p: processor._extract_head_pose(p, w, h), points)),
+            ("after, seeded (live)", time_per_frame(
+                lambda p: processor._extract_head_pose(p, w, h, pose_state), points))
+        ])
+    ]
+
+    print(f"\n⏱️  Per-frame time over {args.frames} frames")
+    for group, timings in rows:
+        print(f"\n   {group}")
+        before_ms = timings[0][1]
+        for label, ms in timings:
+            speedup = f"({before_ms / ms:.1f}x)" if label != "before" else ""
+            print(f"      {label:28s} {ms:8.3f} ms  {speedup}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
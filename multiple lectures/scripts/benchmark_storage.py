@@ -0,0 +1,738 @@
+"""
+Smart LMS - Storage Benchmark
+Time every public storage method against synthetic datasets of several sizes
+
+Usage:
+    python scripts/benchmark_storage.py [--sizes small,medium] [--backend json|sqlite]
+                                        [--set students=5000 --set feedback=20000]
+                                        [--output results.json] [--baseline baseline.json]
+
+Each size runs in a fresh process against a throw-away copy of the storage
+configuration (real data is never touched). The generated data only depends
+on --seed, so runs on different commits see identical datasets. For every
+method the report shows latency percentiles, bytes read/written per call
+(Linux /proc/self/io, includes page-cache hits) and how much it grew the
+process's peak RSS. Results are written as JSON; pass an earlier results
+file as --baseline to flag regressions.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import inspect
+import json
+import multiprocessing
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import yaml
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Record counts per dataset size ('lectures' is the total across courses)
+SIZES = {
+    'small': {'teachers': 5, 'courses': 10, 'students': 200, 'lectures': 100,
+              'engagement_logs': 2000, 'feedback': 1000, 'grades': 2000, 'attendance': 2000},
+    'medium': {'teachers': 20, 'courses': 50, 'students': 2000, 'lectures': 1000,
+               'engagement_logs': 20000, 'feedback': 10000, 'grades': 20000, 'attendance': 20000},
+    'large': {'teachers': 100, 'courses': 200, 'students': 10000, 'lectures': 6000,
+              'engagement_logs': 100000, 'feedback': 50000, 'grades': 100000, 'attendance': 100000},
+}
+
+# Synthetic timestamps fall in the year before this date
+BASE_TIME = datetime(2025, 1, 1)
+TIME_WINDOW_SECONDS = 365 * 24 * 3600
+
+# Writes are grouped into batches of this many records while loading
+LOAD_CHUNK = 500
+
+# Changes smaller than these are noise, not regressions
+MIN_COMPARABLE_MS = 0.05
+MIN_COMPARABLE_BYTES = 4096
+
+
+# ==================== SYNTHETIC DATA ====================
+
+class SyntheticDataset:
+    """
+    Deterministic LMS records for one dataset size.
+    Every kind of record has its own random stream, so the data does not
+    depend on the order in which it is generated.
+    """
+    
+    def __init__(self, counts: dict, seed: int = 42):
+        self.counts = counts
+        self.seed = seed
+        
+        self.teacher_ids = [f"teacher_{i:05d}" for i in range(counts['teachers'])]
+        self.student_ids = [f"student_{i:06d}" for i in range(counts['students'])]
+        self.course_ids = [f"course_{i:05d}" for i in range(counts['courses'])]
+        self.lecture_ids = [f"lecture_{i:06d}" for i in range(counts['lectures'])]
+        self.course_teacher = {course_id: self.teacher_ids[i % len(self.teacher_ids)]
+                               for i, course_id in enumerate(self.course_ids)}
+        self.lecture_course = {lecture_id: self.course_ids[i % len(self.course_ids)]
+                               for i, lecture_id in enumerate(self.lecture_ids)}
+    
+    def _rng(self, kind: str) -> random.Random:
+        return random.Random(f"{self.seed}:{kind}")
+    
+    @staticmethod
+    def _timestamp(rng: random.Random) -> str:
+        return (BASE_TIME + timedelta(seconds=rng.randrange(TIME_WINDOW_SECONDS))).isoformat()
+    
+    def users(self) -> list:
+        """create_user keyword dicts for every teacher and student"""
+        users = []
+        for role, ids in (('teacher', self.teacher_ids), ('student', self.student_ids)):
+            for user_id in ids:
+                users.append({
+                    'user_id': user_id,
+                    'username': user_id,
+                    'password_hash': '$2b$12$' + 'x' * 53,
+                    'role': role,
+                    'email': f"{user_id}@example.edu",
+                    'full_name': user_id.replace('_', ' ').title()
+                })
+        return users
+    
+    def courses(self) -> list:
+        return [{'course_id': course_id, 'name': f"Course {course_id[-5:]}",
+                 'teacher_id': teacher_id, 'description': "Synthetic course"}
+                for course_id, teacher_id in self.course_teacher.items()]
+    
+    def lectures(self) -> list:
+        rng = self._rng('lectures')
+        return [{'lecture_id': lecture_id, 'title': f"Lecture {lecture_id[-6:]}",
+                 'course_id': course_id, 'video_path': f"storage/videos/{lecture_id}.mp4",
+                 'duration': rng.randrange(600, 5400)}
+                for lecture_id, course_id in self.lecture_course.items()]
+    
+    def enrollments(self) -> list:
+        """(course_id, student_id) pairs: every student takes a few courses"""
+        rng = self._rng('enrollments')
+        per_student = min(5, len(self.course_ids))
+        return [(course_id, student_id) for student_id in self.student_ids
+                for course_id in rng.sample(self.course_ids, per_student)]
+    
+    def engagement_logs(self) -> list:
+        rng = self._rng('engagement_logs')
+        logs = []
+        for i in range(self.counts['engagement_logs']):
+            started = self._timestamp(rng)
+            logs.append({
+                'log_id': f"log_{i:07d}",
+                'student_id': rng.choice(self.student_ids),
+                'lecture_id': rng.choice(self.lecture_ids),
+                'session_start': started,
+                'events': [{'type': rng.choice(('play', 'pause', 'seek', 'focus', 'blur')),
+                            'timestamp': started, 'position': rng.randrange(3600)}
+                           for _ in range(rng.randrange(5, 40))],
+                'engagement_score': round(rng.uniform(20, 100), 2),
+                'created_at': started
+            })
+        return logs
+    
+    def feedback_record(self, rng: random.Random, feedback_id: str) -> dict:
+        """One save_detailed_feedback keyword dict"""
+        lecture_id = rng.choice(self.lecture_ids)
+        ratings = [rng.randint(1, 5) for _ in range(6)]
+        return {
+            'feedback_id': feedback_id,
+            'student_id': rng.choice(self.student_ids),
+            'lecture_id': lecture_id,
+            'course_id': self.lecture_course[lecture_id],
+            'overall_rating': ratings[0], 'content_quality': ratings[1],
+            'clarity_rating': ratings[2], 'pace_rating': ratings[3],
+            'engagement_rating': ratings[4], 'visual_aids_rating': ratings[5],
+            'composite_score': round(sum(ratings) / len(ratings), 2),
+            'strengths': "Clear examples", 'improvements': "Slower pace",
+            'additional_comments': "", 'difficulty_level': rng.choice(('easy', 'medium', 'hard')),
+            'would_recommend': rng.random() < 0.8, 'had_technical_issues': rng.random() < 0.1,
+            'technical_details': "",
+            'sentiment': {'compound': round(rng.uniform(-1, 1), 3), 'label': 'neutral'},
+            'keywords': ["examples", "pace"], 'themes': ["delivery"],
+            'combined_text': "Clear examples. Slower pace."
+        }
+    
+    def feedback(self) -> list:
+        rng = self._rng('feedback')
+        return [self.feedback_record(rng, f"feedback_{i:07d}")
+                for i in range(self.counts['feedback'])]
+    
+    def grades(self) -> list:
+        """save_grade keyword dicts"""
+        rng = self._rng('grades')
+        return [{'student_id': rng.choice(self.student_ids),
+                 'course_id': rng.choice(self.course_ids),
+                 'assessment_type': rng.choice(('quiz', 'assignment')),
+                 'assessment_id': f"assessment_{i:07d}",
+                 'score': rng.randrange(0, 101), 'max_score': 100}
+                for i in range(self.counts['grades'])]
+    
+    def attendance(self) -> list:
+        rng = self._rng('attendance')
+        records = []
+        for i in range(self.counts['attendance']):
+            recorded_at = self._timestamp(rng)
+            records.append({
+                'attendance_id': f"attendance_{i:07d}",
+                'student_id': rng.choice(self.student_ids),
+                'lecture_id': rng.choice(self.lecture_ids),
+                'presence_percentage': round(rng.uniform(0, 100), 1),
+                'detection_logs': [{'timestamp': recorded_at, 'face_detected': rng.random() < 0.9}
+                                   for _ in range(10)],
+                'recorded_at': recorded_at
+            })
+        return records
+
+
+def load_dataset(storage, dataset: SyntheticDataset) -> dict:
+    """Write a dataset through the public API; returns seconds per phase"""
+    timings = {}
+    
+    def phase(name, records, write, chunk=LOAD_CHUNK):
+        start = time.perf_counter()
+        for offset in range(0, len(records), chunk):
+            with storage.batch():
+                for record in records[offset:offset + chunk]:
+                    write(record)
+        timings[name] = round(time.perf_counter() - start, 3)
+    
+    start = time.perf_counter()
+    storage.create_users_bulk(dataset.users())
+    timings['users'] = round(time.perf_counter() - start, 3)
+    
+    phase('courses', dataset.courses(), lambda course: storage.create_course(**course))
+    phase('lectures', dataset.lectures(), lambda lecture: storage.create_lecture(**lecture))
+    phase('enrollments', dataset.enrollments(), lambda pair: storage.enroll_student(*pair))
+    phase('engagement_logs', dataset.engagement_logs(),
+          lambda log: storage.save_engagement_log(**log))
+    phase('feedback', dataset.feedback(),
+          lambda feedback: storage.save_detailed_feedback(**feedback))
+    phase('grades', dataset.grades(), lambda grade: storage.save_grade(**grade))
+    phase('attendance', dataset.attendance(), lambda record: storage.save_attendance(**record))
+    return timings
+
+
+# ==================== MEASUREMENT ====================
+
+def io_counters():
+    """(bytes read, bytes written) by this process so far, or None where unsupported"""
+    try:
+        with open('/proc/self/io', 'r') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KB (None where unsupported)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class BenchContext:
+    """Picks arguments for benchmarked calls and tracks what the writes created"""
+    
+    def __init__(self, dataset: SyntheticDataset, seed: int):
+        self.dataset = dataset
+        self.rng = random.Random(f"{seed}:calls")
+        self.counter = 0
+        self.created_users = []
+        self.pending_requests = []
+    
+    def next_id(self, prefix: str) -> str:
+        self.counter += 1
+        return f"bench_{prefix}_{self.counter:07d}"
+    
+    def student(self) -> str:
+        return self.rng.choice(self.dataset.student_ids)
+    
+    def teacher(self) -> str:
+        return self.rng.choice(self.dataset.teacher_ids)
+    
+    def course(self) -> str:
+        return self.rng.choice(self.dataset.course_ids)
+    
+    def lecture(self) -> str:
+        return self.rng.choice(self.dataset.lecture_ids)
+    
+    def new_user(self) -> dict:
+        user_id = self.next_id('user')
+        self.created_users.append(user_id)
+        return {'user_id': user_id, 'username': user_id, 'password_hash': '$2b$12$' + 'x' * 53,
+                'role': 'student', 'email': f"{user_id}@example.edu"}
+    
+    def new_request(self) -> tuple:
+        request_id = self.next_id('request')
+        self.pending_requests.append(request_id)
+        return (request_id, self.student(), self.course())
+    
+    def grade(self) -> dict:
+        return {'student_id': self.student(), 'course_id': self.course(), 'assessment_type': 'quiz',
+                'assessment_id': self.next_id('quiz'), 'score': self.rng.randrange(101),
+                'max_score': 100}
+
+
+# (label, method, kind, build(ctx) -> (args, kwargs)); kind is 'read', 'write'
+# or 'heavy' (whole-collection work, timed fewer times). Calls run in this
+# order, reads first, so writes do not change what the reads see.
+CALLS = [
+    ('get_user', 'get_user', 'read', lambda ctx: ((ctx.student(),), {})),
+    ('get_user_by_username', 'get_user_by_username', 'read', lambda ctx: ((ctx.student(),), {})),
+    ('get_all_users', 'get_all_users', 'heavy', lambda ctx: ((), {})),
+    ('get_all_users[role]', 'get_all_users', 'heavy', lambda ctx: ((), {'role': 'teacher'})),
+    ('get_course', 'get_course', 'read', lambda ctx: ((ctx.course(),), {})),
+    ('get_all_courses', 'get_all_courses', 'read', lambda ctx: ((), {})),
+    ('get_all_courses[teacher]', 'get_all_courses', 'read',
+     lambda ctx: ((), {'teacher_id': ctx.teacher()})),
+    ('get_lecture', 'get_lecture', 'read', lambda ctx: ((ctx.lecture(),), {})),
+    ('get_course_lectures', 'get_course_lectures', 'read', lambda ctx: ((ctx.course(),), {})),
+    ('get_engagement_logs[student]', 'get_engagement_logs', 'read',
+     lambda ctx: ((), {'student_id': ctx.student()})),
+    ('get_engagement_logs[lecture]', 'get_engagement_logs', 'read',
+     lambda ctx: ((), {'lecture_id': ctx.lecture()})),
+    ('get_feedback[lecture]', 'get_feedback', 'read',
+     lambda ctx: ((), {'lecture_id': ctx.lecture()})),
+    ('get_feedback_ids[lecture]', 'get_feedback_ids', 'read',
+     lambda ctx: ((), {'lecture_id': ctx.lecture()})),
+    ('get_teacher_feedback', 'get_teacher_feedback', 'heavy', lambda ctx: ((ctx.teacher(),), {})),
+    ('get_teacher_evaluation', 'get_teacher_evaluation', 'read',
+     lambda ctx: ((ctx.teacher(),), {})),
+    ('get_evaluation', 'get_evaluation', 'read', lambda ctx: ((ctx.teacher(),), {})),
+    ('get_all_evaluations', 'get_all_evaluations', 'read', lambda ctx: ((), {})),
+    ('get_student_grades', 'get_student_grades', 'read', lambda ctx: ((ctx.student(),), {})),
+    ('get_attendance[student]', 'get_attendance', 'read',
+     lambda ctx: ((), {'student_id': ctx.student()})),
+    ('get_attendance[lecture]', 'get_attendance', 'read',
+     lambda ctx: ((), {'lecture_id': ctx.lecture()})),
+    ('get_course_aggregates', 'get_course_aggregates', 'read', lambda ctx: ((ctx.course(),), {})),
+    ('get_teacher_aggregates', 'get_teacher_aggregates', 'read',
+     lambda ctx: ((ctx.teacher(),), {})),
+    ('get_teacher_activity', 'get_teacher_activity', 'read',
+     lambda ctx: ((ctx.teacher(),), {'days': 30})),
+    ('get_progress', 'get_progress', 'read', lambda ctx: ((ctx.student(),), {})),
+    ('get_enrollment_requests[course]', 'get_enrollment_requests', 'read',
+     lambda ctx: ((), {'course_id': ctx.course()})),
+    ('get_collection_version', 'get_collection_version', 'read', lambda ctx: (('attendance',), {})),
+    ('get_collection_versions', 'get_collection_versions', 'read',
+     lambda ctx: (('attendance', 'feedback', 'evaluation'), {})),
+    ('get_changes', 'get_changes', 'read', lambda ctx: (('attendance', 0), {})),
+    ('iter_changes', 'iter_changes', 'read', lambda ctx: (('attendance', 0), {})),
+    ('subscribe', 'subscribe', 'read', lambda ctx: (('attendance', 'feedback'), {})),
+    ('query_archive', 'query_archive', 'read',
+     lambda ctx: (('attendance',), {'student_id': ctx.student()})),
+    ('get_cache_stats', 'get_cache_stats', 'read', lambda ctx: ((), {})),
+    
+    ('create_user', 'create_user', 'write', lambda ctx: ((), ctx.new_user())),
+    ('create_users_bulk', 'create_users_bulk', 'write',
+     lambda ctx: (([ctx.new_user() for _ in range(20)],), {})),
+    ('update_user', 'update_user', 'write', lambda ctx: ((ctx.student(), {'bio': 'Updated'}), {})),
+    ('record_login_attempt', 'record_login_attempt', 'write',
+     lambda ctx: ((ctx.student(), True, 5), {})),
+    ('delete_user', 'delete_user', 'write', lambda ctx: ((ctx.created_users.pop(),), {})),
+    ('create_course', 'create_course', 'write',
+     lambda ctx: ((ctx.next_id('course'), "Bench course", ctx.teacher()), {})),
+    ('update_course', 'update_course', 'write',
+     lambda ctx: ((ctx.course(), {'description': 'Updated'}), {})),
+    ('enroll_student', 'enroll_student', 'write', lambda ctx: ((ctx.course(), ctx.student()), {})),
+    ('create_lecture', 'create_lecture', 'write',
+     lambda ctx: ((ctx.next_id('lecture'), "Bench lecture", ctx.course(), "bench.mp4"), {})),
+    ('update_lecture', 'update_lecture', 'write',
+     lambda ctx: ((ctx.lecture(), {'title': 'Updated'}), {})),
+    ('save_engagement_log', 'save_engagement_log', 'write',
+     lambda ctx: ((ctx.next_id('log'), ctx.student(), ctx.lecture(), BASE_TIME.isoformat(),
+                   [{'type': 'play', 'timestamp': BASE_TIME.isoformat()}] * 20, 75.0), {})),
+    ('save_feedback', 'save_feedback', 'write',
+     lambda ctx: ((ctx.next_id('feedback'), ctx.student(), ctx.lecture(), "Good lecture", 4), {})),
+    ('save_detailed_feedback', 'save_detailed_feedback', 'write',
+     lambda ctx: ((), ctx.dataset.feedback_record(ctx.rng, ctx.next_id('feedback')))),
+    ('update_teacher_evaluation', 'update_teacher_evaluation', 'write',
+     lambda ctx: ((ctx.teacher(), ctx.lecture(), ctx.course(), ctx.next_id('feedback'),
+                   {'overall': 4, 'content_quality': 4, 'clarity': 5, 'pace': 3, 'engagement': 4,
+                    'visual_aids': 4, 'composite': 4.0},
+                   {'compound': 0.4, 'label': 'positive'}), {})),
+    ('save_grade', 'save_grade', 'write', lambda ctx: ((), ctx.grade())),
+    ('save_grades_bulk', 'save_grades_bulk', 'write',
+     lambda ctx: (([ctx.grade() for _ in range(20)],), {})),
+    ('save_evaluation', 'save_evaluation', 'write',
+     lambda ctx: ((ctx.teacher(), 0.8, {'engagement': 0.7}), {})),
+    ('save_evaluations_bulk', 'save_evaluations_bulk', 'write',
+     lambda ctx: (([{'teacher_id': ctx.teacher(), 'score': 0.8, 'features': {}}
+                    for _ in range(10)],), {})),
+    ('save_attendance', 'save_attendance', 'write',
+     lambda ctx: ((ctx.next_id('attendance'), ctx.student(), ctx.lecture(), 80.0, []), {})),
+    ('log_teacher_activity', 'log_teacher_activity', 'write',
+     lambda ctx: ((ctx.next_id('activity'), ctx.teacher(), 'upload',
+                   {'lecture_id': ctx.lecture()}), {})),
+    ('save_progress', 'save_progress', 'write',
+     lambda ctx: ((ctx.student(), ctx.course(), [ctx.lecture()], [80.0], [70.0]), {})),
+    ('create_enrollment_request', 'create_enrollment_request', 'write',
+     lambda ctx: (ctx.new_request(), {})),
+    ('update_enrollment_request', 'update_enrollment_request', 'write',
+     lambda ctx: ((ctx.pending_requests.pop(), 'approved', ctx.teacher()), {})),
+    ('clear_cache', 'clear_cache', 'write', lambda ctx: ((), {})),
+    
+    ('rebuild_course_aggregates', 'rebuild_course_aggregates', 'heavy', lambda ctx: ((), {})),
+    ('archive_records', 'archive_records', 'heavy',
+     lambda ctx: (('attendance', '2000-01-01T00:00:00'), {})),
+    ('anonymize_archived', 'anonymize_archived', 'heavy',
+     lambda ctx: (('attendance', '2000-01-01T00:00:00'), {})),
+    ('expire_archived', 'expire_archived', 'heavy',
+     lambda ctx: (('attendance', '2000-01-01T00:00:00'), {})),
+]
+
+# Public methods that are deliberately not timed on their own
+NOT_TIMED = {
+    'batch': "context manager; covered by the *_bulk calls and the load phase",
+    'reshard_by_course': "one-off migration that requires shard_by_course",
+}
+
+
+def time_call(fn, args: tuple, kwargs: dict, io_overhead: tuple) -> tuple:
+    """Run one call; returns (seconds, bytes read, bytes written)"""
+    before_io = io_counters()
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    if inspect.isgenerator(result):
+        for _ in result:
+            pass
+    elapsed = time.perf_counter() - start
+    after_io = io_counters()
+    if before_io is None or after_io is None:
+        return elapsed, None, None
+    return (elapsed,
+            max(0, after_io[0] - before_io[0] - io_overhead[0]),
+            max(0, after_io[1] - before_io[1] - io_overhead[1]))
+
+
+def measure_io_overhead() -> tuple:
+    """Bytes that reading /proc/self/io itself adds to the counters"""
+    samples = []
+    for _ in range(5):
+        first, second = io_counters(), io_counters()
+        if first is None or second is None:
+            return (0, 0)
+        samples.append((second[0] - first[0], second[1] - first[1]))
+    return min(samples)
+
+
+def summarize(timings: list, reads: list, writes: list, rss_growth: int) -> dict:
+    latencies = sorted(t * 1000 for t in timings)
+    return {
+        'calls': len(latencies),
+        'mean_ms': round(sum(latencies) / len(latencies), 4),
+        'p50_ms': round(percentile(latencies, 50), 4),
+        'p90_ms': round(percentile(latencies, 90), 4),
+        'p99_ms': round(percentile(latencies, 99), 4),
+        'max_ms': round(latencies[-1], 4),
+        'read_bytes': int(sum(reads) / len(reads)) if reads and None not in reads else None,
+        'written_bytes': int(sum(writes) / len(writes)) if writes and None not in writes else None,
+        'rss_growth_kb': rss_growth
+    }
+
+
+def benchmark_methods(storage, dataset: SyntheticDataset, repeat: int, seed: int,
+                      cold: bool = False) -> tuple:
+    """
+    Time every registered call; returns ({label: summary}, {method: reason not timed}).
+    With cold=True the in-process cache is dropped before every read.
+    """
+    ctx = BenchContext(dataset, seed)
+    io_overhead = measure_io_overhead()
+    methods = {}
+    
+    for label, method, kind, build in CALLS:
+        fn = getattr(storage, method, None)
+        if fn is None:
+            continue  # Not offered by this backend
+        calls = max(3, repeat // 10) if kind == 'heavy' else repeat
+        if method == 'delete_user':
+            calls = min(calls, len(ctx.created_users))
+        elif method == 'update_enrollment_request':
+            calls = min(calls, len(ctx.pending_requests))
+        if not calls:
+            continue
+        
+        timings, reads, writes = [], [], []
+        rss_before = peak_rss_kb()
+        for _ in range(calls):
+            args, kwargs = build(ctx)
+            if cold and kind != 'write' and hasattr(storage, 'clear_cache'):
+                storage.clear_cache()
+            elapsed, read, written = time_call(fn, args, kwargs, io_overhead)
+            timings.append(elapsed)
+            reads.append(read)
+            writes.append(written)
+        rss_after = peak_rss_kb()
+        rss_growth = rss_after - rss_before if rss_before is not None else None
+        methods[label] = summarize(timings, reads, writes, rss_growth)
+    
+    # Anything public that the registry does not know about is reported, not silently skipped
+    timed = {method for _, method, _, _ in CALLS}
+    not_timed = {}
+    for name, _ in inspect.getmembers(type(storage), inspect.isfunction):
+        if not name.startswith('_') and name not in timed:
+            not_timed[name] = NOT_TIMED.get(name, "no benchmark registered")
+    return methods, not_timed
+
+
+# ==================== RUNNER ====================
+
+def make_config(base_config_path: str, workdir: str, shard_by_course: bool) -> str:
+    """Write a copy of the config whose storage lives under workdir"""
+    with open(base_config_path, 'r') as f:
+        config = yaml.safe_load(f)
+    
+    storage = config['storage']
+    old_base = storage['base_path']
+    new_base = os.path.join(workdir, 'storage')
+    for key, value in list(storage.items()):
+        if isinstance(value, str) and value.startswith(old_base):
+            storage[key] = new_base + value[len(old_base):]
+    storage['shard_by_course'] = shard_by_course
+    
+    database = config.setdefault('database', {}) or {}
+    database['path'] = os.path.join(new_base, 'benchmark.db')
+    config['database'] = database
+    
+    config_path = os.path.join(workdir, 'config.yaml')
+    with open(config_path, 'w') as f:
+        yaml.safe_dump(config, f)
+    return config_path
+
+
+def run_size(size: str, counts: dict, options: dict) -> dict:
+    """Load one dataset size into fresh storage and time every method (runs in its own process)"""
+    from services.storage import StorageService
+    from services.storage_sqlite import SqliteStorageService
+    
+    workdir = tempfile.mkdtemp(prefix=f"lms_bench_{size}_", dir=options['workdir'])
+    try:
+        config_path = make_config(options['config'], workdir, options['shard_by_course'])
+        backend = SqliteStorageService if options['backend'] == 'sqlite' else StorageService
+        storage = backend(config_path)
+        dataset = SyntheticDataset(counts, seed=options['seed'])
+        
+        load_start = time.perf_counter()
+        load_phases = load_dataset(storage, dataset)
+        load_seconds = time.perf_counter() - load_start
+        rss_after_load = peak_rss_kb()
+        
+        methods, not_timed = benchmark_methods(storage, dataset, options['repeat'], options['seed'],
+                                               cold=options['cold'])
+        
+        return {
+            'counts': counts,
+            'load': {
+                'seconds': round(load_seconds, 3),
+                'phases': load_phases,
+                'storage_bytes': sum(os.path.getsize(os.path.join(root, name))
+                                     for root, _, names in os.walk(os.path.join(workdir, 'storage'))
+                                     for name in names)
+            },
+            'peak_rss_kb': {'after_load': rss_after_load, 'after_benchmark': peak_rss_kb()},
+            'methods': methods,
+            'not_timed': not_timed
+        }
+    finally:
+        if not options['keep']:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# ==================== BASELINE ====================
+
+def compare_with_baseline(results: dict, baseline: dict, threshold: float) -> list:
+    """List (size, label, metric, baseline, current, ratio) rows worse by more than threshold"""
+    regressions = []
+    for size, data in results['sizes'].items():
+        base_size = baseline.get('sizes', {}).get(size)
+        if not base_size:
+            continue
+        for label, current in data['methods'].items():
+            previous = base_size['methods'].get(label)
+            if not previous:
+                continue
+            for metric, floor in (('p50_ms', MIN_COMPARABLE_MS), ('p90_ms', MIN_COMPARABLE_MS),
+                                  ('read_bytes', MIN_COMPARABLE_BYTES),
+                                  ('written_bytes', MIN_COMPARABLE_BYTES)):
+                old, new = previous.get(metric), current.get(metric)
+                if old is None or new is None or max(old, new) < floor:
+                    continue
+                ratio = new / old if old else float('inf')
+                if ratio > 1 + threshold:
+                    regressions.append((size, label, metric, old, new, ratio))
+        
+        old_rss = (base_size.get('peak_rss_kb') or {}).get('after_benchmark')
+        new_rss = (data.get('peak_rss_kb') or {}).get('after_benchmark')
+        if old_rss and new_rss and new_rss / old_rss > 1 + threshold:
+            regressions.append((size, '(process)', 'peak_rss_kb', old_rss, new_rss,
+                                new_rss / old_rss))
+    return regressions
+
+
+def print_size_report(size: str, data: dict):
+    def kb(value):
+        return '-' if value is None else f"{value / 1024:.1f}"
+    
+    print()
+    print(f"📊 {size}: {data['counts']}")
+    megabytes = data['load']['storage_bytes'] / 1024 / 1024
+    print(f"   Load: {data['load']['seconds']}s, {megabytes:.1f} MB on disk, "
+          f"peak RSS {data['peak_rss_kb']['after_benchmark']} KB")
+    print(f"   {'method':<34}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"
+          f"{'read KB':>11}{'write KB':>11}")
+    for label, summary in data['methods'].items():
+        print(f"   {label:<34}{summary['p50_ms']:>10.3f}{summary['p90_ms']:>10.3f}"
+              f"{summary['p99_ms']:>10.3f}"
+              f"{kb(summary['read_bytes']):>11}{kb(summary['written_bytes']):>11}")
+    for name, reason in data['not_timed'].items():
+        print(f"   ⚠️  {name} not timed: {reason}")
+
+
+def parse_counts(overrides: list) -> dict:
+    counts = {}
+    for override in overrides:
+        key, _, value = override.partition('=')
+        if key not in SIZES['small']:
+            raise SystemExit(f"❌ Unknown count '{key}' "
+                             f"(expected one of {', '.join(SIZES['small'])})")
+        counts[key] = int(value)
+    return counts
+
+
+def main():
+    """Run the storage benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark StorageService on synthetic data")
+    parser.add_argument('--config', default='config.yaml',
+                        help="Config to copy storage settings from (default: config.yaml, "
+                             "falling back to config.example.yaml)")
+    parser.add_argument('--backend', choices=('json', 'sqlite'), default='json',
+                        help="Storage backend")
+    parser.add_argument('--sizes', default='small',
+                        help=f"Comma-separated sizes from: {', '.join(SIZES)}")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=N',
+                        help="Override a record count in every size (e.g. --set students=5000)")
+    parser.add_argument('--repeat', type=int, default=50,
+                        help="Calls per method (whole-collection methods: 1/10)")
+    parser.add_argument('--seed', type=int, default=42, help="Seed for the data generator")
+    parser.add_argument('--shard-by-course', action='store_true',
+                        help="Benchmark the per-course sharded layout")
+    parser.add_argument('--cold', action='store_true',
+                        help="Drop the in-process cache before every read")
+    parser.add_argument('--output', default=None,
+                        help="Results JSON (default: storage_benchmark_<backend>.json)")
+    parser.add_argument('--baseline', default=None, help="Earlier results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Relative slowdown that counts as a regression (default: 0.2)")
+    parser.add_argument('--workdir', default=None,
+                        help="Directory for temporary storage (default: system temp)")
+    parser.add_argument('--keep', action='store_true',
+                        help="Keep the generated storage directories")
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.config):
+        args.config = 'config.example.yaml'
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        print(f"❌ Unknown size(s): {', '.join(unknown)}")
+        sys.exit(2)
+    overrides = parse_counts(args.set)
+    
+    print("=" * 60)
+    print("⏱️  Smart LMS Storage Benchmark")
+    print("=" * 60)
+    print(f"⚙️  Backend: {args.backend}{' (sharded by course)' if args.shard_by_course else ''}"
+          f"{', cold cache' if args.cold else ''}, seed {args.seed}, "
+          f"{args.repeat} calls per method")
+    
+    options = {
+        'config': os.path.abspath(args.config),
+        'backend': args.backend,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'shard_by_course': args.shard_by_course,
+        'cold': args.cold,
+        'workdir': args.workdir,
+        'keep': args.keep
+    }
+    results = {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            **{key: value for key, value in options.items()
+               if key not in ('config', 'workdir', 'keep')}
+        },
+        'sizes': {}
+    }
+    
+    # A fresh process per size, so peak RSS and caches belong to that size alone
+    context = multiprocessing.get_context('spawn')
+    for size in sizes:
+        counts = {**SIZES[size], **overrides}
+        print(f"🏗️  Generating and loading '{size}'...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results['sizes'][size] = executor.submit(run_size, size, counts, options).result()
+        print_size_report(size, results['sizes'][size])
+    
+    output = args.output or f"storage_benchmark_{args.backend}.json"
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print()
+    print(f"💾 Results written to {output}")
+    
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        baseline_meta = baseline.get('meta', {})
+        print(f"📐 Compared with {args.baseline} "
+              f"(revision {baseline_meta.get('revision', '?')})")
+        for key in ('backend', 'shard_by_course', 'cold', 'seed'):
+            if baseline_meta.get(key) != results['meta'][key]:
+                print(f"   ⚠️  Baseline was run with {key}={baseline_meta.get(key)!r}")
+        if regressions:
+            for size, label, metric, old, new, ratio in regressions:
+                change = f"{ratio:.2f}x" if old else "was 0"
+                print(f"   ❌ {size} {label} {metric}: {old} → {new} ({change})")
+            sys.exit(1)
+        print(f"   ✅ No regressions above {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import csv
 from services.storage import get_storage
-from services.auth import AuthService
+from services.user_provisioning import UserProvisioner
 from datetime import datetime
 import uuid
 
@@ -18,9 +18,6 @@ def migrate_users_from_csv():
     """Migrate users from student_login.csv to users.json"""
     print("📊 Migrating users from CSV...")
     
-    storage = get_storage()
-    auth = AuthService()
-    
     csv_path = "student_login.csv"
     if not os.path.exists(csv_path):
         csv_path = "data_archive/student_login.csv"
@@ -30,7 +27,7 @@ def migrate_users_from_csv():
         create_default_users()
         return
     
-    migrated_count = 0
+    users = []
     with open(csv_path, 'r') as f:
         reader = csv.DictReader(f)
         for row in reader:
@@ -40,24 +37,24 @@ def migrate_users_from_csv():
             if not student_id or not password:
                 continue
             
-            # Hash password
-            password_hash = auth.hash_password(password)
-            
-            # Create user
-            user_id = f"student_{student_id}"
-            success = storage.create_user(
-                user_id=user_id,
-                username=student_id,
-                password_hash=password_hash,
-                role='student',
-                email=f"{student_id}@university.edu",
-                full_name=f"Student {student_id}"
-            )
-            
-            if success:
-                migrated_count += 1
+            users.append({
+                'user_id': f"student_{student_id}",
+                'username': student_id,
+                'password': password,
+                'role': 'student',
+                'email': f"{student_id}@university.edu",
+                'full_name': f"Student {student_id}"
+            })
+    
+    # Hash passwords in parallel (resumable) and create all users with one write
+    provisioner = UserProvisioner(checkpoint_path=f"{csv_path}.provision.jsonl")
+    result = provisioner.provision(
+        users,
+        progress=lambda done, total: print(f"\r   🔐 Hashed {done}/{total}", end='', flush=True)
+    )
+    print()
     
-    print(f"✅ Migrated {migrated_count} students")
+    print(f"✅ Migrated {result['created']} students")
     
     # Add default admin and teacher accounts
     create_default_users()
@@ -67,9 +64,6 @@ def create_default_users():
     """Create default admin and teacher accounts"""
     print("👥 Creating default users...")
     
-    storage = get_storage()
-    auth = AuthService()
-    
     default_users = [
         {
             'user_id': 'admin_1',
@@ -105,14 +99,8 @@ def create_default_users():
         }
     ]
     
-    for user_data in default_users:
-        password = user_data.pop('password')
-        password_hash = auth.hash_password(password)
-        
-        storage.create_user(
-            password_hash=password_hash,
-            **user_data
-        )
+    # Hashes in parallel, one write to users.json
+    UserProvisioner().provision(default_users)
     
     print("✅ Default users created:")
     print("   - Admin: admin / admin123")
@@ -151,8 +139,9 @@ def create_sample_courses():
         }
     ]
     
-    for course in courses:
-        storage.create_course(**course)
+    with storage.batch():
+        for course in courses:
+            storage.create_course(**course)
     
     print(f"✅ Created {len(courses)} courses")
 
@@ -209,8 +198,9 @@ def create_sample_lectures():
         }
     ]
     
-    for lecture in lectures:
-        storage.create_lecture(**lecture)
+    with storage.batch():
+        for lecture in lectures:
+            storage.create_lecture(**lecture)
     
     print(f"✅ Created {len(lectures)} lectures")
 
@@ -254,27 +244,28 @@ def create_sample_grades():
     
     storage = get_storage()
     
-    # Sample quiz grades
-    storage.save_grade(
-        student_id='student_demo',
-        course_id='cv_101',
-        assessment_type='quiz',
-        assessment_id='cv_quiz_1',
-        score=8,
-        max_score=10,
-        lecture_id='cv_lec_1'
-    )
-    
-    # Sample assignment grades
-    storage.save_grade(
-        student_id='student_demo',
-        course_id='cv_101',
-        assessment_type='assignment',
-        assessment_id='cv_assign_1',
-        score=85,
-        max_score=100,
-        lecture_id='cv_lec_1'
-    )
+    storage.save_grades_bulk([
+        # Sample quiz grades
+        {
+            'student_id': 'student_demo',
+            'course_id': 'cv_101',
+            'assessment_type': 'quiz',
+            'assessment_id': 'cv_quiz_1',
+            'score': 8,
+            'max_score': 10,
+            'lecture_id': 'cv_lec_1'
+        },
+        # Sample assignment grades
+        {
+            'student_id': 'student_demo',
+            'course_id': 'cv_101',
+            'assessment_type': 'assignment',
+            'assessment_id': 'cv_assign_1',
+            'score': 85,
+            'max_score': 100,
+            'lecture_id': 'cv_lec_1'
+        }
+    ])
     
     print("✅ Created sample grades")
 
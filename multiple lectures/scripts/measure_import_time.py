@@ -0,0 +1,123 @@
+"""
+Smart LMS - Import Time Measurement
+Cold-start import cost of the app entry point, each page and the services
+
+Usage:
+    python scripts/measure_import_time.py [--repeat 3] [--top 5] [targets...]
+
+Targets are page/script paths (their module-level imports are replayed)
+or dotted module names; the default is app/streamlit_app.py, every page
+and every services module. Each measurement runs in a fresh interpreter
+with `-X importtime`, so nothing is cached between targets. The report
+lists the heavy modules (services.registry.HEAVY_MODULES) each target
+pulled in, which is what the lazy imports are meant to keep off the
+admin and teacher pages.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import ast
+import glob
+import json
+import subprocess
+from typing import Dict, List
+
+from services.registry import HEAVY_MODULES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Replays the imports in a fresh interpreter; a missing package is
+# reported instead of failing the whole measurement. Only imports after
+# the marker are counted (the probe's own json/sys are not).
+MARKER = "--- measured imports start"
+PROBE = """
+import json, sys
+sys.stderr.write({marker!r} + '\\n')
+sys.stderr.flush()
+missing = []
+for statement in {statements!r}:
+    try:
+        exec(statement, {{}})
+    except ImportError as e:
+        missing.append(str(e))
+print(json.dumps({{'heavy': [m for m in {heavy!r} if m in sys.modules], 'missing': missing}}))
+"""
+
+
+def default_targets() -> List[str]:
+    """The app entry point, every page and every services module"""
+    pages = glob.glob(os.path.join(ROOT, 'app', 'pages', '*.py'))
+    targets = ['app/streamlit_app.py'] + sorted(os.path.relpath(path, ROOT) for path in pages)
+    targets += sorted(f"services.{os.path.basename(path)[:-3]}"
+                      for path in glob.glob(os.path.join(ROOT, 'services', '*.py')))
+    return targets
+
+
+def import_statements(target: str) -> List[str]:
+    """Module-level import statements of a file, or one import of a dotted module"""
+    if not target.endswith('.py'):
+        return [f"import {target}"]
+    with open(os.path.join(ROOT, target), 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=target)
+    return [ast.unparse(node) for node in tree.body
+            if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def measure(target: str) -> Dict:
+    """Import a target in a fresh interpreter; returns timings and what it loaded"""
+    code = PROBE.format(statements=import_statements(target), heavy=HEAVY_MODULES, marker=MARKER)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=ROOT, capture_output=True, text=True,
+                            env={**os.environ, 'PYTHONPATH': ROOT})
+
+    modules = []
+    total_us = 0
+    stderr = result.stderr.split(MARKER, 1)[-1]
+    for line in stderr.splitlines():
+        fields = line[len('import time:'):].split('|')
+        if (not line.startswith('import time:') or len(fields) != 3
+                or not fields[0].strip().isdigit()):
+            continue  # Header or unrelated output
+        cumulative_us, name = int(fields[1]), fields[2]
+        modules.append((cumulative_us, name.strip()))
+        if len(name) - len(name.lstrip()) == 1:  # Top-level import (nested ones are indented)
+            total_us += cumulative_us
+
+    report = json.loads(result.stdout.strip().splitlines()[-1]) if result.returncode == 0 else \
+        {'heavy': [], 'missing': [result.stderr.strip().splitlines()[-1]]}
+    report['seconds'] = total_us / 1e6
+    report['slowest'] = sorted(modules, reverse=True)
+    return report
+
+
+def main():
+    """Measure and print import times"""
+    parser = argparse.ArgumentParser(description="Measure cold-start import time")
+    parser.add_argument('targets', nargs='*', help="Page/script paths or dotted module names")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Runs per target (the fastest is kept)")
+    parser.add_argument('--top', type=int, default=0,
+                        help="Also list the N slowest imports per target")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⏱️  Smart LMS Import Time")
+    print("=" * 60)
+    print(f"   {'target':44s} {'import s':>9s}  heavy modules loaded")
+
+    for target in args.targets or default_targets():
+        runs = (measure(target) for _ in range(max(1, args.repeat)))
+        report = min(runs, key=lambda r: r['seconds'])
+        heavy = ', '.join(report['heavy']) or '-'
+        print(f"   {target:44s} {report['seconds']:9.3f}  {heavy}")
+        for error in report['missing']:
+            print(f"      ⚠️  not installed here: {error}")
+        for cumulative_us, name in report['slowest'][:args.top]:
+            print(f"      {cumulative_us / 1e6:8.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Smart LMS - JSON to SQLite Migration
+One-shot import of storage/*.json into the SQLite backend
+
+Usage:
+    python scripts/migrate_to_sqlite.py [--config config.yaml]
+
+After migrating, set `database.enabled: true` and `database.type: "sqlite"`
+in config.yaml to switch the application over.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+from services.storage_sqlite import SqliteStorageService
+
+
+def main():
+    """Run the migration"""
+    parser = argparse.ArgumentParser(description="Migrate JSON storage into SQLite")
+    parser.add_argument('--config', default='config.yaml', help="Path to config.yaml")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("🗄️  Smart LMS JSON → SQLite Migration")
+    print("=" * 60)
+    
+    storage = SqliteStorageService(args.config)
+    print(f"📂 Target database: {storage.db_path}")
+    
+    counts = storage.migrate_from_json()
+    
+    for collection, count in counts.items():
+        print(f"   ✅ {collection}: {count} records")
+    
+    print()
+    print("✅ Migration complete!")
+    print("   Enable it in config.yaml:")
+    print("      database:")
+    print("        enabled: true")
+    print("        type: \"sqlite\"")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Smart LMS - Bulk User Provisioning
+Import a roster CSV: passwords are hashed in parallel and all accounts
+are committed in one storage transaction
+
+Usage:
+    python scripts/provision_users.py roster.csv [--role student] [--workers N]
+
+CSV columns (header names are case-insensitive):
+    username (or StudentID), password, and optionally user_id, role,
+    email, full_name plus any other profile fields
+
+If the run is interrupted, run the same command again: finished hashes
+are kept in a checkpoint file next to the CSV and are not recomputed.
+If the CSV was edited in between, the checkpoint is discarded and every
+password is hashed again.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import csv
+import time
+
+
+def read_roster(csv_path: str, default_role: str) -> list:
+    """Read roster rows into create_user keyword dicts with a plaintext password"""
+    users = []
+    with open(csv_path, 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+            username = row.pop('username', '') or row.pop('studentid', '')
+            password = row.pop('password', '')
+            if not username or not password:
+                continue
+
+            role = row.pop('role', '') or default_role
+            user = {
+                'user_id': row.pop('user_id', '') or f"{role}_{username}",
+                'username': username,
+                'password': password,
+                'role': role,
+                'email': row.pop('email', '') or None,
+                'full_name': row.pop('full_name', '') or username
+            }
+            user.update({key: value for key, value in row.items() if key and value})
+            users.append(user)
+    return users
+
+
+def print_progress(done: int, total: int):
+    """Single-line progress bar, redrawn about once per percent"""
+    if total and done < total and done % max(1, total // 100):
+        return
+    width = 40
+    filled = int(width * done / total) if total else width
+    percent = (done / total * 100) if total else 100.0
+    bar = '█' * filled + '░' * (width - filled)
+    print(f"\r   🔐 Hashing [{bar}] {done}/{total} ({percent:.1f}%)", end='', flush=True)
+
+
+def main():
+    """Provision accounts from a roster CSV"""
+    parser = argparse.ArgumentParser(description="Bulk-create user accounts from a CSV roster")
+    parser.add_argument('csv_path', help="Roster CSV file")
+    parser.add_argument('--role', default='student', help="Role for rows without a role column")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Hashing processes (default: CPU count)")
+    parser.add_argument('--checkpoint', default=None,
+                        help="Checkpoint file (default: <csv_path>.provision.jsonl)")
+    args = parser.parse_args()
+
+    from services.user_provisioning import UserProvisioner
+
+    print("=" * 60)
+    print("👥 Smart LMS Bulk User Provisioning")
+    print("=" * 60)
+
+    users = read_roster(args.csv_path, args.role)
+    print(f"📄 {len(users)} accounts in {args.csv_path}")
+
+    checkpoint_path = args.checkpoint or f"{args.csv_path}.provision.jsonl"
+    if os.path.exists(checkpoint_path):
+        print(f"♻️  Resuming from checkpoint {checkpoint_path}")
+
+    provisioner = UserProvisioner(workers=args.workers, checkpoint_path=checkpoint_path)
+    print(f"⚙️  {provisioner.workers} worker processes, bcrypt cost {provisioner.rounds}")
+
+    start = time.time()
+    result = provisioner.provision(users, progress=print_progress)
+    print()
+
+    print(f"✅ Created {result['created']} accounts in {time.time() - start:.1f}s")
+    print(f"   Already existed: {result['existing']}")
+    print(f"   Hashed this run: {result['hashed']} (resumed: {result['resumed']})")
+
+
+if __name__ == "__main__":
+    main()
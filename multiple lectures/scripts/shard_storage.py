@@ -0,0 +1,48 @@
+"""
+Smart LMS - Per-Course Storage Sharding
+Move existing records into storage/courses/<course_id>/ shards
+
+Usage:
+    python scripts/shard_storage.py [--config config.yaml]
+
+Set `storage.shard_by_course: true` in config.yaml first. Records whose
+course cannot be resolved stay in the shared files; engagement sessions
+already in the shared log stay there too (reads still cover them).
+Safe to re-run.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+from services.storage import StorageService
+
+
+def main():
+    """Move shared records into course shards"""
+    parser = argparse.ArgumentParser(description="Split JSON storage into per-course shards")
+    parser.add_argument('--config', default='config.yaml', help="Path to config.yaml")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("🗂️  Smart LMS Per-Course Sharding")
+    print("=" * 60)
+    
+    storage = StorageService(args.config)
+    if not storage.shard_by_course:
+        print("❌ storage.shard_by_course is not enabled in config.yaml")
+        sys.exit(1)
+    
+    print(f"📂 Shards directory: {storage.shards_dir}")
+    counts = storage.reshard_by_course()
+    
+    for collection, count in counts.items():
+        print(f"   ✅ {collection}: {count}")
+    
+    print()
+    print("✅ Sharding complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Smart LMS - Archive Store
+Compressed, read-only archive tier for records and files past the hot window
+"""
+
+import csv
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import os
+import secrets
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from services.file_locks import get_lock_manager, atomic_write
+from services.records import encode_record
+from services.teacher_activity_store import to_epoch
+
+# Identifiers replaced by a keyed pseudonym when records are anonymized
+PSEUDONYM_FIELDS = ('student_id', 'session_id')
+
+# Personal fields dropped (blanked in CSVs) when records are anonymized
+PERSONAL_FIELDS = ('student_name', 'full_name', 'username', 'email', 'enrollment_number',
+                   'ip_address', 'user_agent', 'frame_path')
+
+
+def _month_key(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime('%Y-%m')
+
+
+def _month_end(key: str) -> float:
+    """Epoch of the first instant after month 'YYYY-MM'"""
+    year, month = int(key[:4]), int(key[5:7])
+    if month == 12:
+        year, month = year + 1, 0
+    return datetime(year, month + 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+class ArchiveStore:
+    """
+    Archive tier for records moved out of the hot storage files.
+
+    Layout of the archive directory:
+        <collection>/2024-01.000001.jsonl.gz       gzipped JSON lines, grouped by
+                                                   the month of each record's
+                                                   timestamp
+        <collection>/2024-01.000001.anon.jsonl.gz  the same segment once anonymized
+        files/<kind>/<name>.gz                     archived ml_data files
+        files/<kind>/anon_<digest>.csv.gz          archived CSVs once anonymized
+        anonymization.key                          HMAC key for pseudonyms
+
+    Segments are written once and made read-only; they are only ever
+    replaced whole (anonymized) or deleted (expired), a month at a time.
+    Queries skip segments outside the requested time range (and anonymized
+    ones when filtering by a pseudonymized field), and keep the most
+    recently read segments parsed in memory.
+    """
+
+    SEGMENT_SUFFIX = ".jsonl.gz"
+    ANON_MARK = ".anon"
+    KEY_FILE = "anonymization.key"
+    CACHED_SEGMENTS = 64
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: Root directory of the archive tier
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._file_locks = get_lock_manager()
+        self._key: Optional[bytes] = None
+        # path -> ((mtime_ns, size), records); a segment never changes in place
+        # but the stat check also catches another process replacing it
+        self._segment_cache: 'OrderedDict[Path, Tuple[Tuple[int, int], List[Dict]]]' = OrderedDict()
+
+    # ==================== PSEUDONYMS ====================
+
+    def _anonymization_key(self) -> bytes:
+        """Load (or create, owner-readable only) the pseudonym key"""
+        if self._key is None:
+            path = self.directory / self.KEY_FILE
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                pass
+            else:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(secrets.token_bytes(32))
+            self._key = path.read_bytes()
+        return self._key
+
+    def pseudonym(self, value) -> str:
+        """Stable pseudonym for an identifier (same input, same pseudonym)"""
+        digest = hmac.new(self._anonymization_key(), str(value).encode('utf-8'), hashlib.sha256)
+        return f"anon_{digest.hexdigest()[:16]}"
+
+    def anonymize_record(self, record: Dict) -> Dict:
+        """Copy of a record with identifiers pseudonymized and personal fields dropped"""
+        anonymized = {key: value for key, value in record.items() if key not in PERSONAL_FIELDS}
+        for field in PSEUDONYM_FIELDS:
+            if anonymized.get(field):
+                anonymized[field] = self.pseudonym(anonymized[field])
+        anonymized['anonymized'] = True
+        return anonymized
+
+    # ==================== SEGMENTS ====================
+
+    def _collection_dir(self, collection: str) -> Path:
+        return self.directory / collection
+
+    def _segments(self, collection: str) -> List[Tuple[str, int, bool, Path]]:
+        """List (month, sequence, anonymized, path) in write order"""
+        segments = []
+        directory = self._collection_dir(collection)
+        if not directory.exists():
+            return segments
+        for path in directory.glob(f"*{self.SEGMENT_SUFFIX}"):
+            stem = path.name[:-len(self.SEGMENT_SUFFIX)]
+            anonymized = stem.endswith(self.ANON_MARK)
+            if anonymized:
+                stem = stem[:-len(self.ANON_MARK)]
+            month, _, sequence = stem.partition('.')
+            try:
+                segments.append((month, int(sequence), anonymized, path))
+            except ValueError:
+                continue
+        return sorted(segments)
+
+    def _segment_path(self, collection: str, month: str, sequence: int,
+                      anonymized: bool = False) -> Path:
+        mark = self.ANON_MARK if anonymized else ''
+        name = f"{month}.{sequence:06d}{mark}{self.SEGMENT_SUFFIX}"
+        return self._collection_dir(collection) / name
+
+    @staticmethod
+    def _write_readonly(path: Path, data: bytes):
+        atomic_write(str(path), data)
+        os.chmod(path, 0o444)
+
+    def _remove(self, path: Path):
+        with self._lock:
+            self._segment_cache.pop(path, None)
+        os.chmod(path, 0o644)  # Read-only files cannot be removed on Windows
+        os.remove(path)
+
+    def _write_segment(self, path: Path, records: List[Dict]):
+        lines = b''.join((json.dumps(record, ensure_ascii=False, separators=(',', ':'),
+                                     default=encode_record) + '\n').encode('utf-8')
+                         for record in records)
+        self._write_readonly(path, gzip.compress(lines))
+
+    @staticmethod
+    def _read_segment(path: Path) -> List[Dict]:
+        with gzip.open(path, 'rb') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _cached_segment(self, path: Path) -> List[Dict]:
+        """Parsed records of a segment, decompressed only on the first read"""
+        stat = path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._segment_cache.get(path)
+            if cached and cached[0] == stamp:
+                self._segment_cache.move_to_end(path)
+                return cached[1]
+
+        records = self._read_segment(path)
+        with self._lock:
+            self._segment_cache[path] = (stamp, records)
+            self._segment_cache.move_to_end(path)
+            while len(self._segment_cache) > self.CACHED_SEGMENTS:
+                self._segment_cache.popitem(last=False)
+        return records
+
+    def _collection_lock(self, collection: str):
+        return self._file_locks.lock(str(self._collection_dir(collection)))
+
+    # ==================== RECORDS ====================
+
+    def append(self, collection: str, records: List[Dict], timestamp_field: str) -> int:
+        """Write records into new segments, one per month of their timestamps"""
+        by_month: Dict[str, List[Dict]] = {}
+        for record in records:
+            by_month.setdefault(_month_key(to_epoch(record[timestamp_field])), []).append(record)
+        if not by_month:
+            return 0
+
+        self._collection_dir(collection).mkdir(parents=True, exist_ok=True)
+        with self._lock, self._collection_lock(collection):
+            last_sequence = {}
+            for month, sequence, _, _ in self._segments(collection):
+                last_sequence[month] = max(sequence, last_sequence.get(month, 0))
+            for month, month_records in by_month.items():
+                path = self._segment_path(collection, month, last_sequence.get(month, 0) + 1)
+                self._write_segment(path, month_records)
+        return len(records)
+
+    def query(self, collection: str, key_field: str, timestamp_field: str,
+              since: Optional[str] = None, until: Optional[str] = None, **filters) -> List[Dict]:
+        """
+        Get archived records with since <= timestamp < until (naive-UTC ISO
+        strings, None for unbounded) whose fields match all non-empty filters.
+        A record archived more than once is returned in its latest version.
+        Returns copies; the parsed segments stay cached.
+        """
+        filters = {field: value for field, value in filters.items() if value}
+        first = _month_key(to_epoch(since)) if since else None
+        last = _month_key(to_epoch(until)) if until else None
+        # Pseudonyms never equal a raw id, so anonymized months cannot match
+        skip_anonymized = any(field in PSEUDONYM_FIELDS for field in filters)
+
+        records: Dict[str, Dict] = {}
+        for month, _, anonymized, path in self._segments(collection):
+            if (first and month < first) or (last and month > last):
+                continue
+            if anonymized and skip_anonymized:
+                continue
+            try:
+                segment = self._cached_segment(path)
+            except FileNotFoundError:
+                continue  # Expired or anonymized by a concurrent run
+            for record in segment:
+                timestamp = record.get(timestamp_field) or ''
+                if (since and timestamp < since) or (until and timestamp >= until):
+                    continue
+                if all(record.get(field) == value for field, value in filters.items()):
+                    records[record[key_field]] = record
+        return [dict(record) for record in records.values()]
+
+    def anonymize_before(self, collection: str, cutoff: float) -> int:
+        """Anonymize the segments of months that ended before cutoff (epoch); returns records"""
+        count = 0
+        with self._lock, self._collection_lock(collection):
+            for month, sequence, anonymized, path in self._segments(collection):
+                if anonymized or _month_end(month) > cutoff:
+                    continue
+                records = [self.anonymize_record(record) for record in self._read_segment(path)]
+                target = self._segment_path(collection, month, sequence, anonymized=True)
+                self._write_segment(target, records)
+                self._remove(path)
+                count += len(records)
+        return count
+
+    def expire_before(self, collection: str, cutoff: float) -> List[Dict]:
+        """Delete the segments of months that ended before cutoff (epoch); returns their records"""
+        removed = []
+        with self._lock, self._collection_lock(collection):
+            for month, _, _, path in self._segments(collection):
+                if _month_end(month) > cutoff:
+                    continue
+                removed.extend(self._read_segment(path))
+                self._remove(path)
+        return removed
+
+    # ==================== FILES ====================
+
+    def _files_dir(self, kind: str) -> Path:
+        return self.directory / 'files' / kind
+
+    def archive_file(self, kind: str, source: str) -> str:
+        """Gzip a file into files/<kind>/, keep its mtime, and remove the original"""
+        directory = self._files_dir(kind)
+        directory.mkdir(parents=True, exist_ok=True)
+        mtime = os.path.getmtime(source)
+        target = directory / f"{os.path.basename(source)}.gz"
+        if target.exists():
+            # A file with this name was archived before (e.g. a monthly log
+            # that was appended to again): keep both
+            stem, ext = os.path.splitext(os.path.basename(source))
+            target = directory / f"{stem}_{int(mtime)}{ext}.gz"
+
+        buffer = io.BytesIO()
+        with open(source, 'rb') as src, \
+                gzip.GzipFile(fileobj=buffer, mode='wb', mtime=mtime) as dst:
+            shutil.copyfileobj(src, dst)
+        self._write_readonly(target, buffer.getvalue())
+        os.utime(target, (mtime, mtime))
+        os.remove(source)
+        return str(target)
+
+    def archived_files(self, kind: str) -> List[str]:
+        """List archived files of one kind (e.g. 'csv_logs'), oldest first"""
+        directory = self._files_dir(kind)
+        if not directory.exists():
+            return []
+        return sorted((str(path) for path in directory.glob('*.gz')), key=os.path.getmtime)
+
+    @staticmethod
+    def is_anonymized_file(path: str) -> bool:
+        return os.path.basename(path).startswith('anon_')
+
+    @staticmethod
+    def open_file(path: str):
+        """Open an archived file for reading as text (e.g. for csv.DictReader)"""
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+
+    def anonymize_csv_file(self, path: str) -> str:
+        """Replace an archived CSV with an anonymized copy under a pseudonymous name"""
+        with self.open_file(path) as f:
+            reader = csv.DictReader(f)
+            fieldnames = reader.fieldnames or []
+            rows = list(reader)
+
+        for row in rows:
+            for field in PSEUDONYM_FIELDS:
+                if row.get(field):
+                    row[field] = self.pseudonym(row[field])
+            for field in PERSONAL_FIELDS:
+                if field in row:
+                    row[field] = ''
+
+        text = io.StringIO()
+        writer = csv.DictWriter(text, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+        # The original name embeds the student id
+        name = os.path.basename(path)[:-len('.csv.gz')]
+        target = os.path.join(os.path.dirname(path), f"{self.pseudonym(name)}.csv.gz")
+        mtime = os.path.getmtime(path)
+        data = gzip.compress(text.getvalue().encode('utf-8'), mtime=mtime)
+        self._write_readonly(Path(target), data)
+        os.utime(target, (mtime, mtime))
+        self._remove(Path(path))
+        return target
+
+    def remove_file(self, path: str):
+        """Delete an archived file"""
+        self._remove(Path(path))
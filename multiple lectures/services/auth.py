@@ -6,9 +6,11 @@ Secure password hashing and role-based access control
 import bcrypt
 import streamlit as st
 from typing import Optional, Dict
-from datetime import datetime
 from services.storage import get_storage
 
+# bcrypt work factor for stored password hashes
+BCRYPT_ROUNDS = 12
+
 
 class AuthService:
     """Authentication and authorization service"""
@@ -21,7 +23,7 @@ class AuthService:
     @staticmethod
     def hash_password(password: str) -> str:
         """Hash password using bcrypt"""
-        salt = bcrypt.gensalt(rounds=12)
+        salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
         hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
         return hashed.decode('utf-8')
     
@@ -38,18 +40,11 @@ class AuthService:
         Authenticate user and return user data if successful
         Returns None if authentication fails
         """
-        # Get all users and find by username
-        all_users = self.storage.get_all_users()
-        user = None
-        user_id = None
+        # Indexed lookup by username
+        user = self.storage.get_user_by_username(username)
         
-        for uid, u in all_users.items():
-            if u.get('username') == username:
-                user = u
-                user_id = uid
-                break
-        
-        if not user:
+        user_id = user.get('user_id') if user else None
+        if not user_id:
             return None
         
         # Check if account is locked
@@ -58,24 +53,12 @@ class AuthService:
         
         # Verify password
         if not self.verify_password(password, user['password_hash']):
-            # Increment failed login attempts
-            failed_attempts = user.get('failed_login_attempts', 0) + 1
-            self.storage.update_user(user_id, {
-                'failed_login_attempts': failed_attempts,
-                'last_failed_login': datetime.utcnow().isoformat()
-            })
-            
-            # Lock account if too many attempts
-            if failed_attempts >= self.max_login_attempts:
-                self.storage.update_user(user_id, {'is_active': False})
-            
+            # Count the failure (and lock the account if needed) in one write
+            self.storage.record_login_attempt(user_id, False, self.max_login_attempts)
             return None
         
         # Successful login - update user record
-        self.storage.update_user(user_id, {
-            'last_login': datetime.utcnow().isoformat(),
-            'failed_login_attempts': 0
-        })
+        self.storage.record_login_attempt(user_id, True, self.max_login_attempts)
         
         return {
             'user_id': user_id,
@@ -92,10 +75,10 @@ class AuthService:
         Returns True if successful, False if username exists
         """
         # Check if username already exists
+        if self.storage.get_user_by_username(username):
+            return False
+        
         all_users = self.storage.get_all_users()
-        for user in all_users.values():
-            if user.get('username') == username:
-                return False
         
         # Generate user ID
         user_id = f"{role}_{len(all_users) + 1}"
@@ -129,18 +112,16 @@ class AuthService:
     
     def reset_password(self, username: str, new_password: str) -> bool:
         """Reset password (admin function)"""
-        all_users = self.storage.get_all_users()
-        
-        for user_id, user in all_users.items():
-            if user.get('username') == username:
-                new_hash = self.hash_password(new_password)
-                return self.storage.update_user(user_id, {
-                    'password_hash': new_hash,
-                    'is_active': True,
-                    'failed_login_attempts': 0
-                })
+        user = self.storage.get_user_by_username(username)
+        if not user or not user.get('user_id'):
+            return False
         
-        return False
+        new_hash = self.hash_password(new_password)
+        return self.storage.update_user(user['user_id'], {
+            'password_hash': new_hash,
+            'is_active': True,
+            'failed_login_attempts': 0
+        })
     
     @staticmethod
     def check_role(required_role: str) -> bool:
@@ -0,0 +1,197 @@
+"""
+Smart LMS - Storage Change Feed
+Per-collection version counters and the record ids changed at each version
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from services.file_locks import get_lock_manager, atomic_write
+
+
+class _FeedState:
+    """In-memory tail of one collection's change log"""
+
+    __slots__ = ('inode', 'offset', 'entries')
+
+    def __init__(self):
+        self.inode = None
+        self.offset = 0
+        self.entries: List[Tuple[int, Optional[List[str]]]] = []
+
+    @property
+    def version(self) -> int:
+        return self.entries[-1][0] if self.entries else 0
+
+    @property
+    def oldest(self) -> int:
+        """Lowest version whose changes are still known"""
+        return self.entries[0][0] if self.entries else self.version + 1
+
+
+class ChangeFeed:
+    """
+    Append-only change log per collection.
+
+    Layout of the feed directory:
+        <collection>.log   one JSON line per committed write:
+                           [version, [record ids]] or [version, null] when
+                           the whole collection was replaced
+
+    Every committed write bumps the collection's version by one. Readers
+    remember the version they last saw and ask for the ids changed since
+    then instead of re-reading the collection; logs are tailed
+    incrementally, so an unchanged collection costs one stat(). Only the
+    most recent `retain` versions are kept: a reader that fell further
+    behind is told to reload everything.
+    """
+
+    LOG_SUFFIX = ".log"
+
+    def __init__(self, directory: str, retain: int = 10000):
+        """
+        Args:
+            directory: Directory holding one log per collection
+            retain: Number of recent versions whose changed ids are kept
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.retain = retain
+
+        self._lock = threading.RLock()
+        self._file_locks = get_lock_manager()
+        self._states: Dict[str, _FeedState] = {}
+
+    def _log_path(self, collection: str) -> Path:
+        return self.directory / f"{collection}{self.LOG_SUFFIX}"
+
+    def _refresh(self, collection: str) -> _FeedState:
+        """Bring a collection's in-memory tail up to date with its log"""
+        state = self._states.get(collection)
+        if state is None:
+            state = self._states[collection] = _FeedState()
+
+        try:
+            stat = os.stat(self._log_path(collection))
+        except FileNotFoundError:
+            state.__init__()
+            return state
+
+        # A different inode means the log was trimmed by another process
+        if state.inode != stat.st_ino or stat.st_size < state.offset:
+            state.__init__()
+            state.inode = stat.st_ino
+
+        if stat.st_size > state.offset:
+            with open(self._log_path(collection), 'rb') as f:
+                f.seek(state.offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Partially written tail; picked up next time
+                    state.offset += len(line)
+                    try:
+                        version, ids = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue
+                    state.entries.append((version, ids))
+        return state
+
+    @staticmethod
+    def _encode(version: int, ids: Optional[List[str]]) -> bytes:
+        line = json.dumps([version, ids], ensure_ascii=False, separators=(',', ':'))
+        return (line + '\n').encode('utf-8')
+
+    def _trim(self, collection: str, state: _FeedState):
+        """Rewrite the log keeping only the most recent `retain` versions"""
+        kept = state.entries[-self.retain:]
+        atomic_write(str(self._log_path(collection)),
+                     b''.join(self._encode(version, ids) for version, ids in kept))
+        self._refresh(collection)
+
+    # ==================== PUBLIC API ====================
+
+    def record(self, collection: str, ids: Optional[List[str]]) -> int:
+        """
+        Record one committed write and return the collection's new version.
+        Pass ids=None when the whole collection was replaced.
+        """
+        if ids is not None:
+            ids = list(dict.fromkeys(str(record_id) for record_id in ids))
+        path = self._log_path(collection)
+        with self._lock, self._file_locks.lock(str(path)):
+            state = self._refresh(collection)
+            version = state.version + 1
+            with open(path, 'ab') as f:
+                f.write(self._encode(version, ids))
+            state = self._refresh(collection)
+            if len(state.entries) > 2 * self.retain:
+                self._trim(collection, state)
+        return version
+
+    def version(self, collection: str) -> int:
+        """Current version of a collection (0 if it never changed)"""
+        with self._lock:
+            return self._refresh(collection).version
+
+    def iter_changes(self, collection: str,
+                     since: int) -> Iterator[Tuple[int, Optional[List[str]]]]:
+        """
+        Iterate over (version, ids) committed after version `since`.
+        Yields a single (version, None) when the changes are no longer
+        known (or the whole collection was replaced): reload everything.
+        """
+        with self._lock:
+            state = self._refresh(collection)
+            entries = list(state.entries)
+            current, oldest = state.version, state.oldest
+
+        if since == current:
+            return
+        if since < oldest - 1 or since > current:
+            yield current, None
+            return
+        for version, ids in entries:
+            if version > since:
+                yield version, ids
+
+    def changes_since(self, collection: str, since: int) -> Tuple[int, Optional[List[str]]]:
+        """
+        Get (current version, ids changed after `since`).
+        The ids are None when the caller has to reload the whole collection.
+        """
+        version, changed = since, {}
+        for version, ids in self.iter_changes(collection, since):
+            if ids is None:
+                return version, None
+            changed.update(dict.fromkeys(ids))
+        return version, list(changed)
+
+    def subscribe(self, *collections: str) -> 'ChangeSubscription':
+        """Start following collections from their current versions"""
+        return ChangeSubscription(self, collections)
+
+
+class ChangeSubscription:
+    """
+    Cursor over one or more collections' change feeds.
+
+    Keep it across reruns (e.g. in st.session_state) and call poll():
+    it returns only the collections that changed since the last poll.
+    """
+
+    def __init__(self, feed: ChangeFeed, collections):
+        self.feed = feed
+        self.versions = {collection: feed.version(collection) for collection in collections}
+
+    def poll(self) -> Dict[str, Optional[List[str]]]:
+        """Get {collection: changed ids, or None to reload} and advance the cursor"""
+        changes = {}
+        for collection, since in self.versions.items():
+            version, ids = self.feed.changes_since(collection, since)
+            if version != since:
+                changes[collection] = ids
+                self.versions[collection] = version
+        return changes
@@ -0,0 +1,51 @@
+"""
+Smart LMS - Configuration
+config.yaml parsed once per process and shared by every service
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import yaml
+
+_configs: Dict[str, Tuple[Tuple[int, int], Dict]] = {}
+_configs_lock = threading.Lock()
+
+
+def get_config(config_path: str = "config.yaml") -> Dict:
+    """
+    Get the parsed config file.
+
+    Every service asks here instead of parsing config.yaml itself: the
+    file is parsed on first use and again only when it changes on disk
+    (one stat() per call). The returned dict is shared, so treat it as
+    read-only and copy any section you need to modify.
+
+    Raises:
+        FileNotFoundError: If the config file does not exist
+    """
+    path = os.path.abspath(config_path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    with _configs_lock:
+        cached = _configs.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+    with open(path, 'r') as f:
+        config = yaml.safe_load(f) or {}
+
+    with _configs_lock:
+        _configs[path] = (signature, config)
+    return config
+
+
+def reload_config(config_path: Optional[str] = None):
+    """Forget a parsed config (or all of them) so the next get_config re-reads it"""
+    with _configs_lock:
+        if config_path is None:
+            _configs.clear()
+        else:
+            _configs.pop(os.path.abspath(config_path), None)
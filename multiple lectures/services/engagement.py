@@ -5,29 +5,28 @@ Real-time webcam engagement using MediaPipe and offline OpenFace integration
 
 import cv2
 import numpy as np
-import yaml
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 import subprocess
 import os
 
+from services.config import get_config
+
 
 class EngagementTracker:
     """Engagement tracking using MediaPipe (real-time) or OpenFace (offline)"""
     
     def __init__(self, config_path: str = "config.yaml"):
         """Initialize engagement tracker"""
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        self.config = get_config(config_path)
         
         self.engagement_config = self.config['engagement']
         self.mode = self.engagement_config['mode']
         self.sampling_rate = self.engagement_config['sampling_rate']
         self.weights = self.engagement_config['weights']
         
-        # Initialize MediaPipe if in realtime mode
-        if self.mode == 'realtime':
-            self._init_mediapipe()
+        # MediaPipe is imported and its graph built on the first realtime frame
+        self.face_mesh = None
     
     def _init_mediapipe(self):
         """Initialize MediaPipe Face Mesh"""
@@ -62,6 +61,9 @@ class EngagementTracker:
     
     def _process_frame_mediapipe(self, frame: np.ndarray) -> Dict:
         """Process frame using MediaPipe Face Mesh"""
+        if self.face_mesh is None:
+            self._init_mediapipe()
+        
         # Convert BGR to RGB
         rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         
@@ -11,6 +11,8 @@ import numpy as np
 from typing import Dict, List, Optional
 import streamlit as st
 
+from services.config import get_config
+
 
 class EngagementCalibrator:
     """
@@ -38,12 +40,10 @@ class EngagementCalibrator:
     
     def _load_config(self) -> Dict:
         """Load configuration from config.yaml"""
-        config_path = Path('./config.yaml')
-        if config_path.exists():
-            import yaml
-            with open(config_path, 'r') as f:
-                return yaml.safe_load(f)
-        return {}
+        try:
+            return get_config()
+        except FileNotFoundError:
+            return {}
     
     def needs_calibration(self, student_id: str) -> bool:
         """Check if student needs calibration"""
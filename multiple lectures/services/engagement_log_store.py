@@ -0,0 +1,371 @@
+"""
+Smart LMS - Engagement Log Store
+Append-only, log-structured storage for engagement sessions
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from services.file_locks import get_lock_manager, atomic_write
+
+
+class EngagementLogStore:
+    """
+    Append-only segment log for engagement sessions.
+
+    Layout of the store directory:
+        segment_000001.log   one JSON record per line, never rewritten
+        index.log            one JSON line per write:
+                             [log_id, segment, offset, length, student_id, lecture_id]
+                             (segment null: the session was removed)
+
+    The index is small (no events payload), is replayed into memory on
+    open and is tailed incrementally when another process appends to it.
+    Saving a session costs one line in a segment plus one index line;
+    filtered queries seek straight to the matching records. Records that
+    are overwritten leave dead bytes behind, which compaction reclaims.
+    Appends, compaction and the legacy import hold the index file lock,
+    so several processes can share one store directory.
+    """
+
+    SEGMENT_PREFIX = "segment_"
+    SEGMENT_SUFFIX = ".log"
+    INDEX_FILE = "index.log"
+
+    def __init__(self, directory: str, legacy_json_path: Optional[str] = None,
+                 segment_max_bytes: int = 64 * 1024 * 1024,
+                 compaction_min_bytes: int = 8 * 1024 * 1024,
+                 compaction_ratio: float = 0.5):
+        """
+        Args:
+            directory: Directory holding segments and the index
+            legacy_json_path: Old engagement_logs.json, imported once if present
+            segment_max_bytes: Roll over to a new segment past this size
+            compaction_min_bytes: Never compact below this many dead bytes
+            compaction_ratio: Compact once dead bytes exceed this share of live bytes
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.directory / self.INDEX_FILE
+
+        self.segment_max_bytes = segment_max_bytes
+        self.compaction_min_bytes = compaction_min_bytes
+        self.compaction_ratio = compaction_ratio
+
+        self._lock = threading.RLock()
+        self._file_locks = get_lock_manager()
+        self._reset_index()
+
+        if legacy_json_path and not self.index_path.exists():
+            with self._file_locks.lock(str(self.index_path)):
+                if not self.index_path.exists():
+                    self._import_legacy_json(legacy_json_path)
+
+        self._refresh_index()
+
+    # ==================== INDEX ====================
+
+    def _reset_index(self):
+        """Clear the in-memory index"""
+        # log_id -> (segment, offset, length, student_id, lecture_id)
+        self._entries: Dict[str, Tuple] = {}
+        self._by_student: Dict[str, Dict[str, None]] = {}
+        self._by_lecture: Dict[str, Dict[str, None]] = {}
+        self._index_signature = None
+        self._index_offset = 0
+        self._live_bytes = 0
+        self._dead_bytes = 0
+
+    def _apply_index_entry(self, entry: List):
+        """Apply one index line to the in-memory index"""
+        log_id, segment, offset, length, student_id, lecture_id = entry
+
+        previous = self._entries.pop(log_id, None)
+        if previous is not None:
+            self._live_bytes -= previous[2]
+            self._dead_bytes += previous[2]
+            self._by_student.get(previous[3], {}).pop(log_id, None)
+            self._by_lecture.get(previous[4], {}).pop(log_id, None)
+
+        if segment is None:
+            return  # Removal marker
+
+        self._entries[log_id] = (segment, offset, length, student_id, lecture_id)
+        self._live_bytes += length
+        self._by_student.setdefault(student_id, {})[log_id] = None
+        self._by_lecture.setdefault(lecture_id, {})[log_id] = None
+
+    def _refresh_index(self):
+        """Bring the in-memory index up to date with index.log"""
+        with self._lock:
+            try:
+                stat = os.stat(self.index_path)
+            except FileNotFoundError:
+                self._reset_index()
+                return
+
+            # A different inode means the index was rewritten by compaction
+            if self._index_signature != stat.st_ino or stat.st_size < self._index_offset:
+                self._reset_index()
+                self._index_signature = stat.st_ino
+
+            if stat.st_size == self._index_offset:
+                return
+
+            with open(self.index_path, 'rb') as f:
+                f.seek(self._index_offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Partially written tail; picked up next time
+                    self._index_offset += len(line)
+                    try:
+                        self._apply_index_entry(json.loads(line))
+                    except (ValueError, TypeError):
+                        continue
+
+    # ==================== SEGMENTS ====================
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"{self.SEGMENT_PREFIX}{segment:06d}{self.SEGMENT_SUFFIX}"
+
+    def _segment_numbers(self) -> List[int]:
+        """List existing segment numbers in ascending order"""
+        numbers = []
+        for path in self.directory.glob(f"{self.SEGMENT_PREFIX}*{self.SEGMENT_SUFFIX}"):
+            try:
+                numbers.append(int(path.stem[len(self.SEGMENT_PREFIX):]))
+            except ValueError:
+                continue
+        return sorted(numbers)
+
+    def _active_segment(self) -> int:
+        """Segment that receives the next append, rolling over when full"""
+        numbers = self._segment_numbers()
+        if not numbers:
+            return 1
+        last = numbers[-1]
+        if os.path.getsize(self._segment_path(last)) >= self.segment_max_bytes:
+            return last + 1
+        return last
+
+    @staticmethod
+    def _encode(record: Dict) -> bytes:
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        return (line + '\n').encode('utf-8')
+
+    def _write_records(self, records: List[Dict]):
+        """Append records to the active segment and index them"""
+        segment = self._active_segment()
+        index_lines = []
+
+        with open(self._segment_path(segment), 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            for record in records:
+                data = self._encode(record)
+                f.write(data)
+                index_lines.append([
+                    record['log_id'], segment, offset, len(data),
+                    record.get('student_id'), record.get('lecture_id')
+                ])
+                offset += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # The index line is written last: a crash in between only leaves an
+        # unreferenced record in the segment
+        with open(self.index_path, 'ab') as f:
+            f.write(b''.join(self._encode(line) for line in index_lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _iter_raw(self, entries: List[Tuple]) -> Iterator[bytes]:
+        """Yield raw record bytes for index entries, opening each segment once"""
+        handles = {}
+        try:
+            for segment, offset, length, _, _ in entries:
+                f = handles.get(segment)
+                if f is None:
+                    f = handles[segment] = open(self._segment_path(segment), 'rb')
+                f.seek(offset)
+                yield f.read(length)
+        finally:
+            for f in handles.values():
+                f.close()
+
+    def _read_entries(self, entries: List[Tuple]) -> List[Dict]:
+        """Read and decode records for index entries"""
+        return [json.loads(data) for data in self._iter_raw(entries)]
+
+    def _read_matching(self, select) -> List[Dict]:
+        """
+        Read the records whose log_ids select() picks from the current index.
+        Another process may compact away a segment after our index refresh;
+        that shows up as a missing segment, so refresh once and retry.
+        """
+        with self._lock:
+            self._refresh_index()
+            try:
+                return self._read_entries([self._entries[lid] for lid in select()])
+            except FileNotFoundError:
+                self._refresh_index()
+                return self._read_entries([self._entries[lid] for lid in select()])
+
+    # ==================== PUBLIC API ====================
+
+    def append(self, record: Dict):
+        """Append one engagement session (overwrites any earlier record with the same log_id)"""
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict]):
+        """Append several sessions with one segment write and one index write"""
+        if not records:
+            return
+        with self._lock, self._file_locks.lock(str(self.index_path)):
+            self._refresh_index()
+            self._write_records(records)
+            self._refresh_index()
+            if self._should_compact():
+                self.compact()
+
+    def evict(self, predicate: Callable[[Dict], bool],
+              before_remove: Optional[Callable[[List[Dict]], None]] = None) -> int:
+        """
+        Remove every session for which predicate(record) is true.
+
+        before_remove(records) runs first, under the store lock (e.g. to
+        archive them): if it raises, nothing is removed. Returns the number
+        of sessions removed; compaction reclaims their bytes.
+        """
+        with self._lock, self._file_locks.lock(str(self.index_path)):
+            records = [record for record in self.iter_all() if predicate(record)]
+            if not records:
+                return 0
+            if before_remove is not None:
+                before_remove(records)
+
+            with open(self.index_path, 'ab') as f:
+                f.write(b''.join(self._encode([record['log_id'], None, 0, 0, None, None])
+                                 for record in records))
+                f.flush()
+                os.fsync(f.fileno())
+            self._refresh_index()
+            if self._should_compact():
+                self.compact()
+        return len(records)
+
+    def get(self, log_id: str) -> Optional[Dict]:
+        """Get one session by log_id"""
+        # Read under the lock so compaction cannot remove the segment mid-read
+        records = self._read_matching(lambda: [log_id] if log_id in self._entries else [])
+        return records[0] if records else None
+
+    def query(self, student_id: Optional[str] = None,
+              lecture_id: Optional[str] = None) -> List[Dict]:
+        """Get sessions filtered by student and/or lecture, reading only matches"""
+        def select() -> List[str]:
+            if student_id and lecture_id:
+                by_lecture = self._by_lecture.get(lecture_id, {})
+                return [lid for lid in self._by_student.get(student_id, {}) if lid in by_lecture]
+            if student_id:
+                return list(self._by_student.get(student_id, {}))
+            if lecture_id:
+                return list(self._by_lecture.get(lecture_id, {}))
+            return list(self._entries)
+
+        return self._read_matching(select)
+
+    def iter_all(self) -> Iterator[Dict]:
+        """Iterate over every live session"""
+        yield from self.query()
+
+    def __contains__(self, log_id: str) -> bool:
+        with self._lock:
+            self._refresh_index()
+            return log_id in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh_index()
+            return len(self._entries)
+
+    def stats(self) -> Dict:
+        """Get size statistics for the store"""
+        with self._lock:
+            self._refresh_index()
+            return {
+                'records': len(self._entries),
+                'segments': len(self._segment_numbers()),
+                'live_bytes': self._live_bytes,
+                'dead_bytes': self._dead_bytes
+            }
+
+    # ==================== COMPACTION ====================
+
+    def _should_compact(self) -> bool:
+        return (self._dead_bytes >= self.compaction_min_bytes and
+                self._dead_bytes > self._live_bytes * self.compaction_ratio)
+
+    def compact(self):
+        """Rewrite live records into fresh segments and drop the old ones"""
+        with self._lock, self._file_locks.lock(str(self.index_path)):
+            self._refresh_index()
+            old_segments = self._segment_numbers()
+            next_segment = (old_segments[-1] + 1) if old_segments else 1
+
+            index_lines = []
+            segment, offset = next_segment, 0
+            out = open(self._segment_path(segment), 'wb')
+            try:
+                live = list(self._entries.items())
+                raw_records = self._iter_raw([entry for _, entry in live])
+                for (log_id, entry), data in zip(live, raw_records):
+                    if offset and offset + len(data) > self.segment_max_bytes:
+                        out.close()
+                        segment, offset = segment + 1, 0
+                        out = open(self._segment_path(segment), 'wb')
+                    out.write(data)
+                    index_lines.append([log_id, segment, offset, len(data), entry[3], entry[4]])
+                    offset += len(data)
+                out.flush()
+                os.fsync(out.fileno())
+            finally:
+                out.close()
+
+            atomic_write(str(self.index_path), b''.join(self._encode(line) for line in index_lines))
+
+            for number in old_segments:
+                try:
+                    os.remove(self._segment_path(number))
+                except FileNotFoundError:
+                    pass
+
+            self._reset_index()
+            self._refresh_index()
+
+    # ==================== MIGRATION ====================
+
+    def _import_legacy_json(self, legacy_json_path: str):
+        """Import the old whole-file engagement_logs.json once"""
+        if not os.path.exists(legacy_json_path):
+            return
+        try:
+            with open(legacy_json_path, 'r', encoding='utf-8') as f:
+                logs = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+
+        records = []
+        for log_id, record in logs.items():
+            record.setdefault('log_id', log_id)
+            records.append(record)
+
+        if records:
+            self._write_records(records)
+        else:
+            # Create an empty index so the import is not attempted again
+            self.index_path.touch()
+
+        os.replace(legacy_json_path, f"{legacy_json_path}.migrated")
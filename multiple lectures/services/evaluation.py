@@ -3,7 +3,6 @@ Smart LMS - Teacher Evaluation Service
 XGBoost/RandomForest model with SHAP explainability
 """
 
-import yaml
 import numpy as np
 import pandas as pd
 from typing import Dict, List, Optional, Tuple
@@ -11,14 +10,15 @@ from datetime import datetime, timedelta
 import joblib
 import os
 
+from services.config import get_config
+
 
 class TeacherEvaluationService:
     """Teacher evaluation using ML models with explainability"""
     
     def __init__(self, config_path: str = "config.yaml"):
         """Initialize evaluation service"""
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        self.config = get_config(config_path)
         
         self.eval_config = self.config['evaluation']
         self.model_type = self.eval_config['model']
@@ -27,17 +27,22 @@ class TeacherEvaluationService:
         
         self.model = None
         self.feature_names = None
+        self._explainer = None  # SHAP explainer, built once per loaded model
         
-        # Try to load existing model
-        self._load_model()
+        # A saved model (and xgboost/sklearn with it) is loaded on first use
+        self._model_loaded = False
     
     def _load_model(self):
         """Load pre-trained model if exists"""
+        self._model_loaded = True
         model_path = f"./ml/models/evaluation_{self.model_type}.pkl"
         
         if os.path.exists(model_path):
             try:
                 self.model = joblib.load(model_path)
+                self._explainer = None
+                if hasattr(self.model, 'feature_names_in_'):
+                    self.feature_names = list(self.model.feature_names_in_)
                 print(f"✅ Loaded evaluation model: {model_path}")
             except Exception as e:
                 print(f"⚠️ Failed to load model: {e}")
@@ -53,73 +58,42 @@ class TeacherEvaluationService:
         Returns:
             Dictionary with features or None if insufficient data
         """
-        # Get teacher's courses
-        courses = storage.get_all_courses(teacher_id=teacher_id)
+        # Running per-course sums/counts maintained by the storage write paths
+        aggregates = storage.get_teacher_aggregates(teacher_id)
         
-        if not courses:
+        if not aggregates:
             return None
         
         # Initialize feature dict
         features = {
             'teacher_id': teacher_id,
-            'num_courses': len(courses)
+            'num_courses': aggregates['num_courses']
         }
         
-        # Aggregate data across all courses
-        all_engagement_scores = []
-        all_feedback = []
-        all_quiz_scores = []
-        all_assignment_scores = []
-        total_students = 0
-        
-        for course_id, course in courses.items():
-            # Get enrolled students
-            students = course.get('enrolled_students', [])
-            total_students += len(students)
-            
-            # Get lectures
-            lectures = storage.get_course_lectures(course_id)
-            
-            for lecture in lectures:
-                lecture_id = lecture['lecture_id']
-                
-                # Get engagement logs
-                engagement_logs = storage.get_engagement_logs(lecture_id=lecture_id)
-                all_engagement_scores.extend([log['engagement_score'] for log in engagement_logs])
-                
-                # Get feedback
-                feedback = storage.get_feedback(lecture_id=lecture_id)
-                all_feedback.extend(feedback)
-            
-            # Get grades for students in this course
-            for student_id in students:
-                grades = storage.get_student_grades(student_id)
-                
-                # Filter by course
-                course_quizzes = [q for q in grades.get('quizzes', []) if q.get('course_id') == course_id]
-                course_assignments = [a for a in grades.get('assignments', []) if a.get('course_id') == course_id]
-                
-                all_quiz_scores.extend([q['percentage'] for q in course_quizzes])
-                all_assignment_scores.extend([a['percentage'] for a in course_assignments])
+        engagement = aggregates['engagement_score']
+        feedback = aggregates['feedback_rating']
+        quizzes = aggregates['quiz_percentage']
+        assignments = aggregates['assignment_percentage']
+        attendance = aggregates['attendance_percentage']
+        total_students = aggregates['total_students']
         
         # Feature 1: Average engagement score
-        features['avg_engagement_score'] = np.mean(all_engagement_scores) if all_engagement_scores else 0
+        features['avg_engagement_score'] = engagement['mean'] if engagement['count'] else 0
         
         # Feature 2: Average feedback sentiment
-        if all_feedback:
-            avg_rating = np.mean([f['rating'] for f in all_feedback])
-            features['avg_feedback_sentiment'] = avg_rating / 5.0  # Normalize to 0-1
+        if feedback['count']:
+            features['avg_feedback_sentiment'] = feedback['mean'] / 5.0  # Normalize to 0-1
         else:
             features['avg_feedback_sentiment'] = 0.5  # Neutral
         
         # Feature 3: Average quiz score
-        features['avg_quiz_score'] = np.mean(all_quiz_scores) / 100 if all_quiz_scores else 0
+        features['avg_quiz_score'] = quizzes['mean'] / 100 if quizzes['count'] else 0
         
         # Feature 4: Average assignment score
-        features['avg_assignment_score'] = np.mean(all_assignment_scores) / 100 if all_assignment_scores else 0
+        features['avg_assignment_score'] = assignments['mean'] / 100 if assignments['count'] else 0
         
         # Feature 5: Feedback count (normalized by students)
-        features['feedback_count'] = len(all_feedback) / max(total_students, 1)
+        features['feedback_count'] = feedback['count'] / max(total_students, 1)
         
         # Feature 6-10: Teacher activity metrics
         teacher_activity = storage.get_teacher_activity(teacher_id, days=30)
@@ -139,15 +113,8 @@ class TeacherEvaluationService:
         features['response_time'] = 1.0 / max(login_count, 1)  # Inverse of activity
         
         # Feature 12: Attendance rate (from attendance tracking)
-        attendance_records = []
-        for course_id in courses.keys():
-            lectures = storage.get_course_lectures(course_id)
-            for lecture in lectures:
-                lecture_attendance = storage.get_attendance(lecture_id=lecture['lecture_id'])
-                attendance_records.extend(lecture_attendance)
-        
-        if attendance_records:
-            features['attendance_rate'] = np.mean([a['presence_percentage'] for a in attendance_records]) / 100
+        if attendance['count']:
+            features['attendance_rate'] = attendance['mean'] / 100
         else:
             features['attendance_rate'] = 0.75  # Default
         
@@ -188,6 +155,8 @@ class TeacherEvaluationService:
             raise ValueError(f"Unknown model type: {self.model_type}")
         
         self.model.fit(X, y)
+        self._model_loaded = True
+        self._explainer = None
         
         # Save model
         model_path = f"./ml/models/evaluation_{self.model_type}.pkl"
@@ -206,26 +175,43 @@ class TeacherEvaluationService:
         Returns:
             Tuple of (score, shap_values_dict)
         """
+        return self.predict_scores([features])[0]
+    
+    def predict_scores(self, features_list: List[Dict]) -> List[Tuple[float, Optional[Dict]]]:
+        """
+        Predict scores for many teachers with one model call
+        
+        Args:
+            features_list: Feature dictionaries, one per teacher
+        
+        Returns:
+            List of (score, shap_values_dict) in the same order
+        """
+        if not features_list:
+            return []
+        
+        if not self._model_loaded:
+            self._load_model()
+        
         if self.model is None:
             # No model trained, use simple weighted average
-            return self._predict_simple(features), None
+            return [(self._predict_simple(features), None) for features in features_list]
         
-        # Prepare feature vector
-        feature_vector = [features.get(f, 0) for f in self.feature_names]
-        X = np.array(feature_vector).reshape(1, -1)
-        
-        # Predict
-        score = self.model.predict(X)[0]
+        # One feature matrix for all teachers
+        X = np.array(
+            [[features.get(f, 0) for f in self.feature_names] for features in features_list],
+            dtype=float
+        )
         
-        # Clip to 0-100 range
-        score = np.clip(score, 0, 100)
+        # Predict and clip to 0-100 range
+        scores = np.clip(self.model.predict(X), 0, 100)
         
-        # Compute SHAP values if enabled
-        shap_values = None
+        # Compute SHAP values for the whole matrix if enabled
+        shap_rows = [None] * len(features_list)
         if self.shap_enabled:
-            shap_values = self._compute_shap_values(X)
+            shap_rows = self._compute_shap_values_batch(X)
         
-        return float(score), shap_values
+        return [(float(score), shap_values) for score, shap_values in zip(scores, shap_rows)]
     
     def _predict_simple(self, features: Dict) -> float:
         """Simple weighted average prediction when no model is trained"""
@@ -242,6 +228,16 @@ class TeacherEvaluationService:
         
         return np.clip(score, 0, 100)
     
+    def _get_explainer(self):
+        """Get the SHAP explainer for the loaded model, building it on first use"""
+        if self._explainer is None:
+            import shap
+            
+            if self.model_type in ('xgboost', 'random_forest'):
+                self._explainer = shap.TreeExplainer(self.model)
+        
+        return self._explainer
+    
     def _compute_shap_values(self, X: np.ndarray) -> Dict:
         """
         Compute SHAP values for explainability
@@ -252,47 +248,59 @@ class TeacherEvaluationService:
         Returns:
             Dictionary with SHAP values and feature importances
         """
+        return self._compute_shap_values_batch(X)[0]
+    
+    def _compute_shap_values_batch(self, X: np.ndarray) -> List[Optional[Dict]]:
+        """
+        Compute SHAP values for every row of a feature matrix in one call
+        
+        Args:
+            X: Feature matrix (n_teachers x n_features)
+        
+        Returns:
+            One SHAP dictionary per row (None entries if SHAP is unavailable)
+        """
         try:
-            import shap
-            
-            # Create explainer
-            if self.model_type == 'xgboost':
-                explainer = shap.TreeExplainer(self.model)
-            elif self.model_type == 'random_forest':
-                explainer = shap.TreeExplainer(self.model)
-            else:
-                return None
+            explainer = self._get_explainer()
+            if explainer is None:
+                return [None] * len(X)
             
             # Compute SHAP values
-            shap_values = explainer.shap_values(X)
+            shap_values = np.asarray(explainer.shap_values(X))
             
             # Get base value (expected value)
-            base_value = explainer.expected_value
-            
-            # Create feature importance dict
-            feature_importance = {}
-            for i, feature_name in enumerate(self.feature_names):
-                feature_importance[feature_name] = float(shap_values[0][i])
+            base_value = float(np.ravel(explainer.expected_value)[0])
+            max_display = self.eval_config['shap']['max_display']
             
-            # Sort by absolute importance
-            sorted_features = sorted(
-                feature_importance.items(),
-                key=lambda x: abs(x[1]),
-                reverse=True
-            )
+            results = []
+            for row in shap_values:
+                # Create feature importance dict
+                feature_importance = {
+                    feature_name: float(row[i])
+                    for i, feature_name in enumerate(self.feature_names)
+                }
+                
+                # Sort by absolute importance
+                sorted_features = sorted(
+                    feature_importance.items(),
+                    key=lambda x: abs(x[1]),
+                    reverse=True
+                )
+                
+                results.append({
+                    'base_value': base_value,
+                    'feature_importance': feature_importance,
+                    'top_features': sorted_features[:max_display]
+                })
             
-            return {
-                'base_value': float(base_value),
-                'feature_importance': feature_importance,
-                'top_features': sorted_features[:self.eval_config['shap']['max_display']]
-            }
+            return results
         
         except ImportError:
             print("⚠️ SHAP not installed. Run: pip install shap")
-            return None
+            return [None] * len(X)
         except Exception as e:
             print(f"⚠️ SHAP computation failed: {e}")
-            return None
+            return [None] * len(X)
     
     def evaluate_teacher(self, teacher_id: str, storage) -> Dict:
         """
@@ -309,16 +317,26 @@ class TeacherEvaluationService:
         features = self.build_features(teacher_id, storage)
         
         if features is None:
-            return {
-                'teacher_id': teacher_id,
-                'score': 0,
-                'status': 'insufficient_data',
-                'message': 'Not enough data to evaluate this teacher'
-            }
+            return self._insufficient_data(teacher_id)
         
         # Predict score
         score, shap_values = self.predict_score(features)
         
+        return self._build_evaluation(teacher_id, features, score, shap_values)
+    
+    @staticmethod
+    def _insufficient_data(teacher_id: str) -> Dict:
+        """Result for a teacher without enough data to evaluate"""
+        return {
+            'teacher_id': teacher_id,
+            'score': 0,
+            'status': 'insufficient_data',
+            'message': 'Not enough data to evaluate this teacher'
+        }
+    
+    def _build_evaluation(self, teacher_id: str, features: Dict, score: float,
+                          shap_values: Optional[Dict]) -> Dict:
+        """Assemble the evaluation result for a predicted score"""
         # Determine grade
         if score >= 90:
             grade = 'A'
@@ -361,25 +379,43 @@ class TeacherEvaluationService:
         teachers = storage.get_all_users(role='teacher')
         
         evaluations = {}
+        scored = []
         for teacher_id in teachers.keys():
-            evaluation = self.evaluate_teacher(teacher_id, storage)
+            features = self.build_features(teacher_id, storage)
+            if features is None:
+                evaluations[teacher_id] = self._insufficient_data(teacher_id)
+            else:
+                evaluations[teacher_id] = None  # Filled in after batch prediction
+                scored.append((teacher_id, features))
+        
+        # One model call (and one SHAP pass) for every teacher with data
+        predictions = self.predict_scores([features for _, features in scored])
+        
+        results_to_save = []
+        for (teacher_id, features), (score, shap_values) in zip(scored, predictions):
+            evaluation = self._build_evaluation(teacher_id, features, score, shap_values)
             evaluations[teacher_id] = evaluation
             
-            # Save evaluation
             if evaluation['status'] == 'success':
-                storage.save_evaluation(
-                    teacher_id=teacher_id,
-                    score=evaluation['score'],
-                    features=evaluation['features'],
-                    shap_values=evaluation.get('shap_values'),
-                    grade=evaluation['grade'],
-                    performance=evaluation['performance']
-                )
+                results_to_save.append({
+                    'teacher_id': teacher_id,
+                    'score': evaluation['score'],
+                    'features': evaluation['features'],
+                    'shap_values': evaluation.get('shap_values'),
+                    'grade': evaluation['grade'],
+                    'performance': evaluation['performance']
+                })
+        
+        # Save all evaluations with one write
+        storage.save_evaluations_bulk(results_to_save)
         
         return evaluations
     
     def get_feature_importance(self) -> Optional[Dict]:
         """Get feature importance from trained model"""
+        if not self._model_loaded:
+            self._load_model()
+        
         if self.model is None:
             return None
         
@@ -0,0 +1,139 @@
+"""
+Smart LMS - File Locking
+Per-file locks that hold across threads and processes, plus atomic file replacement
+"""
+
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock_handle(handle):
+    """Block until an exclusive OS lock on the open lock file is held"""
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        return
+    # msvcrt.locking retries for ~10s before raising; keep waiting
+    handle.seek(0)
+    while True:
+        try:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def _unlock_handle(handle):
+    """Release the OS lock taken by _lock_handle"""
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        return
+    handle.seek(0)
+    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLockManager:
+    """
+    Process-wide registry of per-file locks.
+
+    Each protected file gets its own re-entrant thread lock plus an
+    advisory OS lock on a sidecar `<file>.lock`, so Streamlit sessions in
+    one process and separate worker processes are serialized per file
+    only - writers of different collections never wait on each other.
+    """
+
+    def __init__(self):
+        self._thread_locks: Dict[str, threading.RLock] = {}
+        self._guard = threading.Lock()
+        self._local = threading.local()
+
+    def _thread_lock(self, key: str) -> threading.RLock:
+        with self._guard:
+            lock = self._thread_locks.get(key)
+            if lock is None:
+                lock = self._thread_locks[key] = threading.RLock()
+            return lock
+
+    def _held(self) -> Dict[str, list]:
+        held = getattr(self._local, 'held', None)
+        if held is None:
+            held = self._local.held = {}
+        return held
+
+    @contextmanager
+    def lock(self, file_path: str):
+        """Hold the exclusive lock for file_path (re-entrant within a thread)"""
+        key = os.path.abspath(file_path)
+        with self._thread_lock(key):
+            held = self._held()
+            slot = held.get(key)
+            if slot is None:
+                os.makedirs(os.path.dirname(key), exist_ok=True)
+                handle = open(f"{key}.lock", 'a+b')
+                try:
+                    _lock_handle(handle)
+                except Exception:
+                    handle.close()
+                    raise
+                slot = held[key] = [handle, 0]
+            slot[1] += 1
+            try:
+                yield
+            finally:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del held[key]
+                    try:
+                        _unlock_handle(slot[0])
+                    finally:
+                        slot[0].close()
+
+
+def atomic_write(file_path: str, data: bytes):
+    """
+    Replace file_path with data atomically: readers see either the old or
+    the new content, never a partially written file.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # On Windows a reader holding the file open makes replace fail briefly
+        for attempt in range(10):
+            try:
+                os.replace(tmp_path, file_path)
+                break
+            except PermissionError:
+                if attempt == 9:
+                    raise
+                time.sleep(0.05)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# Singleton instance (created eagerly: two managers would not exclude each other)
+_lock_manager = FileLockManager()
+
+def get_lock_manager() -> FileLockManager:
+    """Get file lock manager singleton"""
+    return _lock_manager
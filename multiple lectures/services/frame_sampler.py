@@ -0,0 +1,259 @@
+"""
+Smart LMS - Adaptive Frame Sampling
+Per-session capture intervals that follow how much the engagement state
+changes, stretched for every session when inference exceeds its CPU budget
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from services.config import get_config
+
+# Decision reasons, in the order they are checked
+REASONS = ('first_sample', 'face_change', 'status_change', 'gaze_shift', 'score_shift', 'stable')
+
+
+class CpuBudgetGovernor:
+    """
+    Process-wide inference budget shared by all capture sessions.
+
+    Sessions report how long each inference took. When inference over the
+    last `window` seconds used more than `budget_cores` CPU cores, or the
+    host's load average per core is above 1 (other work is saturating
+    it), every session's interval is stretched by the overshoot, up to
+    `max_stretch` times.
+    """
+
+    STRETCH_TTL = 1.0
+
+    def __init__(self, budget_cores: float, window: float = 10.0, max_stretch: float = 4.0):
+        self.budget_cores = max(0.01, budget_cores)
+        self.window = window
+        self.max_stretch = max(1.0, max_stretch)
+        self._inferences = deque()  # (finished_at, seconds)
+        self._busy_seconds = 0.0
+        self._stretch = (float('-inf'), 1.0)  # (computed_at, stretch)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, now: Optional[float] = None):
+        """Account one inference that took `seconds`"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._inferences.append((now, seconds))
+            self._busy_seconds += seconds
+            self._expire(now)
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        while self._inferences and self._inferences[0][0] < cutoff:
+            self._busy_seconds -= self._inferences.popleft()[1]
+
+    def utilization(self, now: Optional[float] = None) -> float:
+        """CPU cores spent on inference over the window"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._expire(now)
+            return max(0.0, self._busy_seconds) / self.window
+
+    @staticmethod
+    def host_load() -> float:
+        """1-minute load average per core (0 where the OS does not report it)"""
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1)
+        except (AttributeError, OSError):  # Windows
+            return 0.0
+
+    def stretch(self, now: Optional[float] = None) -> float:
+        """
+        Factor every session's interval is multiplied by (1 = within
+        budget). Asked on every video frame, so it is recomputed at most
+        once per STRETCH_TTL seconds.
+        """
+        now = time.monotonic() if now is None else now
+        computed_at, stretch = self._stretch
+        if now - computed_at < self.STRETCH_TTL:
+            return stretch
+        overshoot = max(self.utilization(now) / self.budget_cores, self.host_load())
+        stretch = min(self.max_stretch, max(1.0, overshoot))
+        self._stretch = (now, stretch)
+        return stretch
+
+    def stats(self) -> Dict:
+        """Get budget, usage and the current stretch"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            inferences = len(self._inferences)
+        return {
+            'budget_cores': self.budget_cores,
+            'utilization_cores': round(self.utilization(now), 3),
+            'host_load': round(self.host_load(), 2),
+            'stretch': round(self.stretch(now), 2),
+            'inferences_in_window': inferences
+        }
+
+
+class AdaptiveSampler:
+    """
+    Capture interval of one session.
+
+    Every result is compared with the previous one: a face appearing or
+    disappearing, a status change, a gaze shift or an engagement score
+    jump resets the interval to `min_interval`; a result like the last one
+    grows it by `growth`, up to `max_interval`. The governor's stretch is
+    applied on top. should_sample() is called from the WebRTC callback,
+    observe() from the processing worker.
+    """
+
+    def __init__(self, min_interval: float = 1.0, max_interval: float = 5.0, growth: float = 1.5,
+                 gaze_shift: float = 10.0, score_shift: float = 15.0,
+                 governor: Optional[CpuBudgetGovernor] = None):
+        """
+        Args:
+            min_interval: Seconds between samples while the state changes
+            max_interval: Seconds between samples once it is stable
+            growth: Interval multiplier per stable result
+            gaze_shift: Gaze angle change (degrees) that counts as a change
+            score_shift: Engagement score change that counts as a change
+            governor: Shared CPU budget (None: intervals are never stretched)
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.growth = max(1.0, growth)
+        self.gaze_shift = gaze_shift
+        self.score_shift = score_shift
+        self.governor = governor
+
+        self.base_interval = min_interval
+        self.last_sample_time = 0.0
+        self.last_reason = None
+        self._previous: Optional[Dict] = None
+        self._decisions = dict.fromkeys(REASONS, 0)
+        self._samples = 0
+        self._lock = threading.Lock()
+
+    @property
+    def interval(self) -> float:
+        """Current seconds between samples, governor stretch included"""
+        stretch = self.governor.stretch() if self.governor is not None else 1.0
+        return self.base_interval * stretch
+
+    def should_sample(self, now: Optional[float] = None) -> bool:
+        """Whether a frame arriving now should be sampled (records the sample if so)"""
+        now = time.time() if now is None else now
+        if now - self.last_sample_time < self.interval:
+            return False
+        with self._lock:
+            self.last_sample_time = now
+            self._samples += 1
+        return True
+
+    def _classify(self, result: Dict) -> str:
+        previous = self._previous
+        if previous is None:
+            return 'first_sample'
+        if result.get('face_detected') != previous.get('face_detected'):
+            return 'face_change'
+        if result.get('status') != previous.get('status'):
+            return 'status_change'
+        def change(field: str) -> float:
+            return abs(result.get(field, 0) - previous.get(field, 0))
+
+        if max(change('gaze_angle_x'), change('gaze_angle_y')) >= self.gaze_shift:
+            return 'gaze_shift'
+        if change('engagement_score') >= self.score_shift:
+            return 'score_shift'
+        return 'stable'
+
+    def observe(self, result: Dict, inference_seconds: Optional[float] = None) -> str:
+        """
+        Adjust the interval to a processing result
+
+        Args:
+            result: OpenFaceProcessor.process_frame output
+            inference_seconds: How long processing took (reported to the governor)
+
+        Returns:
+            The decision reason (one of REASONS)
+        """
+        if inference_seconds is not None and self.governor is not None:
+            self.governor.record(inference_seconds)
+
+        with self._lock:
+            reason = self._classify(result)
+            if reason == 'stable':
+                self.base_interval = min(self.max_interval, self.base_interval * self.growth)
+            else:
+                self.base_interval = self.min_interval
+            self._previous = result
+            self.last_reason = reason
+            self._decisions[reason] += 1
+        return reason
+
+    def stats(self) -> Dict:
+        """Get the current interval and how often each decision was taken"""
+        with self._lock:
+            stats = {
+                'samples': self._samples,
+                'base_interval': round(self.base_interval, 2),
+                'last_reason': self.last_reason,
+                'decisions': dict(self._decisions)
+            }
+        stats['interval'] = round(self.interval, 2)
+        stats['stretch'] = (round(stats['interval'] / stats['base_interval'], 2)
+                            if stats['base_interval'] else 1.0)
+        return stats
+
+
+def _sampling_config(config_path: str) -> Dict:
+    """engagement section of config.yaml (empty when there is no config)"""
+    try:
+        return get_config(config_path).get('engagement') or {}
+    except OSError:
+        return {}
+
+
+# Singleton instance
+_cpu_governor = None
+_cpu_governor_lock = threading.Lock()
+
+
+def get_cpu_governor(config_path: str = "config.yaml") -> CpuBudgetGovernor:
+    """Get the process-wide CPU budget governor"""
+    global _cpu_governor
+    with _cpu_governor_lock:
+        if _cpu_governor is None:
+            adaptive = _sampling_config(config_path).get('adaptive_sampling') or {}
+            cores = os.cpu_count() or 1
+            _cpu_governor = CpuBudgetGovernor(
+                budget_cores=adaptive.get('cpu_budget', 0.5) * cores,
+                window=adaptive.get('budget_window', 10.0),
+                max_stretch=adaptive.get('max_stretch', 4.0)
+            )
+        return _cpu_governor
+
+
+def create_frame_sampler(config_path: str = "config.yaml") -> AdaptiveSampler:
+    """
+    Create the sampler for one capture session from the engagement config.
+    With adaptive_sampling disabled it samples every `sampling_rate`
+    seconds, as before.
+    """
+    engagement = _sampling_config(config_path)
+    min_interval = engagement.get('sampling_rate', 1.0)
+    adaptive = engagement.get('adaptive_sampling') or {}
+
+    if not adaptive.get('enabled', False):
+        return AdaptiveSampler(min_interval=min_interval, max_interval=min_interval)
+
+    return AdaptiveSampler(
+        min_interval=min_interval,
+        max_interval=adaptive.get('max_interval', 5.0),
+        growth=adaptive.get('growth', 1.5),
+        gaze_shift=adaptive.get('gaze_shift_degrees', 10.0),
+        score_shift=adaptive.get('score_shift', 15.0),
+        governor=get_cpu_governor(config_path)
+    )
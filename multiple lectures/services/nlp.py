@@ -3,50 +3,58 @@ Smart LMS - NLP Service
 Sentiment analysis, bias correction, and text processing
 """
 
-import yaml
 import re
+import threading
 from typing import Dict, List, Optional
 import numpy as np
 
+from services.config import get_config
+
 
 class NLPService:
     """NLP service for feedback analysis and sentiment detection"""
     
     def __init__(self, config_path: str = "config.yaml"):
         """Initialize NLP service"""
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        self.config = get_config(config_path)
         
         self.nlp_config = self.config['nlp']
         self.sentiment_model = self.nlp_config['sentiment_model']
         self.bias_correction_enabled = self.nlp_config['bias_correction']['enabled']
         
-        # Initialize sentiment analyzer
-        if self.sentiment_model == 'vader':
-            self._init_vader()
-        elif self.sentiment_model == 'distilbert':
-            self._init_distilbert()
+        # Sentiment analyzers (and transformers/torch for DistilBERT) are
+        # loaded on the first text that needs one. The service is shared by
+        # every Streamlit session thread, so only one of them builds each.
+        self.vader = None
+        self.distilbert = None
+        self._init_lock = threading.Lock()
     
     def _init_vader(self):
-        """Initialize VADER sentiment analyzer"""
-        try:
-            from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-            self.vader = SentimentIntensityAnalyzer()
-        except ImportError:
-            raise ImportError("VADER not installed. Run: pip install vaderSentiment")
+        """Initialize VADER sentiment analyzer (once, on first use)"""
+        with self._init_lock:
+            if self.vader is not None:
+                return
+            try:
+                from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+                self.vader = SentimentIntensityAnalyzer()
+            except ImportError:
+                raise ImportError("VADER not installed. Run: pip install vaderSentiment")
     
     def _init_distilbert(self):
-        """Initialize DistilBERT sentiment analyzer"""
-        try:
-            from transformers import pipeline
-            model_name = self.nlp_config['distilbert_model']
-            self.distilbert = pipeline(
-                "sentiment-analysis",
-                model=model_name,
-                device=-1  # CPU
-            )
-        except ImportError:
-            raise ImportError("Transformers not installed. Run: pip install transformers torch")
+        """Initialize DistilBERT sentiment analyzer (once, on first use)"""
+        with self._init_lock:
+            if self.distilbert is not None:
+                return
+            try:
+                from transformers import pipeline
+                model_name = self.nlp_config['distilbert_model']
+                self.distilbert = pipeline(
+                    "sentiment-analysis",
+                    model=model_name,
+                    device=-1  # CPU
+                )
+            except ImportError:
+                raise ImportError("Transformers not installed. Run: pip install transformers torch")
     
     def clean_text(self, text: str) -> str:
         """
@@ -101,6 +109,8 @@ class NLPService:
     
     def _analyze_vader(self, text: str) -> Dict:
         """Analyze sentiment using VADER"""
+        if self.vader is None:
+            self._init_vader()
         scores = self.vader.polarity_scores(text)
         
         # Determine label
@@ -122,6 +132,8 @@ class NLPService:
     
     def _analyze_distilbert(self, text: str) -> Dict:
         """Analyze sentiment using DistilBERT"""
+        if self.distilbert is None:
+            self._init_distilbert()
         result = self.distilbert(text[:512])[0]  # Truncate to max length
         
         label = result['label'].lower()
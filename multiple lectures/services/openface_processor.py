@@ -6,39 +6,371 @@ Extracts 17 Action Units, gaze vectors, head pose, and computes accurate engagem
 
 import cv2
 import numpy as np
-import mediapipe as mp
 from typing import Dict, Optional, Tuple, List
 from datetime import datetime
 import os
 import csv
 import logging
+import math
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+from services.config import get_config
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class OpenFaceProcessor:
+# ==================== LANDMARK INDEXES ====================
+# MediaPipe Face Mesh indices the features read (refine_landmarks=True
+# adds the iris centers, 468 and 473). Features are computed on (..., 478, 3)
+# arrays of normalized landmark coordinates with these index arrays.
+
+NUM_LANDMARKS = 478
+
+EYE_CORNERS = np.array([[33, 133], [263, 362]])  # Left eye, right eye
+IRIS_CENTERS = np.array([468, 473])              # Left iris, right iris
+
+# Nose tip, chin, left/right eye corner, left/right mouth corner
+POSE_LANDMARKS = np.array([1, 152, 33, 263, 61, 291])
+POSE_MODEL_POINTS = np.array([
+    (0.0, 0.0, 0.0),          # Nose tip
+    (0.0, -330.0, -65.0),     # Chin
+    (-225.0, 170.0, -135.0),  # Left eye
+    (225.0, 170.0, -135.0),   # Right eye
+    (-150.0, -150.0, -125.0), # Left mouth
+    (150.0, -150.0, -125.0)   # Right mouth
+])
+
+# Distances the Action Units are derived from: |a - b| along axis (0 = x, 1 = y)
+AU_DISTANCES = np.array([
+    (70, 159, 1),   # 0: inner brow - upper eyelid
+    (46, 159, 1),   # 1: outer brow - upper eyelid
+    (159, 145, 1),  # 2: eye openness
+    (205, 145, 1),  # 3: cheek - lower eyelid
+    (1, 6, 1),      # 4: nose tip - nose bridge
+    (13, 2, 1),     # 5: upper lip - nose bottom
+    (61, 291, 0),   # 6: mouth width
+    (152, 14, 1),   # 7: chin - lower lip
+    (0, 17, 1),     # 8: lip distance
+    (152, 1, 1)     # 9: chin - nose tip
+])
+EYE_OPENNESS = 2
+
+AU_CODES = ('01', '02', '04', '05', '06', '07', '09', '10', '12',
+            '14', '15', '17', '20', '23', '25', '26', '45')
+_AU = {code: column for column, code in enumerate(AU_CODES)}
+
+# AUs proportional to one distance: (AU, distance, scale)
+_AU_SCALED = (('01', 0, 100), ('02', 1, 100), ('05', 2, 150), ('06', 3, 50), ('09', 4, 30),
+              ('10', 5, 80), ('12', 6, 30), ('14', 6, 30 * 0.7), ('17', 7, 80), ('20', 6, 25),
+              ('25', 8, 100), ('26', 9, 30))
+AU_SCALED_COLUMNS = np.array([_AU[code] for code, _, _ in _AU_SCALED])
+AU_SCALED_DISTANCES = np.array([distance for _, distance, _ in _AU_SCALED])
+AU_SCALES = np.array([scale for _, _, scale in _AU_SCALED])
+
+# AUs that are the complement (5 - x) of another: brow lowerer, lid
+# tightener, lip corner depressor, lip tightener
+AU_COMPLEMENT_COLUMNS = np.array([_AU['04'], _AU['07'], _AU['15'], _AU['23']])
+AU_COMPLEMENT_SOURCES = np.array([_AU['01'], _AU['05'], _AU['12'], _AU['25']])
+
+# AUs the expression features combine
+AU_SMILE = np.array([_AU['06'], _AU['12']])
+AU_CONFUSION = np.array([_AU['01'], _AU['02'], _AU['04']])
+AU_DROWSY = np.array([_AU['07'], _AU['45']])
+
+# Forehead top, chin, left and right face edge: the face box FaceTracker follows
+FACE_BOX_LANDMARKS = np.array([10, 152, 234, 454])
+
+# Every landmark the features and the face tracking read
+LANDMARKS_USED = np.unique(np.concatenate([
+    EYE_CORNERS.ravel(), IRIS_CENTERS, POSE_LANDMARKS, AU_DISTANCES[:, :2].ravel(),
+    FACE_BOX_LANDMARKS
+]))
+
+GAZE_COLUMNS = ('gaze_0_x', 'gaze_0_y', 'gaze_0_z', 'gaze_1_x', 'gaze_1_y', 'gaze_1_z',
+                'gaze_angle_x', 'gaze_angle_y')
+POSE_COLUMNS = ('pose_Tx', 'pose_Ty', 'pose_Tz', 'pose_Rx', 'pose_Ry', 'pose_Rz')
+AU_COLUMNS = tuple(f'AU{code}_r' for code in AU_CODES)
+EXPRESSION_COLUMNS = ('smile_intensity', 'confusion_level', 'drowsiness_level')
+FEATURE_COLUMNS = GAZE_COLUMNS + POSE_COLUMNS + AU_COLUMNS + EXPRESSION_COLUMNS
+
+# Decimals each feature is reported with; rounded with Python's round(),
+# which (unlike np.round) rounds exact ties such as 3.705 by their true value
+FEATURE_DIGITS = (4,) * 6 + (2,) * (len(FEATURE_COLUMNS) - 6)
+
+# The same geometry as plain tuples for the single-frame path
+_EYES = tuple(zip(map(tuple, EYE_CORNERS.tolist()), IRIS_CENTERS.tolist()))
+_AU_SCALED_TERMS = tuple(zip(AU_SCALED_COLUMNS.tolist(), AU_SCALED_DISTANCES.tolist(),
+                             AU_SCALES.tolist()))
+_AU_COMPLEMENTS = tuple(zip(AU_COMPLEMENT_COLUMNS.tolist(), AU_COMPLEMENT_SOURCES.tolist()))
+_AU_DISTANCE_TERMS = tuple(map(tuple, AU_DISTANCES.tolist()))
+
+
+def round_exact(values: np.ndarray, digits: int) -> np.ndarray:
+    """Round an array element-wise with Python's round() (see FEATURE_DIGITS)"""
+    rounded = [round(value, digits) for value in values.ravel().tolist()]
+    return np.array(rounded).reshape(values.shape)
+
+
+@lru_cache(maxsize=8)
+def camera_matrix(w: int, h: int) -> np.ndarray:
+    """Pinhole camera matrix for a frame size (focal length = width), cached per resolution"""
+    matrix = np.array([
+        [w, 0, w / 2],
+        [0, w, h / 2],
+        [0, 0, 1]
+    ], dtype="double")
+    matrix.flags.writeable = False  # Shared between calls
+    return matrix
+
+
+DIST_COEFFS = np.zeros((4, 1))
+DIST_COEFFS.flags.writeable = False
+
+
+def landmarks_to_array(landmarks, indices: Optional[np.ndarray] = LANDMARKS_USED) -> np.ndarray:
     """
-    OpenFace-style feature extraction using MediaPipe Face Mesh
-    Extracts comprehensive facial features for engagement analysis
+    Convert a MediaPipe landmark list to a (478, 3) array of x, y, z.
+    Only the rows in `indices` (by default the ones the features read)
+    are filled, the rest stay zero; pass indices=None to convert all.
     """
+    if indices is None:
+        return np.array([(p.x, p.y, p.z) for p in landmarks], dtype=np.float64)
+    points = np.zeros((NUM_LANDMARKS, 3))
+    points[indices] = [(p.x, p.y, p.z) for p in map(landmarks.__getitem__, indices.tolist())]
+    return points
+
+
+class FaceMeshPool:
+    """
+    Bounded pool of MediaPipe FaceMesh graphs shared by all sessions.
     
-    def __init__(self, config_path: str = "config.yaml"):
-        """Initialize OpenFace processor"""
-        # Initialize MediaPipe Face Mesh
-        self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
+    A FaceMesh graph is not thread-safe, so each process() call borrows
+    one graph exclusively; graphs are created lazily up to `size`. Any
+    session may get any graph, so the graphs run in static image mode and
+    keep no landmark state between calls (video mode would apply one
+    session's tracked face to another session's frame). Following the
+    face between frames is the session's FaceTracker's job.
+    """
+    
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._idle: List = []
+        self._created = 0
+        self._condition = threading.Condition()
+    
+    @staticmethod
+    def _create_face_mesh():
+        import mediapipe as mp  # Loaded with the first graph, not on import
+        return mp.solutions.face_mesh.FaceMesh(
+            static_image_mode=True,
             max_num_faces=1,
             refine_landmarks=True,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
+    
+    @contextmanager
+    def acquire(self):
+        """Borrow a FaceMesh graph"""
+        create = False
+        with self._condition:
+            while not self._idle and self._created >= self.size:
+                self._condition.wait()
+            if self._idle:
+                face_mesh = self._idle.pop()
+            else:
+                self._created += 1
+                create = True
+        
+        if create:
+            try:
+                face_mesh = self._create_face_mesh()
+            except Exception:
+                with self._condition:
+                    self._created -= 1
+                    self._condition.notify()
+                raise
+        
+        try:
+            yield face_mesh
+        finally:
+            with self._condition:
+                self._idle.append(face_mesh)
+                self._condition.notify()
+    
+    def stats(self) -> Dict:
+        """Get pool occupancy"""
+        with self._condition:
+            return {
+                'size': self.size,
+                'created': self._created,
+                'idle': len(self._idle),
+                'in_use': self._created - len(self._idle)
+            }
+
+
+class FrameChangeDetector:
+    """
+    Cheap check whether a frame still looks like the last one inference
+    ran on: the mean absolute difference of small grayscale thumbnails.
+    
+    Comparing against the last *processed* frame (not the last sampled
+    one) means slow drift still adds up to a change; after `max_reuse`
+    consecutive unchanged frames the next one is processed regardless.
+    """
+    
+    THUMBNAIL_SIZE = (32, 24)  # (width, height)
+    
+    def __init__(self, threshold: float = 1.5, max_reuse: int = 5):
+        """
+        Args:
+            threshold: Mean absolute thumbnail difference (0-255 gray
+                levels) below which a frame counts as unchanged
+            max_reuse: Consecutive frames that may reuse one result
+        """
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self._reference = None
+        self._reused = 0
+    
+    def thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        """Downscaled grayscale copy of a BGR frame (downscale first: cheaper)"""
+        small = cv2.resize(frame, self.THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    
+    def is_unchanged(self, thumbnail: np.ndarray) -> bool:
+        """Whether the last result may be reused for this frame (counts the reuse if so)"""
+        if self._reference is None or self._reused >= self.max_reuse:
+            return False
+        if float(cv2.absdiff(thumbnail, self._reference).mean()) >= self.threshold:
+            return False
+        self._reused += 1
+        return True
+    
+    def processed(self, thumbnail: np.ndarray):
+        """Make a frame inference ran on the new reference"""
+        self._reference = thumbnail
+        self._reused = 0
+    
+    def reset(self):
+        """Forget the reference (new session)"""
+        self._reference = None
+        self._reused = 0
+
+
+class FaceTracker:
+    """
+    Region of interest for Face Mesh that follows the face between frames.
+    
+    The last face box (FACE_BOX_LANDMARKS), padded by `margin` of its size
+    on every side, is cropped out and downscaled to at most `roi_size`
+    pixels; landmarks found there are mapped back to full-frame
+    coordinates. When the region holds no face, tracking is lost and
+    detection runs on the full frame.
+    """
+    
+    # Smallest region worth cropping, in pixels
+    MIN_REGION = 32
+    
+    def __init__(self, margin: float = 0.25, roi_size: int = 256):
+        """
+        Args:
+            margin: Padding around the face box, as a fraction of its size
+            roi_size: Longest side the region is downscaled to
+        """
+        self.margin = margin
+        self.roi_size = roi_size
+        self.region: Optional[Tuple[int, int, int, int]] = None  # x0, y0, x1, y1
+        self.counts = {'tracked': 0, 'full_frame': 0, 'lost': 0}
+    
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        """The current region of a BGR frame, downscaled to roi_size"""
+        x0, y0, x1, y1 = self.region
+        crop = frame[y0:y1, x0:x1]
+        scale = self.roi_size / max(x1 - x0, y1 - y0)
+        if scale < 1:
+            size = (max(1, round((x1 - x0) * scale)), max(1, round((y1 - y0) * scale)))
+            crop = cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+        return crop
+    
+    def to_frame(self, points: np.ndarray, w: int, h: int) -> np.ndarray:
+        """Map landmarks normalized to the region to full-frame coordinates (in place)"""
+        x0, y0, x1, y1 = self.region
+        points[:, 0] = (points[:, 0] * (x1 - x0) + x0) / w
+        points[:, 1] = (points[:, 1] * (y1 - y0) + y0) / h
+        points[:, 2] *= (x1 - x0) / w  # z is scaled like x
+        return points
+    
+    def update(self, points: Optional[np.ndarray], w: int, h: int):
+        """Follow the face in full-frame landmarks (None: no face, tracking lost)"""
+        if points is None:
+            self.region = None
+            return
+        
+        box = points[FACE_BOX_LANDMARKS, :2] * (w, h)
+        (left, top), (right, bottom) = box.min(axis=0), box.max(axis=0)
+        pad = max(right - left, bottom - top) * self.margin
+        x0, y0 = max(0, int(left - pad)), max(0, int(top - pad))
+        x1, y1 = min(w, int(np.ceil(right + pad))), min(h, int(np.ceil(bottom + pad)))
+        
+        # Nothing to gain when the region is (nearly) the whole frame
+        if min(x1 - x0, y1 - y0) < self.MIN_REGION or (x1 - x0) * (y1 - y0) > 0.8 * w * h:
+            self.region = None
+        else:
+            self.region = (x0, y0, x1, y1)
+    
+    def reset(self):
+        """Forget the face (new session)"""
+        self.region = None
+
+
+class OpenFaceProcessor:
+    """
+    OpenFace-style feature extraction using MediaPipe Face Mesh
+    Extracts comprehensive facial features for engagement analysis
+    
+    Create one processor per session: it owns the session's frame counter
+    and feature buffer, while inference runs on a graph borrowed from the
+    shared FaceMeshPool.
+    """
+    
+    def __init__(self, config_path: str = "config.yaml", session_id: Optional[str] = None):
+        """Initialize OpenFace processor"""
+        # MediaPipe Face Mesh graphs are shared through a pool
+        self.face_mesh_pool = get_face_mesh_pool(config_path)
         
         # Session tracking
-        self.session_id = None
+        self.session_id = session_id
         self.frame_count = 0
         self.features_buffer = []
+        self._buffer_lock = threading.Lock()
+        
+        # Frames that barely changed reuse the last result (carried forward)
+        try:
+            openface_config = get_config(config_path).get('openface') or {}
+        except OSError:
+            openface_config = {}
+        self.change_detector = None
+        if openface_config.get('skip_unchanged_frames', False):
+            self.change_detector = FrameChangeDetector(
+                threshold=openface_config.get('frame_change_threshold', 1.5),
+                max_reuse=openface_config.get('max_carried_forward', 5)
+            )
+        self._last_result = None
+        
+        # Face Mesh on the region around the last face; head pose seeded
+        # with the last pose
+        self.tracker = None
+        if openface_config.get('roi_tracking', False):
+            self.tracker = FaceTracker(
+                margin=openface_config.get('roi_margin', 0.25),
+                roi_size=openface_config.get('roi_size', 256)
+            )
+        self._pose_state = {}
         
         # CSV file paths
         self.csv_dir = "ml_data/csv_logs"
@@ -57,9 +389,16 @@ class OpenFaceProcessor:
     
     def set_session_id(self, session_id: str):
         """Set session ID for CSV logging"""
-        self.session_id = session_id
-        self.frame_count = 0
-        self.features_buffer = []
+        with self._buffer_lock:
+            self.session_id = session_id
+            self.frame_count = 0
+            self.features_buffer = []
+            self._last_result = None
+            self._pose_state = {}
+            if self.change_detector is not None:
+                self.change_detector.reset()
+            if self.tracker is not None:
+                self.tracker.reset()
     
     def process_frame(self, frame: np.ndarray, lecture_id: str = None, course_id: str = None) -> Dict:
         """
@@ -71,48 +410,55 @@ class OpenFaceProcessor:
             course_id: Current course identifier
         
         Returns:
-            Dictionary with comprehensive facial features and engagement score
+            Dictionary with comprehensive facial features and engagement
+            score; carried_forward is 1 when the frame was nearly identical
+            to the last processed one and its features were reused
         """
-        self.frame_count += 1
+        with self._buffer_lock:
+            self.frame_count += 1
+            frame_number = self.frame_count
+        
+        # Skip inference when the frame barely changed
+        thumbnail = None
+        if self.change_detector is not None:
+            thumbnail = self.change_detector.thumbnail(frame)
+            if self._last_result is not None and self.change_detector.is_unchanged(thumbnail):
+                features = dict(self._last_result)
+                features.update({
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'frame': frame_number,
+                    'lecture_id': lecture_id,
+                    'course_id': course_id,
+                    'carried_forward': 1
+                })
+                with self._buffer_lock:
+                    self.features_buffer.append(features)
+                return features
         
-        # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         h, w = frame.shape[:2]
-        
-        # Process with MediaPipe
-        results = self.face_mesh.process(rgb_frame)
+        points = self._detect_landmarks(frame)
         
         # Initialize feature dictionary
         features = {
             'timestamp': datetime.utcnow().isoformat(),
-            'frame': self.frame_count,
+            'frame': frame_number,
             'session_id': self.session_id,
             'lecture_id': lecture_id,
             'course_id': course_id,
             'face_detected': 0,
             'confidence': 0.0,
-            'status': 'no_face'
+            'status': 'no_face',
+            'carried_forward': 0
         }
         
-        if results.multi_face_landmarks:
-            landmarks = results.multi_face_landmarks[0].landmark
-            
+        if points is not None:
             # Face detected successfully
             features['face_detected'] = 1
             features['confidence'] = 0.95  # MediaPipe confidence
             features['status'] = 'engaged'
             
-            # Extract all features
-            gaze_features = self._extract_gaze_features(landmarks, w, h)
-            head_pose_features = self._extract_head_pose(landmarks, w, h)
-            action_units = self._extract_action_units(landmarks)
-            expression_features = self._extract_expression_features(action_units)
-            
-            # Merge all features
-            features.update(gaze_features)
-            features.update(head_pose_features)
-            features.update(action_units)
-            features.update(expression_features)
+            # Gaze, head pose, Action Unit and expression features
+            features.update(self.extract_features(points, w, h, self._pose_state)[0])
             
             # Compute engagement score
             engagement_score, status = self._compute_engagement_score(features)
@@ -122,251 +468,269 @@ class OpenFaceProcessor:
         else:
             # No face detected - set default values
             self._set_default_features(features)
+            self._pose_state.clear()
+        
+        if thumbnail is not None:
+            self.change_detector.processed(thumbnail)
+            self._last_result = features
         
         # Buffer features for batch writing
-        self.features_buffer.append(features)
+        with self._buffer_lock:
+            self.features_buffer.append(features)
         
         return features
     
-    def _extract_gaze_features(self, landmarks, w: int, h: int) -> Dict:
+    def _detect_landmarks(self, frame: np.ndarray) -> Optional[np.ndarray]:
         """
-        Extract gaze direction and eye tracking features
+        Run Face Mesh on a BGR frame
+        
+        With tracking on, only the region around the last face is
+        processed (downscaled); if no face is found there, the full frame
+        is tried on the same graph.
         
         Returns:
-            gaze_0_x, gaze_0_y, gaze_0_z (left eye)
-            gaze_1_x, gaze_1_y, gaze_1_z (right eye)
-            gaze_angle_x, gaze_angle_y (degrees)
+            (478, 3) full-frame landmark coordinates, or None without a face
         """
-        # Left eye landmarks
-        left_eye_center = np.array([
-            (landmarks[33].x + landmarks[133].x) / 2,
-            (landmarks[33].y + landmarks[133].y) / 2,
-            (landmarks[33].z + landmarks[133].z) / 2
-        ])
-        left_iris = np.array([landmarks[468].x, landmarks[468].y, landmarks[468].z])
-        
-        # Right eye landmarks
-        right_eye_center = np.array([
-            (landmarks[263].x + landmarks[362].x) / 2,
-            (landmarks[263].y + landmarks[362].y) / 2,
-            (landmarks[263].z + landmarks[362].z) / 2
-        ])
-        right_iris = np.array([landmarks[473].x, landmarks[473].y, landmarks[473].z])
-        
-        # Compute gaze vectors (iris position relative to eye center)
-        gaze_0 = left_iris - left_eye_center
-        gaze_1 = right_iris - right_eye_center
-        
-        # Compute gaze angles (in degrees)
-        gaze_angle_x = np.mean([np.arctan2(gaze_0[0], gaze_0[2]), 
-                                 np.arctan2(gaze_1[0], gaze_1[2])]) * 180 / np.pi
-        gaze_angle_y = np.mean([np.arctan2(gaze_0[1], gaze_0[2]), 
-                                 np.arctan2(gaze_1[1], gaze_1[2])]) * 180 / np.pi
+        h, w = frame.shape[:2]
+        tracker = self.tracker
+        
+        # Process with MediaPipe on a pooled graph
+        with self.face_mesh_pool.acquire() as face_mesh:
+            if tracker is not None and tracker.region is not None:
+                results = face_mesh.process(cv2.cvtColor(tracker.crop(frame), cv2.COLOR_BGR2RGB))
+                if results.multi_face_landmarks:
+                    landmarks = results.multi_face_landmarks[0].landmark
+                    points = tracker.to_frame(landmarks_to_array(landmarks), w, h)
+                    tracker.counts['tracked'] += 1
+                    tracker.update(points, w, h)
+                    return points
+                tracker.counts['lost'] += 1
+            
+            results = face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
         
-        return {
-            'gaze_0_x': round(gaze_0[0], 4),
-            'gaze_0_y': round(gaze_0[1], 4),
-            'gaze_0_z': round(gaze_0[2], 4),
-            'gaze_1_x': round(gaze_1[0], 4),
-            'gaze_1_y': round(gaze_1[1], 4),
-            'gaze_1_z': round(gaze_1[2], 4),
-            'gaze_angle_x': round(gaze_angle_x, 2),
-            'gaze_angle_y': round(gaze_angle_y, 2)
-        }
+        points = None
+        if results.multi_face_landmarks:
+            points = landmarks_to_array(results.multi_face_landmarks[0].landmark)
+        if tracker is not None:
+            tracker.counts['full_frame'] += 1
+            tracker.update(points, w, h)
+        return points
     
-    def _extract_head_pose(self, landmarks, w: int, h: int) -> Dict:
+    @classmethod
+    def extract_features(cls, points: np.ndarray, w: int, h: int,
+                         pose_state: Optional[Dict] = None) -> List[Dict]:
         """
-        Extract head pose (rotation and translation)
+        Compute gaze, head pose, Action Unit and expression features
+        
+        Args:
+            points: Landmark coordinates as MediaPipe reports them (x, y
+                normalized to the frame, z relative), shaped (478, 3) for
+                one frame or (frames, 478, 3) for a batch
+            w, h: Frame size in pixels
+            pose_state: Previous head pose of a live session (see
+                _extract_head_pose); None solves every frame from scratch
         
         Returns:
-            pose_Tx, pose_Ty, pose_Tz (translation)
-            pose_Rx, pose_Ry, pose_Rz (rotation in degrees)
+            One feature dict per frame, keyed by FEATURE_COLUMNS
         """
-        # Get key 3D points
-        nose_tip = np.array([landmarks[1].x * w, landmarks[1].y * h, landmarks[1].z * w])
-        chin = np.array([landmarks[152].x * w, landmarks[152].y * h, landmarks[152].z * w])
-        left_eye = np.array([landmarks[33].x * w, landmarks[33].y * h, landmarks[33].z * w])
-        right_eye = np.array([landmarks[263].x * w, landmarks[263].y * h, landmarks[263].z * w])
-        left_mouth = np.array([landmarks[61].x * w, landmarks[61].y * h, landmarks[61].z * w])
-        right_mouth = np.array([landmarks[291].x * w, landmarks[291].y * h, landmarks[291].z * w])
-        
-        # 3D model points (generic face model)
-        model_points = np.array([
-            (0.0, 0.0, 0.0),          # Nose tip
-            (0.0, -330.0, -65.0),     # Chin
-            (-225.0, 170.0, -135.0),  # Left eye
-            (225.0, 170.0, -135.0),   # Right eye
-            (-150.0, -150.0, -125.0), # Left mouth
-            (150.0, -150.0, -125.0)   # Right mouth
-        ])
-        
-        # 2D image points
-        image_points = np.array([
-            (landmarks[1].x * w, landmarks[1].y * h),
-            (landmarks[152].x * w, landmarks[152].y * h),
-            (landmarks[33].x * w, landmarks[33].y * h),
-            (landmarks[263].x * w, landmarks[263].y * h),
-            (landmarks[61].x * w, landmarks[61].y * h),
-            (landmarks[291].x * w, landmarks[291].y * h)
-        ], dtype="double")
-        
-        # Camera matrix
-        focal_length = w
-        center = (w / 2, h / 2)
-        camera_matrix = np.array([
-            [focal_length, 0, center[0]],
-            [0, focal_length, center[1]],
-            [0, 0, 1]
-        ], dtype="double")
-        
-        dist_coeffs = np.zeros((4, 1))
-        
-        # Solve PnP
-        success, rotation_vec, translation_vec = cv2.solvePnP(
-            model_points, image_points, camera_matrix, dist_coeffs,
-            flags=cv2.SOLVEPNP_ITERATIVE
-        )
-        
-        # Convert rotation vector to Euler angles
-        rotation_mat, _ = cv2.Rodrigues(rotation_vec)
-        pose_mat = cv2.hconcat((rotation_mat, translation_vec))
-        _, _, _, _, _, _, euler_angles = cv2.decomposeProjectionMatrix(pose_mat)
+        points = np.asarray(points, dtype=np.float64).reshape(-1, NUM_LANDMARKS, 3)
+        poses = cls._extract_head_pose(points, w, h, pose_state).tolist()
         
-        pitch, yaw, roll = euler_angles.flatten()[:3]
-        
-        return {
-            'pose_Tx': round(translation_vec[0][0], 2),
-            'pose_Ty': round(translation_vec[1][0], 2),
-            'pose_Tz': round(translation_vec[2][0], 2),
-            'pose_Rx': round(pitch, 2),
-            'pose_Ry': round(yaw, 2),
-            'pose_Rz': round(roll, 2)
-        }
+        if len(points) == 1:
+            # Live processing: for one frame numpy's per-call overhead costs
+            # more than the vectorization saves
+            rows = [cls._extract_landmark_features_single(points[0])]
+        else:
+            action_units = cls._extract_action_units(points)
+            rows = np.concatenate([
+                cls._extract_gaze_features(points),
+                action_units,
+                cls._extract_expression_features(action_units)
+            ], axis=-1).tolist()
+        
+        gaze_count = len(GAZE_COLUMNS)
+        return [dict(zip(FEATURE_COLUMNS,
+                         map(round, row[:gaze_count] + pose + row[gaze_count:], FEATURE_DIGITS)))
+                for row, pose in zip(rows, poses)]
     
-    def _extract_action_units(self, landmarks) -> Dict:
+    @staticmethod
+    def _extract_landmark_features_single(points: np.ndarray) -> List[float]:
         """
-        Extract 17 Facial Action Units (AUs)
+        Gaze, Action Unit and expression features of one (478, 3) frame,
+        computed on Python floats with the same operations as
+        _extract_gaze_features, _extract_action_units and
+        _extract_expression_features
         
         Returns:
-            AU01_r through AU45_r (intensity values 0-5)
+            GAZE_COLUMNS + AU_COLUMNS + EXPRESSION_COLUMNS values (AUs
+            rounded to 2 decimals, the rest unrounded)
         """
-        # Calculate distances and ratios for AUs
-        
-        # Inner brow raiser (AU01)
-        left_brow_inner = landmarks[70]
-        left_eye_top = landmarks[159]
-        au01_intensity = abs(left_brow_inner.y - left_eye_top.y) * 100
-        
-        # Outer brow raiser (AU02)
-        left_brow_outer = landmarks[46]
-        au02_intensity = abs(left_brow_outer.y - left_eye_top.y) * 100
+        lm = dict(zip(LANDMARKS_USED.tolist(), points[LANDMARKS_USED].tolist()))
+        
+        # Gaze vectors and angles
+        gaze = []
+        angle_x = angle_y = 0.0
+        for (a, b), iris in _EYES:
+            (ax, ay, az), (bx, by, bz), (ix, iy, iz) = lm[a], lm[b], lm[iris]
+            gx, gy, gz = ix - (ax + bx) / 2, iy - (ay + by) / 2, iz - (az + bz) / 2
+            gaze += (gx, gy, gz)
+            angle_x += math.atan2(gx, gz)
+            angle_y += math.atan2(gy, gz)
+        gaze += (angle_x * (90 / np.pi), angle_y * (90 / np.pi))
         
-        # Brow lowerer (AU04)
-        au04_intensity = max(0, 5 - au01_intensity)
-        
-        # Upper lid raiser (AU05)
-        left_eye_bottom = landmarks[145]
-        eye_openness = abs(left_eye_top.y - left_eye_bottom.y)
-        au05_intensity = eye_openness * 150
-        
-        # Cheek raiser (AU06)
-        left_cheek = landmarks[205]
-        au06_intensity = abs(left_cheek.y - left_eye_bottom.y) * 50
-        
-        # Lid tightener (AU07)
-        au07_intensity = max(0, 5 - au05_intensity)
-        
-        # Nose wrinkler (AU09)
-        nose_tip = landmarks[1]
-        nose_bridge = landmarks[6]
-        au09_intensity = abs(nose_tip.y - nose_bridge.y) * 30
-        
-        # Upper lip raiser (AU10)
-        upper_lip = landmarks[13]
-        nose_bottom = landmarks[2]
-        au10_intensity = abs(upper_lip.y - nose_bottom.y) * 80
+        # Action Units
+        distances = [abs(lm[a][axis] - lm[b][axis]) for a, b, axis in _AU_DISTANCE_TERMS]
+        action_units = [0.0] * len(AU_CODES)
+        for column, distance, scale in _AU_SCALED_TERMS:
+            action_units[column] = distances[distance] * scale
+        for column, source in _AU_COMPLEMENTS:
+            action_units[column] = 5 - action_units[source]
+        action_units[_AU['45']] = 5.0 if distances[EYE_OPENNESS] < 0.01 else 0.0
+        action_units = [round(min(5.0, max(0.0, value)), 2) for value in action_units]
+        
+        # Expressions
+        au = action_units
+        expressions = [
+            (au[_AU['06']] + au[_AU['12']]) / 2,
+            (au[_AU['01']] + au[_AU['02']] + au[_AU['04']]) / 3,
+            max(0.0, au[_AU['07']] + au[_AU['45']] - au[_AU['05']])
+        ]
+        return gaze + action_units + expressions
+    
+    @staticmethod
+    def _extract_gaze_features(points: np.ndarray) -> np.ndarray:
+        """
+        Extract gaze direction and eye tracking features
         
-        # Lip corner puller (AU12) - SMILE
-        left_mouth_corner = landmarks[61]
-        right_mouth_corner = landmarks[291]
-        mouth_width = abs(left_mouth_corner.x - right_mouth_corner.x)
-        au12_intensity = mouth_width * 30
+        Returns:
+            (..., 8) unrounded array: gaze_0_x/y/z (left eye), gaze_1_x/y/z (right
+            eye), gaze_angle_x, gaze_angle_y (degrees)
+        """
+        # Gaze vectors: iris position relative to eye center, (..., eye, xyz)
+        corners = points[..., EYE_CORNERS, :]
+        gaze = points[..., IRIS_CENTERS, :] - (corners[..., 0, :] + corners[..., 1, :]) / 2
         
-        # Dimpler (AU14)
-        au14_intensity = au12_intensity * 0.7
+        # Horizontal and vertical angle of each eye, averaged over both eyes
+        angles = np.arctan2(gaze[..., :2], gaze[..., 2:])
+        angles = (angles[..., 0, :] + angles[..., 1, :]) * (90 / np.pi)
         
-        # Lip corner depressor (AU15)
-        au15_intensity = max(0, 5 - au12_intensity)
+        return np.concatenate([gaze.reshape(*gaze.shape[:-2], 6), angles], axis=-1)
+    
+    @staticmethod
+    def _extract_head_pose(points: np.ndarray, w: int, h: int,
+                           pose_state: Optional[Dict] = None) -> np.ndarray:
+        """
+        Extract head pose (rotation and translation)
         
-        # Chin raiser (AU17)
-        chin = landmarks[152]
-        lower_lip = landmarks[14]
-        au17_intensity = abs(chin.y - lower_lip.y) * 80
+        Args:
+            pose_state: Carries the last pose between calls of one session;
+                each solve starts from it (and updates it), which converges
+                faster and stays off the mirrored solution behind the camera
         
-        # Lip stretcher (AU20)
-        au20_intensity = mouth_width * 25
+        Returns:
+            (..., 6) unrounded array: pose_Tx, pose_Ty, pose_Tz (translation),
+            pose_Rx, pose_Ry, pose_Rz (rotation in degrees)
+        """
+        # 2D image points of every frame, (frames, 6, 2)
+        image_points = np.ascontiguousarray(
+            (points[..., POSE_LANDMARKS, :2] * (w, h)).reshape(-1, len(POSE_LANDMARKS), 2))
+        matrix = camera_matrix(w, h)
+        
+        # solvePnP has no batched form: one solve per frame
+        poses = np.empty((len(image_points), 6))
+        for pose, frame_points in zip(poses, image_points):
+            rotation_vec = translation_vec = None
+            
+            # Seeded with the previous pose; unusable if it ends up behind the camera
+            if pose_state:
+                success, rotation_vec, translation_vec = cv2.solvePnP(
+                    POSE_MODEL_POINTS, frame_points, matrix, DIST_COEFFS,
+                    pose_state['rotation'].copy(), pose_state['translation'].copy(),
+                    useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE
+                )
+                if not success or translation_vec[2, 0] <= 0:
+                    rotation_vec = None
+            
+            if rotation_vec is None:
+                _, rotation_vec, translation_vec = cv2.solvePnP(
+                    POSE_MODEL_POINTS, frame_points, matrix, DIST_COEFFS,
+                    flags=cv2.SOLVEPNP_ITERATIVE
+                )
+            
+            if pose_state is not None:
+                pose_state.clear()
+                if translation_vec[2, 0] > 0:
+                    pose_state.update(rotation=rotation_vec, translation=translation_vec)
+            
+            # Convert rotation vector to Euler angles (pitch, yaw, roll)
+            # (decomposeProjectionMatrix of [R|t] is RQDecomp3x3 of R)
+            rotation_mat, _ = cv2.Rodrigues(rotation_vec)
+            pose[:3] = translation_vec.ravel()
+            pose[3:] = cv2.RQDecomp3x3(rotation_mat)[0]
         
-        # Lip tightener (AU23)
-        upper_lip_top = landmarks[0]
-        lower_lip_bottom = landmarks[17]
-        lip_distance = abs(upper_lip_top.y - lower_lip_bottom.y)
-        au23_intensity = max(0, 5 - lip_distance * 100)
+        return poses.reshape(*points.shape[:-2], 6)
+    
+    @staticmethod
+    def _extract_action_units(points: np.ndarray) -> np.ndarray:
+        """
+        Extract 17 Facial Action Units (AUs)
         
-        # Lips part (AU25)
-        au25_intensity = lip_distance * 100
+        Returns:
+            (..., 17) array: AU01_r through AU45_r (intensity values 0-5,
+            rounded to 2 decimals with Python's round(), as the expression
+            features read them)
+        """
+        # All landmark distances at once, (..., 10)
+        a, b, axis = AU_DISTANCES.T
+        distances = np.abs(points[..., a, axis] - points[..., b, axis])
         
-        # Jaw drop (AU26)
-        au26_intensity = abs(chin.y - nose_tip.y) * 30
+        action_units = np.empty(distances.shape[:-1] + (len(AU_CODES),))
+        action_units[..., AU_SCALED_COLUMNS] = distances[..., AU_SCALED_DISTANCES] * AU_SCALES
+        action_units[..., AU_COMPLEMENT_COLUMNS] = 5 - action_units[..., AU_COMPLEMENT_SOURCES]
         
         # Blink (AU45)
-        au45_intensity = 5 if eye_openness < 0.01 else 0
+        action_units[..., _AU['45']] = np.where(distances[..., EYE_OPENNESS] < 0.01, 5.0, 0.0)
         
         # Normalize all AUs to 0-5 scale
-        def normalize_au(value):
-            return round(min(5.0, max(0.0, value)), 2)
-        
-        return {
-            'AU01_r': normalize_au(au01_intensity),  # Inner brow raiser
-            'AU02_r': normalize_au(au02_intensity),  # Outer brow raiser
-            'AU04_r': normalize_au(au04_intensity),  # Brow lowerer
-            'AU05_r': normalize_au(au05_intensity),  # Upper lid raiser
-            'AU06_r': normalize_au(au06_intensity),  # Cheek raiser
-            'AU07_r': normalize_au(au07_intensity),  # Lid tightener
-            'AU09_r': normalize_au(au09_intensity),  # Nose wrinkler
-            'AU10_r': normalize_au(au10_intensity),  # Upper lip raiser
-            'AU12_r': normalize_au(au12_intensity),  # Lip corner puller (smile)
-            'AU14_r': normalize_au(au14_intensity),  # Dimpler
-            'AU15_r': normalize_au(au15_intensity),  # Lip corner depressor
-            'AU17_r': normalize_au(au17_intensity),  # Chin raiser
-            'AU20_r': normalize_au(au20_intensity),  # Lip stretcher
-            'AU23_r': normalize_au(au23_intensity),  # Lip tightener
-            'AU25_r': normalize_au(au25_intensity),  # Lips part
-            'AU26_r': normalize_au(au26_intensity),  # Jaw drop
-            'AU45_r': normalize_au(au45_intensity)   # Blink
-        }
+        return round_exact(np.clip(action_units, 0.0, 5.0), 2)
     
-    def _extract_expression_features(self, action_units: Dict) -> Dict:
+    @staticmethod
+    def _extract_expression_features(action_units: np.ndarray) -> np.ndarray:
         """
         Extract expression features from Action Units
         
         Returns:
-            smile_intensity, confusion_level, drowsiness_level
+            (..., 3) unrounded array: smile_intensity, confusion_level, drowsiness_level
         """
         # Smile intensity (AU06 + AU12)
-        smile_intensity = (action_units['AU06_r'] + action_units['AU12_r']) / 2
+        smile_intensity = action_units[..., AU_SMILE].sum(axis=-1) / 2
         
         # Confusion (AU01 + AU02 + AU04)
-        confusion_level = (action_units['AU01_r'] + action_units['AU02_r'] + action_units['AU04_r']) / 3
+        confusion_level = action_units[..., AU_CONFUSION].sum(axis=-1) / 3
         
         # Drowsiness (AU07 + AU45 - AU05)
-        drowsiness_level = (action_units['AU07_r'] + action_units['AU45_r'] - action_units['AU05_r'])
-        drowsiness_level = max(0, drowsiness_level)
+        drowsiness_level = np.maximum(
+            0, action_units[..., AU_DROWSY].sum(axis=-1) - action_units[..., _AU['05']])
         
-        return {
-            'smile_intensity': round(smile_intensity, 2),
-            'confusion_level': round(confusion_level, 2),
-            'drowsiness_level': round(drowsiness_level, 2)
-        }
+        return np.stack([smile_intensity, confusion_level, drowsiness_level], axis=-1)
+    
+    def score_landmarks(self, points: np.ndarray, w: int, h: int) -> List[Dict]:
+        """
+        Score recorded landmarks offline (no MediaPipe, nothing buffered)
+        
+        Args:
+            points: (frames, 478, 3) landmark coordinates, see extract_features
+            w, h: Frame size in pixels
+        
+        Returns:
+            One feature dict per frame, with engagement_score and status
+        """
+        scored = []
+        for features in self.extract_features(points, w, h):
+            score, status = self._compute_engagement_score(features)
+            features['engagement_score'], features['status'] = score, status
+            scored.append(features)
+        return scored
     
     def _compute_engagement_score(self, features: Dict) -> Tuple[float, str]:
         """
@@ -465,7 +829,10 @@ class OpenFaceProcessor:
     
     def save_features_to_csv(self):
         """Save buffered features to CSV file"""
-        if not self.features_buffer:
+        with self._buffer_lock:
+            rows, self.features_buffer = self.features_buffer, []
+        
+        if not rows:
             return
         
         csv_file = os.path.join(self.csv_dir, f"openface_features_{self.session_id}.csv")
@@ -476,7 +843,7 @@ class OpenFaceProcessor:
         # Define CSV columns
         fieldnames = [
             'timestamp', 'frame', 'session_id', 'lecture_id', 'course_id',
-            'face_detected', 'confidence', 'status', 'engagement_score',
+            'face_detected', 'confidence', 'status', 'engagement_score', 'carried_forward',
             # Gaze features
             'gaze_0_x', 'gaze_0_y', 'gaze_0_z', 'gaze_1_x', 'gaze_1_y', 'gaze_1_z',
             'gaze_angle_x', 'gaze_angle_y',
@@ -496,32 +863,42 @@ class OpenFaceProcessor:
             if not file_exists:
                 writer.writeheader()
             
-            writer.writerows(self.features_buffer)
+            writer.writerows(rows)
         
-        logger.info(f"Saved {len(self.features_buffer)} frames to {csv_file}")
-        
-        # Clear buffer
-        self.features_buffer = []
+        logger.info(f"Saved {len(rows)} frames to {csv_file}")
+    
+    def close(self):
+        """Flush buffered features"""
+        self.save_features_to_csv()
     
     def get_session_summary(self) -> Dict:
         """Get summary statistics for current session"""
-        if not self.features_buffer:
+        with self._buffer_lock:
+            buffer = list(self.features_buffer)
+        
+        if not buffer:
             return {}
         
-        face_detected_frames = [f for f in self.features_buffer if f['face_detected'] == 1]
+        face_detected_frames = [f for f in buffer if f['face_detected'] == 1]
+        carried_forward_rate = sum(f.get('carried_forward', 0) for f in buffer) / len(buffer)
+        tracking = dict(self.tracker.counts) if self.tracker is not None else {}
         
         if not face_detected_frames:
             return {
-                'total_frames': len(self.features_buffer),
+                'total_frames': len(buffer),
                 'face_detection_rate': 0.0,
+                'carried_forward_rate': carried_forward_rate,
+                'tracking': tracking,
                 'avg_engagement_score': 0.0
             }
         
         engagement_scores = [f['engagement_score'] for f in face_detected_frames]
         
         return {
-            'total_frames': len(self.features_buffer),
-            'face_detection_rate': len(face_detected_frames) / len(self.features_buffer),
+            'total_frames': len(buffer),
+            'face_detection_rate': len(face_detected_frames) / len(buffer),
+            'carried_forward_rate': carried_forward_rate,
+            'tracking': tracking,
             'avg_engagement_score': np.mean(engagement_scores),
             'min_engagement_score': np.min(engagement_scores),
             'max_engagement_score': np.max(engagement_scores),
@@ -531,11 +908,30 @@ class OpenFaceProcessor:
         }
 
 
-# Singleton instance
+# Singleton instances
+_face_mesh_pool = None
+_face_mesh_pool_lock = threading.Lock()
 _openface_processor = None
 
+def get_face_mesh_pool(config_path: str = "config.yaml") -> FaceMeshPool:
+    """Get the process-wide FaceMesh pool (sized to CPU cores unless configured)"""
+    global _face_mesh_pool
+    with _face_mesh_pool_lock:
+        if _face_mesh_pool is None:
+            size = 0
+            try:
+                size = (get_config(config_path).get('openface') or {}).get('face_mesh_pool_size', 0)
+            except OSError:
+                pass
+            _face_mesh_pool = FaceMeshPool(size or os.cpu_count() or 1)
+        return _face_mesh_pool
+
+def create_session_processor(session_id: str) -> OpenFaceProcessor:
+    """Create an OpenFace processor with its own state for one session"""
+    return OpenFaceProcessor(session_id=session_id)
+
 def get_openface_processor() -> OpenFaceProcessor:
-    """Get OpenFace processor singleton"""
+    """Get shared OpenFace processor (single-session use; see create_session_processor)"""
     global _openface_processor
     if _openface_processor is None:
         _openface_processor = OpenFaceProcessor()
@@ -8,15 +8,18 @@ import numpy as np
 import streamlit as st
 from streamlit_webrtc import webrtc_streamer, WebRtcMode, RTCConfiguration
 import av
-from typing import Dict, Optional, Callable
+from typing import Dict, Optional, Callable, Tuple
 from datetime import datetime
 import os
 import uuid
 import logging
-from threading import Thread, Lock
+import queue
+from threading import Thread, Lock, Event, current_thread
 import time
 
-from services.openface_processor import get_openface_processor
+from services.config import get_config
+from services.frame_sampler import create_frame_sampler
+from services.openface_processor import create_session_processor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,10 +29,36 @@ logger = logging.getLogger(__name__)
 class PiPWebcamLive:
     """
     Picture-in-Picture webcam with real-time OpenFace processing
-    Captures frames every second, extracts features, saves to captured_frames
+    Samples frames adaptively (every second while the engagement state
+    changes, less often while it is stable), extracts features, saves to
+    captured_frames
+    
+    The WebRTC callback only samples frames into a bounded queue and draws
+    the last known engagement; a background worker runs OpenFace and does
+    all disk writes. Frames are dropped (and counted) when the queue is full.
+    The worker starts with the first sampled frame and the session ends
+    when the stream stops, the page moves to another lecture, or no frame
+    has arrived for IDLE_TIMEOUT seconds (a closed tab reruns nothing).
+    
+    In analysis-only mode the server only receives the stream: sampled
+    frames are the only ones converted to arrays, nothing is drawn or
+    re-encoded, and the engagement badge is rendered in the browser from
+    get_badge_state() (see render_engagement_badge).
     """
     
-    def __init__(self, lecture_id: str, course_id: str, student_id: str):
+    # Sampled frames waiting for the worker; small so results stay fresh
+    FRAME_QUEUE_SIZE = 4
+    
+    # Camera frame rate requested in analysis-only mode. The WebRTC stack
+    # still has to decode every frame it receives (inter frames depend on
+    # each other), so nobody watching means there's no reason to send 30 fps
+    ANALYSIS_FRAME_RATE = 5
+    
+    # Seconds without a sampled frame after which the worker ends the session
+    IDLE_TIMEOUT = 60.0
+    
+    def __init__(self, lecture_id: str, course_id: str, student_id: str,
+                 analysis_only: bool = False):
         """
         Initialize PiP webcam
         
@@ -37,21 +66,23 @@ class PiPWebcamLive:
             lecture_id: Current lecture ID
             course_id: Current course ID
             student_id: Current student ID
+            analysis_only: Receive-only stream, no server-side overlay
         """
         self.lecture_id = lecture_id
         self.course_id = course_id
         self.student_id = student_id
+        self.analysis_only = analysis_only
         
         # Generate session ID
         self.session_id = f"{student_id}_{lecture_id}_{uuid.uuid4().hex[:8]}"
         
-        # Initialize OpenFace processor
-        self.openface = get_openface_processor()
-        self.openface.set_session_id(self.session_id)
+        # Per-session OpenFace state; inference runs on the shared FaceMesh pool
+        self.openface = create_session_processor(self.session_id)
         
-        # Frame capture settings
-        self.capture_interval = 1.0  # seconds
-        self.last_capture_time = 0
+        # Frame capture settings: the sampler adapts the interval to how
+        # much the engagement state changes (and to the shared CPU budget)
+        self.sampler = create_frame_sampler()
+        self.capture_interval = self.sampler.min_interval  # seconds, fastest rate
         self.frame_count = 0
         
         # Directories
@@ -79,6 +110,15 @@ class PiPWebcamLive:
         }
         self.engagement_lock = Lock()
         
+        # Background processing of sampled frames
+        self.frame_queue: queue.Queue = queue.Queue(maxsize=self.FRAME_QUEUE_SIZE)
+        self.dropped_frames = 0
+        self.processed_frames = 0
+        self._stop_event = Event()
+        self._worker: Optional[Thread] = None
+        self._worker_lock = Lock()
+        self.ended = False
+        
         logger.info(f"PiPWebcamLive initialized for session {self.session_id}")
     
     def video_frame_callback(self, frame: av.VideoFrame) -> av.VideoFrame:
@@ -89,47 +129,113 @@ class PiPWebcamLive:
             frame: Video frame from streamlit-webrtc
         
         Returns:
-            Processed frame with annotations
+            Processed frame with annotations (analysis-only mode: the
+            input frame, which is not sent anywhere)
         """
-        # Convert to numpy array
-        img = frame.to_ndarray(format="bgr24")
-        
         # Get current time
         current_time = time.time()
         
-        # Capture frame every second
-        if current_time - self.last_capture_time >= self.capture_interval:
-            self.last_capture_time = current_time
-            self.frame_count += 1
-            
-            # Process with OpenFace
-            engagement_data = self.openface.process_frame(
-                img, 
-                lecture_id=self.lecture_id, 
-                course_id=self.course_id
-            )
+        # Hand a frame to the worker when the sampler asks; never block the stream
+        if not self.ended and self.sampler.should_sample(current_time):
+            self._ensure_worker()
+            try:
+                # Only this callback adds frames, so a full queue stays full;
+                # skip the conversion. Fresh array per sample: the overlay
+                # below draws into its own
+                if self.frame_queue.full():
+                    raise queue.Full
+                self.frame_queue.put_nowait(frame.to_ndarray(format="bgr24"))
+            except queue.Full:
+                with self.engagement_lock:
+                    self.dropped_frames += 1
+        
+        # Receive-only: the other frames are never converted or re-encoded
+        if self.analysis_only:
+            return frame
+        
+        # Draw last known engagement overlay on frame
+        img = frame.to_ndarray(format="bgr24")
+        annotated_frame = self._draw_engagement_overlay(img, self.get_current_engagement())
+        
+        return av.VideoFrame.from_ndarray(annotated_frame, format="bgr24")
+    
+    def _ensure_worker(self):
+        """Start the background worker if it is not running yet"""
+        with self._worker_lock:
+            if self._worker is None and not self.ended:
+                self._worker = Thread(target=self._process_frames,
+                                      name=f"pip-worker-{self.session_id}", daemon=True)
+                self._worker.start()
+    
+    def _process_frames(self):
+        """Worker loop: run OpenFace on queued frames and persist the results"""
+        last_frame_time = time.monotonic()
+        while True:
+            try:
+                img = self.frame_queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    return
+                if time.monotonic() - last_frame_time >= self.IDLE_TIMEOUT:
+                    logger.info(f"No frames for {self.IDLE_TIMEOUT:.0f}s, "
+                                f"ending session {self.session_id}")
+                    self.end_session()
+                    return
+                continue
             
-            # Save frame with metadata
-            self._save_captured_frame(img, engagement_data)
+            if img is None:  # Sentinel from stop_worker()
+                return
             
-            # Update current engagement
-            with self.engagement_lock:
-                self.current_engagement['score'] = engagement_data['engagement_score']
-                self.current_engagement['status'] = engagement_data['status']
-                self.current_engagement['frame_count'] = self.frame_count
+            last_frame_time = time.monotonic()
+            try:
+                self._process_captured_frame(img)
+            except Exception as e:
+                logger.error(f"Frame processing failed for session {self.session_id}: {e}")
+    
+    def _process_captured_frame(self, img: np.ndarray):
+        """Run OpenFace on one sampled frame and save frame, log and features"""
+        self.frame_count += 1
+        
+        # Process with OpenFace
+        started = time.perf_counter()
+        engagement_data = self.openface.process_frame(
+            img, 
+            lecture_id=self.lecture_id, 
+            course_id=self.course_id
+        )
+        
+        # Next capture interval follows how much the result changed
+        self.sampler.observe(engagement_data, time.perf_counter() - started)
+        
+        # Save frame with metadata
+        self._save_captured_frame(img, engagement_data)
+        
+        # Update current engagement and session data
+        with self.engagement_lock:
+            self.processed_frames += 1
+            self.current_engagement['score'] = engagement_data['engagement_score']
+            self.current_engagement['status'] = engagement_data['status']
+            self.current_engagement['frame_count'] = self.frame_count
             
-            # Add to session data
             self.session_data['engagement_scores'].append(engagement_data['engagement_score'])
             self.session_data['total_frames'] = self.frame_count
-            
-            # Periodically save to CSV
-            if self.frame_count % 10 == 0:
-                self.openface.save_features_to_csv()
-        
-        # Draw engagement overlay on frame
-        annotated_frame = self._draw_engagement_overlay(img, self.current_engagement)
         
-        return av.VideoFrame.from_ndarray(annotated_frame, format="bgr24")
+        # Periodically save to CSV
+        if self.frame_count % 10 == 0:
+            self.openface.save_features_to_csv()
+    
+    def stop_worker(self, timeout: float = 10.0):
+        """Process frames still queued, then stop the background worker"""
+        self._stop_event.set()
+        with self._worker_lock:
+            worker = self._worker
+        if worker is None or worker is current_thread():
+            return
+        try:
+            self.frame_queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        worker.join(timeout=timeout)
     
     def _save_captured_frame(self, frame: np.ndarray, engagement_data: Dict):
         """
@@ -213,14 +319,7 @@ class PiPWebcamLive:
         status = engagement['status']
         
         # Color based on score
-        if score >= 75:
-            color = (0, 255, 0)  # Green
-        elif score >= 50:
-            color = (0, 255, 255)  # Yellow
-        elif score >= 30:
-            color = (0, 165, 255)  # Orange
-        else:
-            color = (0, 0, 255)  # Red
+        color = self._score_color(score)
         
         # Draw engagement score
         score_text = f"Engagement: {score:.1f}/100"
@@ -239,17 +338,61 @@ class PiPWebcamLive:
         
         return frame
     
+    @staticmethod
+    def _score_color(score: float) -> Tuple[int, int, int]:
+        """BGR color for an engagement score"""
+        if score >= 75:
+            return (0, 255, 0)  # Green
+        elif score >= 50:
+            return (0, 255, 255)  # Yellow
+        elif score >= 30:
+            return (0, 165, 255)  # Orange
+        return (0, 0, 255)  # Red
+    
+    def get_badge_state(self) -> Dict:
+        """
+        Engagement badge for the browser to render: the few fields the
+        video overlay would have shown, instead of drawing them server-side
+        """
+        engagement = self.get_current_engagement()
+        blue, green, red = self._score_color(engagement['score'])
+        return {
+            'score': round(engagement['score'], 1),
+            'status': engagement['status'].replace('_', ' ').title(),
+            'frame_count': engagement['frame_count'],
+            'color': f"#{red:02x}{green:02x}{blue:02x}"
+        }
+    
     def get_current_engagement(self) -> Dict:
         """Get current engagement data (thread-safe)"""
         with self.engagement_lock:
             return self.current_engagement.copy()
     
+    def get_worker_stats(self) -> Dict:
+        """Get frame queue counters and sampling decisions (thread-safe)"""
+        with self.engagement_lock:
+            stats = {
+                'queued_frames': self.frame_queue.qsize(),
+                'processed_frames': self.processed_frames,
+                'dropped_frames': self.dropped_frames
+            }
+        stats['sampling'] = self.sampler.stats()
+        if self.sampler.governor is not None:
+            stats['cpu_budget'] = self.sampler.governor.stats()
+        return stats
+    
     def get_session_summary(self) -> Dict:
         """Get session summary statistics"""
-        if not self.session_data['engagement_scores']:
+        with self.engagement_lock:
+            scores = list(self.session_data['engagement_scores'])
+            total_frames = self.session_data['total_frames']
+            dropped_frames = self.dropped_frames
+        
+        if not scores:
             return {
                 'avg_engagement': 0.0,
                 'total_frames': 0,
+                'dropped_frames': dropped_frames,
                 'session_duration': 0
             }
         
@@ -258,18 +401,32 @@ class PiPWebcamLive:
         
         return {
             'session_id': self.session_id,
-            'avg_engagement': np.mean(self.session_data['engagement_scores']),
-            'min_engagement': np.min(self.session_data['engagement_scores']),
-            'max_engagement': np.max(self.session_data['engagement_scores']),
-            'total_frames': self.session_data['total_frames'],
+            'avg_engagement': np.mean(scores),
+            'min_engagement': np.min(scores),
+            'max_engagement': np.max(scores),
+            'total_frames': total_frames,
+            'dropped_frames': dropped_frames,
             'session_duration': duration,
-            'frames_per_minute': self.session_data['total_frames'] / (duration / 60) if duration > 0 else 0
+            'frames_per_minute': total_frames / (duration / 60) if duration > 0 else 0,
+            'sampling': self.sampler.stats()
         }
     
     def end_session(self):
-        """End session and save final data"""
+        """End session and save final data (only the first call does anything)"""
+        with self._worker_lock:
+            if self.ended:
+                return
+            self.ended = True
+        
+        # Let the worker finish queued frames first
+        self.stop_worker()
+        
         # Save remaining features
-        self.openface.save_features_to_csv()
+        self.openface.close()
+        
+        if not self.frame_count:
+            logger.info(f"Session {self.session_id} ended without frames")
+            return
         
         # Save session summary
         summary = self.get_session_summary()
@@ -282,11 +439,24 @@ class PiPWebcamLive:
         logger.info(f"Session {self.session_id} ended. Avg engagement: {summary['avg_engagement']:.2f}")
 
 
+def _pip_config() -> Dict:
+    """pip_webcam section of config.yaml (empty when there is no config)"""
+    try:
+        return get_config().get('pip_webcam') or {}
+    except OSError:
+        return {}
+
+
 def render_pip_webcam(lecture_id: str, course_id: str, student_id: str, 
                        on_engagement_update: Optional[Callable] = None) -> PiPWebcamLive:
     """
     Render Picture-in-Picture webcam component
     
+    pip_webcam.analysis_mode in config.yaml picks the stream direction:
+    "receive_only" sends the webcam to the server and nothing back (the
+    browser draws the engagement badge), "annotated" sends back every frame
+    with the engagement overlay drawn in.
+    
     Args:
         lecture_id: Current lecture ID
         course_id: Current course ID
@@ -296,9 +466,16 @@ def render_pip_webcam(lecture_id: str, course_id: str, student_id: str,
     Returns:
         PiPWebcamLive instance
     """
-    # Initialize PiP webcam
-    if 'pip_webcam' not in st.session_state:
-        st.session_state.pip_webcam = PiPWebcamLive(lecture_id, course_id, student_id)
+    analysis_only = _pip_config().get('analysis_mode', 'annotated') == 'receive_only'
+    
+    # Initialize PiP webcam; a session covers one lecture and one stream
+    pip_webcam = st.session_state.get('pip_webcam')
+    if pip_webcam is not None and (pip_webcam.lecture_id, pip_webcam.course_id,
+                                   pip_webcam.student_id) != (lecture_id, course_id, student_id):
+        pip_webcam.end_session()  # Moved to another lecture or quiz
+    if pip_webcam is None or pip_webcam.ended:
+        st.session_state.pip_webcam = PiPWebcamLive(lecture_id, course_id, student_id,
+                                                    analysis_only=analysis_only)
     
     pip_webcam = st.session_state.pip_webcam
     
@@ -345,19 +522,87 @@ def render_pip_webcam(lecture_id: str, course_id: str, student_id: str,
         {"iceServers": [{"urls": ["stun:stun.l.google.com:19302"]}]}
     )
     
-    # Create PiP webcam streamer
+    # Create PiP webcam streamer. Receive-only runs the callback inline:
+    # it only checks the clock and occasionally queues a frame, so the
+    # per-connection processing thread of async_processing is not needed
+    if pip_webcam.analysis_only:
+        mode = WebRtcMode.SENDONLY
+        video_constraints = {"frameRate": {"ideal": PiPWebcamLive.ANALYSIS_FRAME_RATE,
+                                           "max": PiPWebcamLive.ANALYSIS_FRAME_RATE}}
+    else:
+        mode = WebRtcMode.SENDRECV
+        video_constraints = True
+    
     webrtc_ctx = webrtc_streamer(
         key=f"pip_webcam_{lecture_id}",
-        mode=WebRtcMode.SENDRECV,
+        mode=mode,
         rtc_configuration=rtc_configuration,
         video_frame_callback=pip_webcam.video_frame_callback,
-        media_stream_constraints={"video": True, "audio": False},
-        async_processing=True,
+        media_stream_constraints={"video": video_constraints, "audio": False},
+        async_processing=not pip_webcam.analysis_only,
+        on_video_ended=pip_webcam.end_session,
     )
     
+    # Stop pressed: flush and close now rather than waiting for the idle timeout
+    if not webrtc_ctx.state.playing and pip_webcam.frame_count:
+        pip_webcam.end_session()
+    
+    if pip_webcam.analysis_only and webrtc_ctx.state.playing:
+        render_engagement_badge(pip_webcam)
+    
     return pip_webcam
 
 
+def _render_badge(pip_webcam: PiPWebcamLive):
+    """Draw the engagement badge from the current badge state"""
+    badge = pip_webcam.get_badge_state()
+    st.markdown(f"""
+    <div class="pip-engagement-badge" style="border-color: {badge['color']};">
+        <span class="pip-badge-score" style="color: {badge['color']};">{badge['score']:.1f}</span>
+        <span class="pip-badge-status">{badge['status']}</span>
+        <span class="pip-badge-frames">Frame {badge['frame_count']}</span>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+def render_engagement_badge(pip_webcam: PiPWebcamLive):
+    """
+    Render the engagement badge in the browser (receive-only mode)
+    
+    Only the badge state (score, status, color) travels to the browser.
+    Where Streamlit supports fragments it refreshes on its own every
+    capture interval; otherwise it refreshes with each script rerun.
+    """
+    st.markdown("""
+    <style>
+    .pip-engagement-badge {
+        position: fixed;
+        bottom: 20px;
+        right: 20px;
+        z-index: 9999;
+        display: flex;
+        flex-direction: column;
+        padding: 10px 16px;
+        border: 3px solid;
+        border-radius: 12px;
+        background: rgba(0,0,0,0.75);
+        box-shadow: 0 8px 16px rgba(0,0,0,0.3);
+        color: #fff;
+        font-family: sans-serif;
+    }
+    .pip-badge-score { font-size: 1.6rem; font-weight: 700; }
+    .pip-badge-status { font-size: 0.9rem; }
+    .pip-badge-frames { font-size: 0.7rem; color: #c8c8c8; }
+    </style>
+    """, unsafe_allow_html=True)
+    
+    fragment = getattr(st, 'fragment', None)
+    if fragment is None:
+        _render_badge(pip_webcam)
+    else:
+        fragment(run_every=pip_webcam.capture_interval)(_render_badge)(pip_webcam)
+
+
 def render_engagement_sidebar(pip_webcam: PiPWebcamLive):
     """
     Render engagement metrics in sidebar
@@ -403,6 +648,17 @@ def render_engagement_sidebar(pip_webcam: PiPWebcamLive):
         duration_min = summary['session_duration'] / 60
         st.metric("⏱️ Duration", f"{duration_min:.1f}m")
     
+    if summary.get('dropped_frames'):
+        st.sidebar.caption(
+            f"⚠️ {summary['dropped_frames']} frames skipped while processing was busy")
+    
+    sampling = summary.get('sampling')
+    if sampling:
+        reason = (sampling['last_reason'] or 'first_sample').replace('_', ' ')
+        stretched = (f", slowed {sampling['stretch']:.1f}x for server load"
+                     if sampling['stretch'] > 1 else "")
+        st.sidebar.caption(f"📷 Sampling every {sampling['interval']:.1f}s ({reason}{stretched})")
+    
     # Progress bar for engagement
     st.sidebar.progress(score / 100)
     
@@ -423,4 +679,5 @@ def render_engagement_sidebar(pip_webcam: PiPWebcamLive):
 
 
 # Export functions
-__all__ = ['PiPWebcamLive', 'render_pip_webcam', 'render_engagement_sidebar']
+__all__ = ['PiPWebcamLive', 'render_pip_webcam', 'render_engagement_badge',
+           'render_engagement_sidebar']
@@ -11,7 +11,6 @@ import os
 import csv
 import logging
 
-from services.pip_webcam_live import render_pip_webcam
 from services.anti_cheating import get_anti_cheating_monitor, render_integrity_widget
 from services.session_tracker import get_global_session_tracker
 
@@ -377,6 +376,9 @@ def render_quiz_with_monitoring(quiz: Dict, lecture_id: str, student_id: str):
         st.info("📹 Recording in progress...")
         
         try:
+            # The webcam stack (WebRTC, OpenCV, MediaPipe) loads with the first quiz
+            from services.pip_webcam_live import render_pip_webcam
+            
             # Render PiP webcam
             pip_webcam = render_pip_webcam(f"quiz_{quiz_id}", lecture_id, student_id)
             
@@ -0,0 +1,195 @@
+"""
+Smart LMS - Typed Records
+Compact, slotted records for the cached storage collections
+"""
+
+import json
+import sys
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Type
+
+
+class _Packed(str):
+    """A heavy field kept as compact JSON text until it is read"""
+
+    __slots__ = ()
+
+
+_MISSING = object()
+
+
+def _pack(value: Any) -> _Packed:
+    return _Packed(json.dumps(value, ensure_ascii=False, separators=(',', ':')))
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+class Record(Mapping):
+    """
+    Read-only, dict-compatible record with one slot per known field.
+
+    Subclasses list their fields in FIELDS (in the order they are
+    serialized) and name the subsets that are:
+        INTERNED    id-like strings (or lists of them, held as tuples)
+                    shared across records; interned so every copy is the
+                    same object
+        LAZY        heavy nested fields (detection logs, materials) kept
+                    as compact JSON text and decoded on every read; the
+                    decoded value is not retained
+    Unknown fields go to a per-record dict (nested lists and dicts packed
+    like LAZY fields, so every read gets its own copy). Records live in the collection
+    cache and are shared by every session in the process, so they cannot
+    be changed in place: assigning a field raises TypeError and id lists
+    are tuples. Build a new dict (record.copy() or {**record, ...}) and
+    write it back through storage instead.
+    """
+
+    __slots__ = ('_extra',)
+
+    FIELDS: tuple = ()
+    INTERNED: frozenset = frozenset()
+    LAZY: frozenset = frozenset()
+    _FIELD_SET: frozenset = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELD_SET = frozenset(cls.FIELDS)
+
+    def __init__(self, data: Optional[Mapping] = None):
+        self._extra = None
+        if data:
+            for key, value in data.items():
+                self._set(key, value)
+
+    def _set(self, key: str, value: Any):
+        if key in self._FIELD_SET:
+            if key in self.LAZY:
+                value = _pack(value)
+            elif key in self.INTERNED:
+                if isinstance(value, (list, tuple)):
+                    value = tuple(map(_intern, value))
+                else:
+                    value = _intern(value)
+            object.__setattr__(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = _pack(value) if isinstance(value, (list, dict)) else value
+
+    # ==================== MAPPING PROTOCOL ====================
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._FIELD_SET:
+            value = getattr(self, key, _MISSING)
+            if value is _MISSING:
+                raise KeyError(key)
+            return json.loads(value) if type(value) is _Packed else value
+        if self._extra is None:
+            raise KeyError(key)
+        value = self._extra[key]
+        return json.loads(value) if type(value) is _Packed else value
+
+    def __contains__(self, key) -> bool:
+        if key in self._FIELD_SET:
+            return getattr(self, key, _MISSING) is not _MISSING
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self.FIELDS:
+            if getattr(self, key, _MISSING) is not _MISSING:
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    # ==================== DICT COMPATIBILITY ====================
+
+    def to_dict(self) -> Dict:
+        """Plain, mutable dict copy: heavy fields decoded, id lists as lists"""
+        data = {}
+        for key in self.FIELDS:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                if type(value) is _Packed:
+                    value = json.loads(value)
+                elif type(value) is tuple:
+                    value = list(value)
+                data[key] = value
+        if self._extra:
+            data.update((key, json.loads(value) if type(value) is _Packed else value)
+                        for key, value in self._extra.items())
+        return data
+
+    copy = to_dict
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __reduce__(self):
+        return (type(self), (self.to_dict(),))
+
+
+class UserRecord(Record):
+    FIELDS = ('user_id', 'username', 'password_hash', 'role', 'email', 'full_name',
+              'created_at', 'last_login', 'is_active', 'failed_login_attempts',
+              'last_failed_login', 'updated_at')
+    INTERNED = frozenset({'user_id', 'role'})
+    __slots__ = FIELDS
+
+
+class CourseRecord(Record):
+    FIELDS = ('course_id', 'name', 'teacher_id', 'description', 'lectures',
+              'enrolled_students', 'created_at', 'is_active', 'materials', 'updated_at')
+    INTERNED = frozenset({'course_id', 'teacher_id', 'lectures', 'enrolled_students'})
+    LAZY = frozenset({'materials'})
+    __slots__ = FIELDS
+
+
+class LectureRecord(Record):
+    FIELDS = ('lecture_id', 'title', 'course_id', 'video_path', 'duration',
+              'materials', 'created_at', 'is_active', 'updated_at')
+    INTERNED = frozenset({'lecture_id', 'course_id'})
+    LAZY = frozenset({'materials'})
+    __slots__ = FIELDS
+
+
+class AttendanceRecord(Record):
+    FIELDS = ('attendance_id', 'student_id', 'lecture_id', 'presence_percentage',
+              'status', 'detection_logs', 'recorded_at', 'course_id')
+    INTERNED = frozenset({'student_id', 'lecture_id', 'course_id', 'status'})
+    LAZY = frozenset({'detection_logs'})
+    __slots__ = FIELDS
+
+
+# Record type of each collection cached as typed records
+RECORD_TYPES: Dict[str, Type[Record]] = {
+    'users': UserRecord,
+    'courses': CourseRecord,
+    'lectures': LectureRecord,
+    'attendance': AttendanceRecord
+}
+
+
+def to_records(record_type: Type[Record], data: Dict) -> Dict:
+    """Convert a keyed collection's plain records in place; returns data"""
+    for record_id, record in data.items():
+        if type(record) is not record_type and isinstance(record, Mapping):
+            data[record_id] = record_type(record)
+    return data
+
+
+def load_records(record_type: Type[Record], data: Dict) -> Dict:
+    """Typed copy of a freshly parsed collection, with interned ids"""
+    return {sys.intern(record_id): record_type(record) if isinstance(record, Mapping) else record
+            for record_id, record in data.items()}
+
+
+def encode_record(obj: Any) -> Dict:
+    """json.dumps `default` hook that serializes records as plain objects"""
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
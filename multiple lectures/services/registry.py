@@ -0,0 +1,49 @@
+"""
+Smart LMS - Service Registry
+Services by name, imported and constructed on first use
+"""
+
+import importlib
+import sys
+from typing import Any, Dict, List, Tuple
+
+# name -> (module, singleton getter); nothing is imported until get_service(name)
+SERVICES: Dict[str, Tuple[str, str]] = {
+    'storage': ('services.storage', 'get_storage'),
+    'auth': ('services.auth', 'get_auth'),
+    'theme': ('services.ui_theme', 'get_theme_manager'),
+    'pdf_reader': ('services.pdf_reader', 'get_pdf_reader'),
+    'nlp': ('services.nlp', 'get_nlp_service'),                            # transformers, torch
+    'evaluation': ('services.evaluation', 'get_evaluation_service'),       # xgboost, shap
+    'engagement': ('services.engagement', 'get_engagement_tracker'),       # mediapipe
+    'face_mesh_pool': ('services.openface_processor', 'get_face_mesh_pool'),  # mediapipe
+    'cpu_governor': ('services.frame_sampler', 'get_cpu_governor'),
+}
+
+# Third-party modules that dominate cold start; each is imported only by
+# the feature that needs it
+HEAVY_MODULES = ('mediapipe', 'cv2', 'av', 'streamlit_webrtc', 'transformers', 'torch',
+                 'shap', 'xgboost', 'sklearn')
+
+
+def get_service(name: str) -> Any:
+    """
+    Get a service singleton by name, importing its module on first use.
+    Pages that only sometimes need a service should ask here (or import
+    inside the code path that needs it) rather than at module level.
+    """
+    try:
+        module_name, getter = SERVICES[name]
+    except KeyError:
+        raise KeyError(f"Unknown service: {name}") from None
+    return getattr(importlib.import_module(module_name), getter)()
+
+
+def is_loaded(name: str) -> bool:
+    """Check whether a service's module has been imported yet"""
+    return SERVICES[name][0] in sys.modules
+
+
+def loaded_heavy_modules() -> List[str]:
+    """HEAVY_MODULES imported so far in this process"""
+    return [name for name in HEAVY_MODULES if name in sys.modules]
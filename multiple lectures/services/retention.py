@@ -0,0 +1,145 @@
+"""
+Smart LMS - Data Retention
+Tiered retention driven by the privacy config: hot, archived, anonymized, deleted
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from services.storage import ARCHIVED_COLLECTIONS
+from services.teacher_activity_store import to_epoch
+
+# ml_data directories whose files move to the archive tier by age
+ML_DATA_FILE_DIRS = ('csv_logs', 'engagement_logs', 'session_logs', 'activity_logs', 'quiz_logs')
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class RetentionJob:
+    """
+    Enforce the `privacy` retention settings.
+
+        younger than archive_after_days     hot storage / ml_data
+        younger than anonymize_after_days   archive tier (gzipped, read-only)
+        younger than data_retention_days    archive tier, anonymized
+        older                               deleted
+
+    Attendance and engagement sessions are archived by record timestamp
+    and move through the archive tiers a calendar month at a time; ml_data
+    files go by modification time. Captured frames are face images that
+    cannot be anonymized, so they are deleted at anonymize_after_days
+    (as are archived ml_data files that are not CSVs). Every step is safe
+    to repeat; run it daily (scripts/apply_retention.py).
+    """
+
+    def __init__(self, storage=None):
+        """
+        Args:
+            storage: Storage service (defaults to get_storage())
+        """
+        if storage is None:
+            from services.storage import get_storage
+            storage = get_storage()
+
+        self.storage = storage
+        privacy = storage.config.get('privacy') or {}
+        self.retention_days = privacy.get('data_retention_days', 365)
+        self.anonymize_after_days = min(privacy.get('anonymize_after_days', 180),
+                                        self.retention_days)
+        self.archive_after_days = min(privacy.get('archive_after_days', 90),
+                                      self.anonymize_after_days)
+
+        ml_data = storage.config.get('ml_data') or {}
+        base_path = ml_data.get('base_path', './ml_data')
+        self.ml_data_dirs = {kind: ml_data.get(kind, f"{base_path}/{kind}")
+                             for kind in ML_DATA_FILE_DIRS}
+        self.frames_dir = ml_data.get('captured_frames', f"{base_path}/captured_frames")
+
+    # ==================== ML DATA FILES ====================
+
+    def _apply_to_files(self, kind: str, directory: str, archive_cutoff: float,
+                        anonymize_cutoff: float, expire_cutoff: float) -> Dict[str, int]:
+        """Move one ml_data directory's files through the tiers (cutoffs are epochs)"""
+        archive = self.storage.archive
+        counts = {'archived': 0, 'anonymized': 0, 'deleted': 0}
+
+        if os.path.isdir(directory):
+            for entry in os.scandir(directory):
+                if (entry.is_file() and not entry.name.endswith('.lock')
+                        and entry.stat().st_mtime < archive_cutoff):
+                    archive.archive_file(kind, entry.path)
+                    counts['archived'] += 1
+
+        for path in archive.archived_files(kind):
+            mtime = os.path.getmtime(path)
+            if mtime < expire_cutoff:
+                archive.remove_file(path)
+                counts['deleted'] += 1
+            elif mtime < anonymize_cutoff and not archive.is_anonymized_file(path):
+                if path.endswith('.csv.gz'):
+                    archive.anonymize_csv_file(path)
+                    counts['anonymized'] += 1
+                else:
+                    archive.remove_file(path)
+                    counts['deleted'] += 1
+        return counts
+
+    def _delete_frames(self, cutoff: float) -> int:
+        """Delete captured frames last modified before cutoff (epoch)"""
+        deleted = 0
+        if not os.path.isdir(self.frames_dir):
+            return deleted
+        for entry in os.scandir(self.frames_dir):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                deleted += 1
+        return deleted
+
+    # ==================== HISTORY ====================
+
+    def identifiable_since(self, now: Optional[datetime] = None) -> str:
+        """
+        Start of the oldest month whose archived records still carry student
+        ids (earlier months are anonymized), as a naive-UTC ISO `since` for
+        student history queries against the archive tier
+        """
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=self.anonymize_after_days)
+        return cutoff.replace(day=1, hour=0, minute=0, second=0, microsecond=0).isoformat()
+
+    # ==================== RUN ====================
+
+    def run(self, now: Optional[datetime] = None) -> Dict[str, Dict[str, int]]:
+        """
+        Apply every retention step once.
+
+        Args:
+            now: Reference time (naive UTC, defaults to the current time)
+
+        Returns:
+            {collection or ml_data directory: {'archived', 'anonymized', 'deleted'}}
+        """
+        now = now or datetime.utcnow()
+        archive_before = (now - timedelta(days=self.archive_after_days)).isoformat()
+        anonymize_before = (now - timedelta(days=self.anonymize_after_days)).isoformat()
+        expire_before = (now - timedelta(days=self.retention_days)).isoformat()
+
+        report = {}
+        for collection in ARCHIVED_COLLECTIONS:
+            report[collection] = {
+                'archived': self.storage.archive_records(collection, archive_before),
+                'anonymized': self.storage.anonymize_archived(collection, anonymize_before),
+                'deleted': self.storage.expire_archived(collection, expire_before)
+            }
+
+        for kind, directory in self.ml_data_dirs.items():
+            report[f"ml_data/{kind}"] = self._apply_to_files(
+                kind, directory, to_epoch(archive_before), to_epoch(anonymize_before),
+                to_epoch(expire_before))
+
+        report['ml_data/captured_frames'] = {
+            'archived': 0, 'anonymized': 0,
+            'deleted': self._delete_frames(to_epoch(anonymize_before))
+        }
+        return report
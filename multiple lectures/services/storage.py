@@ -3,12 +3,559 @@ Smart LMS - Storage Service
 JSON-based storage with database migration readiness
 """
 
+import copy
+import glob
 import json
+import logging
 import os
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from itertools import chain
+from typing import Dict, List, Optional, Any, Callable
 from pathlib import Path
-import yaml
+
+from services.config import get_config
+from services.engagement_log_store import EngagementLogStore
+from services.teacher_activity_store import TeacherActivityStore, to_epoch
+from services.change_feed import ChangeFeed, ChangeSubscription
+from services.archive_store import ArchiveStore
+from services.records import RECORD_TYPES, encode_record, load_records, to_records
+from services.file_locks import get_lock_manager, atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class FieldIndex:
+    """
+    Secondary index over one field of a keyed collection.
+    Maps field value -> ordered set of record ids (a dict with None values).
+    """
+    
+    __slots__ = ('field', 'postings', 'values')
+    
+    def __init__(self, field: str, records: Dict):
+        self.field = field
+        self.postings: Dict[Any, Dict[str, None]] = {}
+        self.values: Dict[str, Any] = {}
+        for record_id, record in records.items():
+            self.update(record_id, record)
+    
+    def update(self, record_id: str, record: Optional[Dict]):
+        """Re-index one record; pass None when the record was deleted"""
+        value = record.get(self.field) if isinstance(record, Mapping) else None
+        try:
+            hash(value)
+        except TypeError:
+            value = None
+        
+        if record_id in self.values:
+            old_value = self.values[record_id]
+            if record is not None and old_value == value:
+                return
+            posting = self.postings.get(old_value)
+            if posting is not None:
+                posting.pop(record_id, None)
+                if not posting:
+                    del self.postings[old_value]
+            del self.values[record_id]
+        
+        if record is not None:
+            self.values[record_id] = value
+            self.postings.setdefault(value, {})[record_id] = None
+    
+    def lookup(self, value: Any) -> Dict[str, None]:
+        """Get the ids of records whose field equals value"""
+        return self.postings.get(value, {})
+
+
+class _CacheEntry:
+    __slots__ = ('signature', 'data', 'indexes')
+    
+    def __init__(self, signature: tuple, data: Any):
+        self.signature = signature
+        self.data = data
+        self.indexes: Dict[str, FieldIndex] = {}
+
+
+class CollectionCache:
+    """
+    Process-wide cache of parsed JSON collections.
+    
+    Entries are keyed by file path and validated against the file's
+    (mtime, size, inode) signature, so writes from other processes are
+    picked up on the next read. Cached objects are shared by every
+    StorageService in the process: getters hand out new collection
+    mappings, and the records of the typed collections (services/records.py)
+    cannot be changed in place; change data only through storage.
+    
+    Each entry also carries secondary indexes, built lazily the first time
+    a field is filtered on and maintained incrementally on write-through.
+    """
+    
+    def __init__(self):
+        self._entries: Dict[str, _CacheEntry] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.index_builds = 0
+    
+    @staticmethod
+    def _signature(file_path: str) -> Optional[tuple]:
+        """Return the (mtime, size, inode) signature of a file, or None if missing"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    
+    def _load_entry(self, file_path: str, loader: Callable[[str], Any]) -> _CacheEntry:
+        """Return a current entry for a file, calling loader on miss or stale entry"""
+        signature = self._signature(file_path)
+        
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is not None and signature is not None and entry.signature == signature:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            if entry is not None:
+                self.invalidations += 1
+                del self._entries[file_path]
+        
+        # Parse outside the lock; the pre-read signature guarantees a
+        # concurrent write is detected on the next lookup
+        entry = _CacheEntry(signature, loader(file_path))
+        if signature is not None:
+            with self._lock:
+                self._entries[file_path] = entry
+        return entry
+    
+    def load(self, file_path: str, loader: Callable[[str], Any]) -> Any:
+        """Return cached data for a file"""
+        return self._load_entry(file_path, loader).data
+    
+    def lookup(self, file_path: str, loader: Callable[[str], Any],
+               filters: Dict[str, Any]) -> tuple:
+        """
+        Find records whose fields equal all filter values.
+        
+        Returns:
+            (data, matching record ids) - ids are in index order
+        """
+        entry = self._load_entry(file_path, loader)
+        data = entry.data
+        if not filters:
+            return data, list(data)
+        
+        with self._lock:
+            postings = []
+            for field, value in filters.items():
+                index = entry.indexes.get(field)
+                if index is None:
+                    index = entry.indexes[field] = FieldIndex(field, data)
+                    self.index_builds += 1
+                postings.append(index.lookup(value))
+            
+            # Walk the smallest posting list and probe the others
+            postings.sort(key=len)
+            smallest, others = postings[0], postings[1:]
+            ids = [rid for rid in smallest if all(rid in other for other in others)]
+        return data, ids
+    
+    def store(self, file_path: str, data: Any, changed_ids: Optional[List[str]] = None,
+              base: Any = None):
+        """
+        Write-through update after data has been persisted to file_path.
+        When changed_ids is given and data was derived from the cached
+        object `base` (or is that object, modified in place), indexes are
+        carried over and patched for those ids only.
+        """
+        signature = self._signature(file_path)
+        base = data if base is None else base
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if signature is None:
+                self._entries.pop(file_path, None)
+                return
+            new_entry = _CacheEntry(signature, data)
+            if entry is not None and entry.data is base and changed_ids is not None:
+                for index in entry.indexes.values():
+                    for record_id in changed_ids:
+                        index.update(record_id, data.get(record_id))
+                new_entry.indexes = entry.indexes
+            self._entries[file_path] = new_entry
+    
+    def invalidate(self, file_path: Optional[str] = None):
+        """Drop one cached file, or every entry when no path is given"""
+        with self._lock:
+            if file_path is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+            elif self._entries.pop(file_path, None) is not None:
+                self.invalidations += 1
+    
+    def stats(self) -> Dict:
+        """Get hit/miss counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+                'index_builds': self.index_builds
+            }
+    
+    def reset_stats(self):
+        """Reset hit/miss counters"""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+            self.index_builds = 0
+
+
+# Shared by every StorageService instance in the process, so the cache
+# survives Streamlit reruns and is reused across user sessions
+_collection_cache = CollectionCache()
+_lock_manager = get_lock_manager()
+
+
+class _Transaction:
+    """Working copy of one collection inside StorageService._transaction"""
+    
+    __slots__ = ('data', 'changed')
+    
+    def __init__(self, data: Dict):
+        self.data = data
+        self.changed: List[str] = []
+    
+    def mark(self, *record_ids: str):
+        """Record which top-level ids were added, replaced or deleted"""
+        self.changed.extend(record_ids)
+
+
+def apply_login_attempt(user: Dict, success: bool, max_failed_attempts: int) -> Dict:
+    """Return a copy of a user record with one login attempt applied"""
+    now = datetime.utcnow().isoformat()
+    if success:
+        return {**user, 'last_login': now, 'failed_login_attempts': 0, 'updated_at': now}
+    
+    failed_attempts = user.get('failed_login_attempts', 0) + 1
+    updated = {
+        **user,
+        'failed_login_attempts': failed_attempts,
+        'last_failed_login': now,
+        'updated_at': now
+    }
+    
+    # Lock account if too many attempts
+    if failed_attempts >= max_failed_attempts:
+        updated['is_active'] = False
+    return updated
+
+
+# ==================== COURSE AGGREGATES ====================
+# Running sums/counts per course, kept up to date by the write paths so
+# teacher evaluation never has to rescan logs, feedback and grades.
+
+AGGREGATE_METRICS = (
+    'engagement_score',
+    'feedback_rating',
+    'quiz_percentage',
+    'assignment_percentage',
+    'attendance_percentage',
+)
+
+
+def empty_course_aggregate(course_id: str) -> Dict:
+    """Zeroed aggregate record for a course"""
+    aggregate = {'course_id': course_id}
+    for metric in AGGREGATE_METRICS:
+        aggregate[metric] = {'sum': 0.0, 'count': 0}
+    return aggregate
+
+
+def feedback_rating(feedback: Optional[Dict]) -> Optional[float]:
+    """Rating used for evaluation: legacy 'rating' or detailed ratings['overall']"""
+    if not feedback:
+        return None
+    if feedback.get('rating') is not None:
+        return feedback['rating']
+    return (feedback.get('ratings') or {}).get('overall')
+
+
+def apply_aggregate_delta(aggregate: Optional[Dict], course_id: str, metric: str,
+                          removed: Optional[float], added: Optional[float]) -> Dict:
+    """
+    Return a copy of a course aggregate with one value replaced:
+    `removed` (the overwritten record's value) is taken out, `added` put in
+    """
+    aggregate = dict(aggregate or empty_course_aggregate(course_id))
+    stats = dict(aggregate.get(metric) or {'sum': 0.0, 'count': 0})
+    if removed is not None:
+        stats['sum'] -= removed
+        stats['count'] -= 1
+    if added is not None:
+        stats['sum'] += added
+        stats['count'] += 1
+    aggregate[metric] = stats
+    aggregate['updated_at'] = datetime.utcnow().isoformat()
+    return aggregate
+
+
+def build_course_aggregates(lecture_courses: Dict[str, str], engagement_logs,
+                            feedback, grades, attendance) -> Dict:
+    """
+    Recompute every course aggregate from scratch.
+    
+    Args:
+        lecture_courses: {lecture_id: course_id}
+        engagement_logs, feedback, attendance: Iterables of records
+        grades: Iterable of (assessment_type, grade_entry)
+    """
+    aggregates: Dict[str, Dict] = {}
+    
+    def add(course_id, metric, value):
+        if course_id and value is not None:
+            aggregates[course_id] = apply_aggregate_delta(
+                aggregates.get(course_id), course_id, metric, None, value)
+    
+    for log in engagement_logs:
+        add(lecture_courses.get(log.get('lecture_id')), 'engagement_score',
+            log.get('engagement_score'))
+    for record in feedback:
+        add(lecture_courses.get(record.get('lecture_id')), 'feedback_rating',
+            feedback_rating(record))
+    for assessment_type, entry in grades:
+        add(entry.get('course_id'), f"{assessment_type}_percentage", entry.get('percentage'))
+    for record in attendance:
+        add(lecture_courses.get(record.get('lecture_id')), 'attendance_percentage',
+            record.get('presence_percentage'))
+    
+    return aggregates
+
+
+def fold_course_aggregates(courses: Dict, aggregates: Dict) -> Dict:
+    """
+    Combine the aggregates of a teacher's courses into one summary:
+    {'num_courses', 'total_students', metric: {'sum', 'count', 'mean'}}
+    """
+    summary = {
+        'num_courses': len(courses),
+        'total_students': sum(len(c.get('enrolled_students', [])) for c in courses.values())
+    }
+    for metric in AGGREGATE_METRICS:
+        total, count = 0.0, 0
+        for course_id in courses:
+            stats = (aggregates.get(course_id) or {}).get(metric)
+            if stats:
+                total += stats['sum']
+                count += stats['count']
+        summary[metric] = {
+            'sum': total,
+            'count': count,
+            'mean': total / count if count else None
+        }
+    return summary
+
+
+# Rating dimensions rolled up per teacher, and how many trend buckets are kept
+EVALUATION_DIMENSIONS = ('overall', 'content_quality', 'clarity', 'pace',
+                         'engagement', 'visual_aids', 'composite')
+EVALUATION_DAILY_BUCKETS = 90
+EVALUATION_WEEKLY_BUCKETS = 104
+
+
+def _empty_rating_stats() -> Dict:
+    return {'count': 0, 'sum': 0.0, 'sum_sq': 0.0}
+
+
+def _add_rating(stats: Dict, value: float):
+    stats['count'] += 1
+    stats['sum'] += value
+    stats['sum_sq'] += value * value
+
+
+def summarize_rating_stats(stats: Optional[Dict]) -> Dict:
+    """Turn {'count', 'sum', 'sum_sq'} into {'count', 'mean', 'std'}"""
+    count = (stats or {}).get('count', 0)
+    if not count:
+        return {'count': 0, 'mean': None, 'std': None}
+    mean = stats['sum'] / count
+    variance = max(stats['sum_sq'] / count - mean * mean, 0.0)
+    return {'count': count, 'mean': mean, 'std': variance ** 0.5}
+
+
+def _seed_rating_stats(count: int, mean: float) -> Dict:
+    # Documents written before the rollups only kept running means, so the
+    # spread of that older feedback is unknown and counted as zero
+    return {'count': count, 'sum': mean * count, 'sum_sq': mean * mean * count}
+
+
+def _upgrade_evaluation(teacher_eval: Dict):
+    """Bring an evaluation document written by an older version up to the rollup shape"""
+    count = teacher_eval.setdefault('total_feedback_count', 0)
+    averages = teacher_eval.setdefault('average_ratings', {})
+    if 'rating_stats' not in teacher_eval:
+        teacher_eval['rating_stats'] = {
+            key: _seed_rating_stats(count, averages.get(key, 0.0))
+            for key in EVALUATION_DIMENSIONS
+        }
+    teacher_eval.setdefault('sentiment_distribution', {'positive': 0, 'neutral': 0, 'negative': 0})
+    teacher_eval.setdefault('daily', {})
+    teacher_eval.setdefault('weekly', {})
+    
+    for group in ('feedback_by_course', 'feedback_by_lecture'):
+        for entry in teacher_eval.setdefault(group, {}).values():
+            # Feedback ids are served by the feedback collection's indexes now
+            entry.pop('feedback_ids', None)
+            if 'sum' not in entry:
+                entry.update(_seed_rating_stats(entry.get('count', 0),
+                                                entry.get('avg_composite', 0.0)))
+
+
+def _add_to_bucket(buckets: Dict, key: str, composite: float, sentiment_score: float, limit: int):
+    """Count one feedback in a trend bucket, dropping the oldest buckets past limit"""
+    bucket = buckets.get(key)
+    if bucket is None:
+        bucket = buckets[key] = {**_empty_rating_stats(), 'sentiment_sum': 0.0}
+        if len(buckets) > limit:
+            for old_key in sorted(buckets)[:len(buckets) - limit]:
+                del buckets[old_key]
+    _add_rating(bucket, composite)
+    bucket['sentiment_sum'] += sentiment_score
+
+
+def apply_feedback_to_evaluation(teacher_eval: Optional[Dict], teacher_id: str,
+                                 lecture_id: str, course_id: str, feedback_id: str,
+                                 ratings: Dict, sentiment: Dict) -> Dict:
+    """
+    Fold one feedback submission into a teacher's evaluation metrics.
+    Shared by every storage backend so the document shape stays identical.
+    
+    Metrics are running aggregates (count, sum and sum of squares per
+    rating dimension, course and lecture) plus capped daily and weekly
+    trend buckets, so the document stays the same size however much
+    feedback arrives. The ids of the feedback behind each course and
+    lecture are looked up with get_feedback_ids().
+    """
+    if teacher_eval is None:
+        teacher_eval = {'teacher_id': teacher_id}
+    _upgrade_evaluation(teacher_eval)
+    
+    # Update feedback count and per-dimension aggregates
+    teacher_eval['total_feedback_count'] += 1
+    for key, value in ratings.items():
+        stats = teacher_eval['rating_stats'].setdefault(key, _empty_rating_stats())
+        _add_rating(stats, value)
+        teacher_eval['average_ratings'][key] = stats['sum'] / stats['count']
+    
+    # Update sentiment distribution
+    sentiment_label = sentiment.get('label', 'neutral')
+    teacher_eval['sentiment_distribution'][sentiment_label] = \
+        teacher_eval['sentiment_distribution'].get(sentiment_label, 0) + 1
+    
+    # Track by course and by lecture
+    composite = ratings['composite']
+    for group, key in (('feedback_by_course', course_id), ('feedback_by_lecture', lecture_id)):
+        entry = teacher_eval[group].setdefault(key, {**_empty_rating_stats(), 'avg_composite': 0.0})
+        _add_rating(entry, composite)
+        entry['avg_composite'] = entry['sum'] / entry['count']
+    
+    # Trend buckets (UTC calendar days and ISO weeks)
+    now = datetime.utcnow()
+    sentiment_score = sentiment.get('compound', 0.0) or 0.0
+    iso_year, iso_week, _ = now.isocalendar()
+    _add_to_bucket(teacher_eval['daily'], now.strftime('%Y-%m-%d'),
+                   composite, sentiment_score, EVALUATION_DAILY_BUCKETS)
+    _add_to_bucket(teacher_eval['weekly'], f"{iso_year}-W{iso_week:02d}",
+                   composite, sentiment_score, EVALUATION_WEEKLY_BUCKETS)
+    
+    teacher_eval['last_updated'] = now.isoformat()
+    
+    return teacher_eval
+
+
+# ==================== COURSE SHARDS ====================
+# With `storage.shard_by_course: true` these collections are split into
+# storage/courses/<course_id>/<collection>.json (engagement sessions into
+# storage/courses/<course_id>/engagement_logs/). Records whose course is
+# unknown, and records written before sharding was enabled, stay in the
+# shared file, which every read also covers.
+
+SHARDED_COLLECTIONS = ('attendance', 'feedback', 'grades', 'progress', 'course_aggregates')
+
+_shard_pool: Optional[ThreadPoolExecutor] = None
+_shard_pool_lock = threading.Lock()
+
+
+def _shard_executor(workers: int) -> ThreadPoolExecutor:
+    """Process-wide thread pool for reading shards in parallel"""
+    global _shard_pool
+    with _shard_pool_lock:
+        if _shard_pool is None:
+            _shard_pool = ThreadPoolExecutor(max_workers=workers,
+                                             thread_name_prefix='storage-shard')
+        return _shard_pool
+
+
+def shard_files(shards_dir: str, collection: str) -> List[str]:
+    """List the existing course shard files of a collection"""
+    return sorted(glob.glob(os.path.join(glob.escape(shards_dir), '*', f"{collection}.json")))
+
+
+def shard_log_dirs(shards_dir: str) -> List[str]:
+    """List the existing per-course engagement log directories"""
+    pattern = os.path.join(glob.escape(shards_dir), '*', 'engagement_logs',
+                           EngagementLogStore.INDEX_FILE)
+    return sorted(os.path.dirname(path) for path in glob.glob(pattern))
+
+
+def merge_collection_parts(collection: str, parts: List[Dict]) -> Dict:
+    """Combine a collection's shared file and shards into the unsharded shape (later parts win)"""
+    parts = [part for part in parts if part]
+    if len(parts) <= 1:
+        return parts[0] if parts else {}
+    
+    merged: Dict = {}
+    if collection == 'grades':
+        # {student_id: {'quizzes': [...], 'assignments': [...]}}
+        for part in parts:
+            for student_id, student_grades in part.items():
+                target = merged.setdefault(student_id, {'quizzes': [], 'assignments': []})
+                for bucket in ('quizzes', 'assignments'):
+                    target[bucket] = target[bucket] + student_grades.get(bucket, [])
+        for student_grades in merged.values():
+            for bucket in ('quizzes', 'assignments'):
+                student_grades[bucket].sort(key=lambda entry: entry.get('timestamp', ''))
+    elif collection == 'progress':
+        # {student_id: {course_id: entry}}
+        for part in parts:
+            for student_id, courses in part.items():
+                merged[student_id] = {**merged.get(student_id, {}), **courses}
+    else:
+        for part in parts:
+            merged.update(part)
+    return merged
+
+
+# ==================== RETENTION ====================
+# Collections whose old records move to the archive tier (see
+# services/retention.py). Course aggregates keep counting archived records
+# until they expire.
+# {collection: (key field, timestamp field, aggregate metric, value field)}
+
+ARCHIVED_COLLECTIONS = {
+    'attendance': ('attendance_id', 'recorded_at', 'attendance_percentage', 'presence_percentage'),
+    'engagement_logs': ('log_id', 'created_at', 'engagement_score', 'engagement_score'),
+}
 
 
 class StorageService:
@@ -19,11 +566,57 @@ class StorageService:
     
     def __init__(self, config_path: str = "config.yaml"):
         """Initialize storage service with configuration"""
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        self.config = get_config(config_path)
+        
+        self.storage_paths = dict(self.config['storage'])
+        self.storage_paths.setdefault('course_aggregates',
+                                      f"{self.storage_paths['base_path']}/course_aggregates.json")
+        self._local = threading.local()  # per-thread batch() state
+        
+        # Optional per-course layout for the high-volume collections
+        self.shard_by_course = bool(self.storage_paths.get('shard_by_course', False))
+        self.shards_dir = f"{self.storage_paths['base_path']}/courses"
+        self.shard_workers = self.storage_paths.get('shard_workers') or min(8, os.cpu_count() or 1)
+        self._course_log_stores: Dict[str, EngagementLogStore] = {}
+        self._course_log_stores_lock = threading.Lock()
+        
+        # Users, courses, lectures and attendance are cached as compact typed
+        # records (services/records.py) instead of plain dicts
+        self._record_files = {self.storage_paths[name]: record_type
+                              for name, record_type in RECORD_TYPES.items()}
         
-        self.storage_paths = self.config['storage']
         self._ensure_storage_structure()
+        
+        # Every committed write bumps its collection's version in the change feed
+        self.changes = ChangeFeed(self.storage_paths.get(
+            'changes_dir', f"{self.storage_paths['base_path']}/changes"))
+        
+        # Records past the hot window, compressed and read-only
+        self.archive = ArchiveStore(self.storage_paths.get(
+            'archive_dir', f"{self.storage_paths['base_path']}/archive"))
+        
+        # Engagement sessions live in an append-only segment log; the old
+        # engagement_logs.json is imported on first start
+        self.engagement_logs = EngagementLogStore(
+            self.storage_paths.get('engagement_logs_dir',
+                                   f"{self.storage_paths['base_path']}/engagement_logs"),
+            legacy_json_path=self.storage_paths.get('engagement_logs')
+        )
+        
+        # Teacher activity is partitioned per teacher per month; the old
+        # teacher_activity.json is imported on first start
+        self.teacher_activity = TeacherActivityStore(
+            self.storage_paths.get('teacher_activity_dir',
+                                   f"{self.storage_paths['base_path']}/teacher_activity"),
+            legacy_json_path=self.storage_paths.get('teacher_activity')
+        )
+        
+        # Materialize course aggregates once for data written before they
+        # existed, or into the course shards once sharding is switched on
+        aggregates_path = self.storage_paths['course_aggregates']
+        if (not os.path.exists(aggregates_path) or
+                (self.shard_by_course and self._read_json(aggregates_path))):
+            self.rebuild_course_aggregates()
     
     def _ensure_storage_structure(self):
         """Create storage directories and initialize JSON files if they don't exist"""
@@ -38,12 +631,10 @@ class StorageService:
             'users': {},
             'courses': {},
             'lectures': {},
-            'engagement_logs': {},
             'feedback': {},
             'grades': {},
             'evaluation': {},
             'attendance': {},
-            'teacher_activity': {},
             'progress': {},
             'enrollment_requests': {}
         }
@@ -51,21 +642,426 @@ class StorageService:
         for key, default_value in default_structures.items():
             file_path = self.storage_paths[key]
             if not os.path.exists(file_path):
-                self._write_json(file_path, default_value)
+                with _lock_manager.lock(file_path):
+                    if not os.path.exists(file_path):
+                        self._write_json(file_path, default_value)
     
-    def _read_json(self, file_path: str) -> Dict:
-        """Read JSON file"""
+    @staticmethod
+    def _load_json_file(file_path: str) -> Dict:
+        """Parse JSON file from disk (raises on a corrupt file)"""
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+        except FileNotFoundError:
             return {}
     
-    def _write_json(self, file_path: str, data: Dict):
-        """Write JSON file"""
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    def _record_type(self, file_path: str):
+        """Typed record class a collection file is cached as (None for plain dicts)"""
+        record_type = self._record_files.get(file_path)
+        if record_type is None and file_path.startswith(self.shards_dir + os.sep):
+            record_type = RECORD_TYPES.get(os.path.splitext(os.path.basename(file_path))[0])
+        return record_type
+    
+    def _loader(self, file_path: str) -> Callable[[str], Dict]:
+        """Parser for a collection file: plain JSON, or JSON decoded into typed records"""
+        record_type = self._record_type(file_path)
+        if record_type is None:
+            return self._load_json_file
+        return lambda path: load_records(record_type, self._load_json_file(path))
+    
+    def _read_json(self, file_path: str, strict: bool = False) -> Dict:
+        """
+        Read JSON file through the shared collection cache.
+        A corrupt file reads as {} unless strict, so it is never cached
+        and never written back over inside a transaction.
+        """
+        try:
+            return _collection_cache.load(file_path, self._loader(file_path))
+        except json.JSONDecodeError:
+            if strict:
+                raise
+            logger.error(f"Corrupt storage file, returning empty collection: {file_path}")
+            return {}
+    
+    def _write_json(self, file_path: str, data: Dict, changed_ids: Optional[List[str]] = None,
+                    base: Optional[Dict] = None):
+        """Atomically replace a JSON file and refresh the cached copy"""
+        atomic_write(file_path, json.dumps(data, indent=2, ensure_ascii=False,
+                                           default=encode_record).encode('utf-8'))
+        record_type = self._record_type(file_path)
+        if record_type is not None:
+            to_records(record_type, data)
+        _collection_cache.store(file_path, data, changed_ids, base)
+    
+    @contextmanager
+    def _transaction(self, collection: str, file_path: Optional[str] = None):
+        """
+        Locked read-modify-write of one collection.
+        
+        Yields a _Transaction whose `data` is a shallow copy of the cached
+        collection: replace (never mutate) the records you change and mark()
+        their ids. On exit the file is replaced atomically if anything was
+        marked; nothing is written if the block raises.
+        """
+        file_path = file_path or self.storage_paths[collection]
+        
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            # Inside batch(): share one working copy per file, flushed at batch exit
+            locks, transactions = batch
+            if file_path not in transactions:
+                locks.enter_context(_lock_manager.lock(file_path))
+                base = self._read_json(file_path, strict=True)
+                transactions[file_path] = (collection, base, _Transaction(dict(base)))
+            yield transactions[file_path][2]
+            return
+        
+        with _lock_manager.lock(file_path):
+            base = self._read_json(file_path, strict=True)
+            txn = _Transaction(dict(base))
+            yield txn
+            if txn.changed:
+                self._write_json(file_path, txn.data, txn.changed, base)
+                self.changes.record(collection, txn.changed)
+    
+    @contextmanager
+    def batch(self):
+        """
+        Group many mutations so each touched collection is written once.
+        
+        Mutators called inside the block share one locked working copy per
+        collection; every copy is flushed when the block exits and all of
+        them are discarded if it raises. Getters keep returning the last
+        committed data until then. Locks are held until exit, so touch
+        collections in a consistent order. Nested batch() calls join the
+        outer one.
+        
+        Usage:
+            with storage.batch():
+                for row in rows:
+                    storage.create_user(**row)
+        """
+        if getattr(self._local, 'batch', None) is not None:
+            yield self
+            return
+        
+        transactions: Dict[str, tuple] = {}
+        with ExitStack() as locks:
+            self._local.batch = (locks, transactions)
+            try:
+                yield self
+            finally:
+                self._local.batch = None
+            
+            for file_path, (collection, base, txn) in transactions.items():
+                if txn.changed:
+                    self._write_json(file_path, txn.data, txn.changed, base)
+                    self.changes.record(collection, txn.changed)
+    
+    def _query_file(self, file_path: str, filters: Dict) -> Dict:
+        """Get {record_id: record} from one file through its cached secondary indexes"""
+        try:
+            data, ids = _collection_cache.lookup(file_path, self._loader(file_path), filters)
+        except json.JSONDecodeError:
+            logger.error(f"Corrupt storage file: {file_path}")
+            return {}
+        return {record_id: data[record_id] for record_id in ids}
+    
+    def _query(self, collection: str, **filters) -> Dict:
+        """
+        Get {record_id: record} for records whose fields match all non-empty
+        filters, using the cached secondary indexes instead of a full scan.
+        With course shards, a course_id or lecture_id filter reads one shard;
+        other queries fan out across all of them.
+        """
+        filters = {field: value for field, value in filters.items() if value}
+        course_id = None
+        if self.shard_by_course and collection in SHARDED_COLLECTIONS:
+            course_id = (filters.get('course_id')
+                         or self._course_of_lecture(filters.get('lecture_id')))
+        
+        paths = self._read_paths(collection, course_id)
+        parts = self._fan_out(lambda path: self._query_file(path, filters), paths)
+        if len(parts) == 1:
+            return parts[0]
+        
+        # A shared record rewritten since sharding began has a newer copy in
+        # its shard, which may no longer match the filters: drop the stale one
+        shared = parts[0]
+        if shared:
+            shards = [self._read_json(path) for path in paths[1:]]
+            shared = {rid: record for rid, record in shared.items()
+                      if not any(rid in shard for shard in shards)}
+        merged = dict(shared)
+        for part in parts[1:]:
+            merged.update(part)
+        return merged
+    
+    def get_cache_stats(self) -> Dict:
+        """Get collection cache hit/miss counters"""
+        return _collection_cache.stats()
+    
+    def clear_cache(self):
+        """Drop all cached collections (next reads go to disk)"""
+        _collection_cache.invalidate()
+    
+    # ==================== CHANGE FEED ====================
+    
+    def get_collection_version(self, collection: str) -> int:
+        """Get a collection's version: it increases with every committed write"""
+        return self.changes.version(collection)
+    
+    def get_collection_versions(self, *collections: str) -> tuple:
+        """Get the versions of several collections, e.g. as a cache key for a derived view"""
+        return tuple(self.changes.version(collection) for collection in collections)
+    
+    def get_changes(self, collection: str, since_version: int) -> tuple:
+        """
+        Get (current version, ids of records changed after since_version).
+        The ids are None when they are no longer known: reload the collection.
+        """
+        return self.changes.changes_since(collection, since_version)
+    
+    def iter_changes(self, collection: str, since_version: int):
+        """Iterate over (version, changed ids) committed after since_version (see get_changes)"""
+        return self.changes.iter_changes(collection, since_version)
+    
+    def subscribe(self, *collections: str) -> ChangeSubscription:
+        """Follow collections from their current versions; poll() returns what changed since"""
+        return self.changes.subscribe(*collections)
+    
+    # ==================== ARCHIVE TIER ====================
+    
+    def _hot_ids(self, collection: str) -> Callable[[str], bool]:
+        """Membership test for record ids still in the hot store"""
+        if collection == 'engagement_logs':
+            stores = self._engagement_stores()
+            return lambda record_id: any(record_id in store for store in stores)
+        return self._read_merged(collection).__contains__
+    
+    def _with_archive(self, collection: str, hot_records: List[Dict], since: Optional[str] = None,
+                      **filters) -> List[Dict]:
+        """Hot records plus matching archived ones (a hot copy shadows its archived one)"""
+        key = ARCHIVED_COLLECTIONS[collection][0]
+        hot_ids = {record[key] for record in hot_records}
+        archived = self.query_archive(collection, since=since, **filters)
+        return hot_records + [record for record in archived if record[key] not in hot_ids]
+    
+    def _archived_only(self, collection: str) -> List[Dict]:
+        """Archived records that are not also still hot (left by an interrupted run)"""
+        key = ARCHIVED_COLLECTIONS[collection][0]
+        is_hot = self._hot_ids(collection)
+        return [record for record in self.query_archive(collection) if not is_hot(record[key])]
+    
+    def archive_records(self, collection: str, before: str) -> int:
+        """
+        Move records with a timestamp before `before` (naive-UTC ISO) from the
+        hot store into archive segments; returns the number moved. Records are
+        archived before they are removed, so an interruption leaves a
+        duplicate (the hot copy wins), never a loss.
+        """
+        key, timestamp_field, _, _ = ARCHIVED_COLLECTIONS[collection]
+        
+        def expired(record: Dict) -> bool:
+            return (record.get(timestamp_field) or before) < before
+        
+        if collection == 'engagement_logs':
+            moved = []
+            
+            def archive(records: List[Dict]):
+                self.archive.append(collection, records, timestamp_field)
+                moved.extend(record[key] for record in records)
+            
+            for store in self._engagement_stores():
+                store.evict(expired, before_remove=archive)
+            if moved:
+                self.changes.record(collection, moved)
+            return len(moved)
+        
+        count = 0
+        for file_path in self._read_paths(collection):
+            with self._transaction(collection, file_path) as txn:
+                old = {record_id: record for record_id, record in txn.data.items()
+                       if expired(record)}
+                if not old:
+                    continue
+                self.archive.append(collection, list(old.values()), timestamp_field)
+                for record_id in old:
+                    del txn.data[record_id]
+                    txn.mark(record_id)
+                count += len(old)
+        return count
+    
+    def anonymize_archived(self, collection: str, before: str) -> int:
+        """Anonymize archived months that ended before `before`; returns records anonymized"""
+        return self.archive.anonymize_before(collection, to_epoch(before))
+    
+    def expire_archived(self, collection: str, before: str) -> int:
+        """Delete archived months that ended before `before` and drop them from course aggregates"""
+        key, _, metric, value_field = ARCHIVED_COLLECTIONS[collection]
+        removed = self.archive.expire_before(collection, to_epoch(before))
+        is_hot = self._hot_ids(collection) if removed else None
+        self._apply_aggregate_deltas(*(
+            self._removed_delta(record, metric, record.get(value_field))
+            for record in removed if not is_hot(record[key])
+        ))
+        return len(removed)
+    
+    def query_archive(self, collection: str, since: Optional[str] = None,
+                      until: Optional[str] = None, **filters) -> List[Dict]:
+        """
+        Get archived records with since <= timestamp < until matching the
+        field filters. Anonymized records no longer match a student_id.
+        """
+        key, timestamp_field, _, _ = ARCHIVED_COLLECTIONS[collection]
+        return self.archive.query(collection, key, timestamp_field, since, until, **filters)
+    
+    # ==================== COURSE SHARDS ====================
+    
+    def _course_of_lecture(self, lecture_id: Optional[str]) -> Optional[str]:
+        """Course a lecture belongs to (None if unknown)"""
+        lecture = self.get_lecture(lecture_id) if lecture_id else None
+        return lecture.get('course_id') if lecture else None
+    
+    def _shard_path(self, collection: str, course_id: Optional[str]) -> str:
+        """File that receives a course's records (the shared file when not sharded)"""
+        if self.shard_by_course and course_id and collection in SHARDED_COLLECTIONS:
+            return os.path.join(self.shards_dir, course_id, f"{collection}.json")
+        return self.storage_paths[collection]
+    
+    def _read_paths(self, collection: str, course_id: Optional[str] = None) -> List[str]:
+        """Files a read has to cover: the shared file, then one course's shard or every shard"""
+        shared = self.storage_paths[collection]
+        if not self.shard_by_course or collection not in SHARDED_COLLECTIONS:
+            return [shared]
+        if course_id:
+            return [shared, self._shard_path(collection, course_id)]
+        return [shared] + shard_files(self.shards_dir, collection)
+    
+    def _fan_out(self, fn: Callable, items: List) -> List:
+        """Apply fn to each item, in parallel on the shard pool when there are several"""
+        items = list(items)
+        if len(items) < 2 or self.shard_workers < 2:
+            return [fn(item) for item in items]
+        return list(_shard_executor(self.shard_workers).map(fn, items))
+    
+    def _read_merged(self, collection: str, course_id: Optional[str] = None) -> Dict:
+        """Read a whole collection (or one course's part of it) across its shards"""
+        return merge_collection_parts(
+            collection, self._fan_out(self._read_json, self._read_paths(collection, course_id)))
+    
+    def _previous_record(self, collection: str, txn: _Transaction,
+                         record_id: str) -> Optional[Dict]:
+        """Record about to be overwritten: from the file being written, else from the shared file"""
+        previous = txn.data.get(record_id)
+        if previous is None and self.shard_by_course:
+            previous = self._read_json(self.storage_paths[collection]).get(record_id)
+        return previous
+    
+    def _engagement_store(self, course_id: Optional[str]) -> EngagementLogStore:
+        """Engagement log receiving a course's sessions"""
+        if not self.shard_by_course or not course_id:
+            return self.engagement_logs
+        with self._course_log_stores_lock:
+            store = self._course_log_stores.get(course_id)
+            if store is None:
+                store = self._course_log_stores[course_id] = EngagementLogStore(
+                    os.path.join(self.shards_dir, course_id, 'engagement_logs'))
+            return store
+    
+    def _engagement_stores(self, course_id: Optional[str] = None) -> List[EngagementLogStore]:
+        """Engagement logs a read has to cover (see _read_paths)"""
+        if not self.shard_by_course:
+            return [self.engagement_logs]
+        if course_id:
+            return [self.engagement_logs, self._engagement_store(course_id)]
+        return [self.engagement_logs] + [
+            self._engagement_store(os.path.basename(os.path.dirname(log_dir)))
+            for log_dir in shard_log_dirs(self.shards_dir)
+        ]
+    
+    def _iter_engagement_logs(self):
+        """Iterate over every engagement session across the shared log and course shards"""
+        stores = self._engagement_stores()
+        if len(stores) == 1:
+            yield from stores[0].iter_all()
+            return
+        sessions = {}
+        for store in stores:
+            for record in store.iter_all():
+                sessions[record['log_id']] = record
+        yield from sessions.values()
+    
+    def reshard_by_course(self) -> Dict[str, int]:
+        """
+        Move records of the sharded collections out of the shared files into
+        their course shards. Records whose course cannot be resolved stay
+        shared; engagement sessions already in the shared log stay there
+        (reads cover it). Returns the number of records moved per collection.
+        """
+        if not self.shard_by_course:
+            raise ValueError("storage.shard_by_course is not enabled")
+        
+        # Each splitter files a shared record's course parts into course_parts
+        # and returns what stays in the shared file (None for nothing)
+        def split_keyed(record_id, record, course_parts):
+            course_id = self._course_of_lecture(record.get('lecture_id')) or record.get('course_id')
+            if not course_id:
+                return record
+            course_parts.setdefault(course_id, {})[record_id] = record
+            return None
+        
+        def split_grades(student_id, student_grades, course_parts):
+            kept = {'quizzes': [], 'assignments': []}
+            for bucket in ('quizzes', 'assignments'):
+                for entry in student_grades.get(bucket, []):
+                    if entry.get('course_id'):
+                        shard = course_parts.setdefault(entry['course_id'], {})
+                        shard_grades = shard.setdefault(student_id,
+                                                        {'quizzes': [], 'assignments': []})
+                        shard_grades[bucket].append(entry)
+                    else:
+                        kept[bucket].append(entry)
+            return kept if kept['quizzes'] or kept['assignments'] else None
+        
+        def split_progress(student_id, courses, course_parts):
+            for course_id, entry in courses.items():
+                course_parts.setdefault(course_id, {}).setdefault(student_id, {})[course_id] = entry
+            return None
+        
+        splitters = {'attendance': split_keyed, 'feedback': split_keyed,
+                     'grades': split_grades, 'progress': split_progress}
+        counts = {}
+        for collection, split in splitters.items():
+            with self._transaction(collection) as shared:
+                course_parts: Dict[str, Dict] = {}
+                for record_id, record in list(shared.data.items()):
+                    kept = split(record_id, record, course_parts)
+                    if kept is record:
+                        continue
+                    if kept is None:
+                        del shared.data[record_id]
+                    else:
+                        shared.data[record_id] = kept
+                    shared.mark(record_id)
+                
+                # Shards are written before the shared file drops the records,
+                # so an interruption leaves duplicates (shards win), never losses
+                for course_id, records in course_parts.items():
+                    shard_path = self._shard_path(collection, course_id)
+                    with self._transaction(collection, shard_path) as shard:
+                        for record_id, record in records.items():
+                            existing = shard.data.get(record_id)
+                            if existing is not None:
+                                # Keep anything written to the shard since sharding began
+                                parts = [{record_id: record}, {record_id: existing}]
+                                record = merge_collection_parts(collection, parts)[record_id]
+                            shard.data[record_id] = record
+                            shard.mark(record_id)
+                counts[collection] = len(shared.changed)
+        
+        counts['course_aggregates'] = self.rebuild_course_aggregates()
+        return counts
     
     # ==================== USER MANAGEMENT ====================
     
@@ -74,58 +1070,92 @@ class StorageService:
         users = self._read_json(self.storage_paths['users'])
         return users.get(user_id)
     
+    def get_user_by_username(self, username: str) -> Optional[Dict]:
+        """Get user by username (served from the username index)"""
+        if not username:
+            return None
+        matches = self._query('users', username=username)
+        user_id, user = next(iter(matches.items()), (None, None))
+        if user is not None and 'user_id' not in user:
+            # Legacy records are keyed by id without storing it
+            user = {**user, 'user_id': user_id}
+        return user
+    
     def get_all_users(self, role: Optional[str] = None) -> Dict:
         """Get all users, optionally filtered by role"""
-        users = self._read_json(self.storage_paths['users'])
         if role:
-            return {uid: u for uid, u in users.items() if u.get('role') == role}
-        return users
+            return self._query('users', role=role)
+        # A new mapping: the cached collection itself is shared by every session
+        return dict(self._read_json(self.storage_paths['users']))
     
     def create_user(self, user_id: str, username: str, password_hash: str, 
                    role: str, email: Optional[str] = None, **kwargs) -> bool:
         """Create new user"""
-        users = self._read_json(self.storage_paths['users'])
-        
-        if user_id in users:
-            return False
-        
-        users[user_id] = {
-            'user_id': user_id,
-            'username': username,
-            'password_hash': password_hash,
-            'role': role,
-            'email': email,
-            'created_at': datetime.utcnow().isoformat(),
-            'last_login': None,
-            'is_active': True,
-            **kwargs
-        }
+        with self._transaction('users') as txn:
+            if user_id in txn.data:
+                return False
+            
+            txn.data[user_id] = {
+                'user_id': user_id,
+                'username': username,
+                'password_hash': password_hash,
+                'role': role,
+                'email': email,
+                'created_at': datetime.utcnow().isoformat(),
+                'last_login': None,
+                'is_active': True,
+                **kwargs
+            }
+            txn.mark(user_id)
         
-        self._write_json(self.storage_paths['users'], users)
         return True
     
+    def create_users_bulk(self, users: List[Dict]) -> int:
+        """Create many users with a single write; returns how many were new"""
+        with self.batch():
+            return sum(1 for user in users if self.create_user(**user))
+    
     def update_user(self, user_id: str, updates: Dict) -> bool:
         """Update user information"""
-        users = self._read_json(self.storage_paths['users'])
-        
-        if user_id not in users:
-            return False
-        
-        users[user_id].update(updates)
-        users[user_id]['updated_at'] = datetime.utcnow().isoformat()
+        with self._transaction('users') as txn:
+            if user_id not in txn.data:
+                return False
+            
+            txn.data[user_id] = {
+                **txn.data[user_id],
+                **updates,
+                'updated_at': datetime.utcnow().isoformat()
+            }
+            txn.mark(user_id)
         
-        self._write_json(self.storage_paths['users'], users)
         return True
     
+    def record_login_attempt(self, user_id: str, success: bool,
+                             max_failed_attempts: int) -> Optional[Dict]:
+        """
+        Apply login bookkeeping in one write: last_login and counter reset on
+        success; failed counter, timestamp and lockout on failure.
+        Returns the updated user, or None if the user doesn't exist.
+        """
+        with self._transaction('users') as txn:
+            user = txn.data.get(user_id)
+            if user is None:
+                return None
+            
+            txn.data[user_id] = apply_login_attempt(user, success, max_failed_attempts)
+            txn.mark(user_id)
+            return txn.data[user_id]
+    
     def delete_user(self, user_id: str) -> bool:
         """Delete user (GDPR compliance)"""
-        users = self._read_json(self.storage_paths['users'])
+        with self._transaction('users') as txn:
+            if user_id not in txn.data:
+                return False
+            
+            del txn.data[user_id]
+            txn.mark(user_id)
         
-        if user_id in users:
-            del users[user_id]
-            self._write_json(self.storage_paths['users'], users)
-            return True
-        return False
+        return True
     
     # ==================== COURSE MANAGEMENT ====================
     
@@ -136,57 +1166,60 @@ class StorageService:
     
     def get_all_courses(self, teacher_id: Optional[str] = None) -> Dict:
         """Get all courses, optionally filtered by teacher"""
-        courses = self._read_json(self.storage_paths['courses'])
         if teacher_id:
-            return {cid: c for cid, c in courses.items() if c.get('teacher_id') == teacher_id}
-        return courses
+            return self._query('courses', teacher_id=teacher_id)
+        return dict(self._read_json(self.storage_paths['courses']))
     
     def create_course(self, course_id: str, name: str, teacher_id: str, 
                      description: str = "", **kwargs) -> bool:
         """Create new course"""
-        courses = self._read_json(self.storage_paths['courses'])
-        
-        if course_id in courses:
-            return False
-        
-        courses[course_id] = {
-            'course_id': course_id,
-            'name': name,
-            'teacher_id': teacher_id,
-            'description': description,
-            'lectures': [],
-            'enrolled_students': [],
-            'created_at': datetime.utcnow().isoformat(),
-            'is_active': True,
-            **kwargs
-        }
+        with self._transaction('courses') as txn:
+            if course_id in txn.data:
+                return False
+            
+            txn.data[course_id] = {
+                'course_id': course_id,
+                'name': name,
+                'teacher_id': teacher_id,
+                'description': description,
+                'lectures': [],
+                'enrolled_students': [],
+                'created_at': datetime.utcnow().isoformat(),
+                'is_active': True,
+                **kwargs
+            }
+            txn.mark(course_id)
         
-        self._write_json(self.storage_paths['courses'], courses)
         return True
     
     def update_course(self, course_id: str, updates: Dict) -> bool:
         """Update course information"""
-        courses = self._read_json(self.storage_paths['courses'])
-        
-        if course_id not in courses:
-            return False
-        
-        courses[course_id].update(updates)
-        courses[course_id]['updated_at'] = datetime.utcnow().isoformat()
+        with self._transaction('courses') as txn:
+            if course_id not in txn.data:
+                return False
+            
+            txn.data[course_id] = {
+                **txn.data[course_id],
+                **updates,
+                'updated_at': datetime.utcnow().isoformat()
+            }
+            txn.mark(course_id)
         
-        self._write_json(self.storage_paths['courses'], courses)
         return True
     
     def enroll_student(self, course_id: str, student_id: str) -> bool:
         """Enroll student in course"""
-        courses = self._read_json(self.storage_paths['courses'])
-        
-        if course_id not in courses:
-            return False
-        
-        if student_id not in courses[course_id]['enrolled_students']:
-            courses[course_id]['enrolled_students'].append(student_id)
-            self._write_json(self.storage_paths['courses'], courses)
+        with self._transaction('courses') as txn:
+            course = txn.data.get(course_id)
+            if course is None:
+                return False
+            
+            if student_id not in course['enrolled_students']:
+                txn.data[course_id] = {
+                    **course,
+                    'enrolled_students': [*course['enrolled_students'], student_id]
+                }
+                txn.mark(course_id)
         
         return True
     
@@ -199,51 +1232,50 @@ class StorageService:
     
     def get_course_lectures(self, course_id: str) -> List[Dict]:
         """Get all lectures for a course"""
-        lectures = self._read_json(self.storage_paths['lectures'])
-        return [l for l in lectures.values() if l.get('course_id') == course_id]
+        return list(self._query('lectures', course_id=course_id).values())
     
     def create_lecture(self, lecture_id: str, title: str, course_id: str,
                       video_path: str, duration: int = 0, **kwargs) -> bool:
         """Create new lecture"""
-        lectures = self._read_json(self.storage_paths['lectures'])
-        
-        if lecture_id in lectures:
-            return False
-        
-        lectures[lecture_id] = {
-            'lecture_id': lecture_id,
-            'title': title,
-            'course_id': course_id,
-            'video_path': video_path,
-            'duration': duration,
-            'materials': [],
-            'created_at': datetime.utcnow().isoformat(),
-            'is_active': True,
-            **kwargs
-        }
-        
-        self._write_json(self.storage_paths['lectures'], lectures)
+        with self._transaction('lectures') as txn:
+            if lecture_id in txn.data:
+                return False
+            
+            txn.data[lecture_id] = {
+                'lecture_id': lecture_id,
+                'title': title,
+                'course_id': course_id,
+                'video_path': video_path,
+                'duration': duration,
+                'materials': [],
+                'created_at': datetime.utcnow().isoformat(),
+                'is_active': True,
+                **kwargs
+            }
+            txn.mark(lecture_id)
         
         # Add lecture to course
-        courses = self._read_json(self.storage_paths['courses'])
-        if course_id in courses:
-            if lecture_id not in courses[course_id]['lectures']:
-                courses[course_id]['lectures'].append(lecture_id)
-                self._write_json(self.storage_paths['courses'], courses)
+        with self._transaction('courses') as txn:
+            course = txn.data.get(course_id)
+            if course is not None and lecture_id not in course['lectures']:
+                txn.data[course_id] = {**course, 'lectures': [*course['lectures'], lecture_id]}
+                txn.mark(course_id)
         
         return True
 
     def update_lecture(self, lecture_id: str, updates: Dict) -> bool:
         """Update lecture information"""
-        lectures = self._read_json(self.storage_paths['lectures'])
+        with self._transaction('lectures') as txn:
+            if lecture_id not in txn.data:
+                return False
 
-        if lecture_id not in lectures:
-            return False
-
-        lectures[lecture_id].update(updates)
-        lectures[lecture_id]['updated_at'] = datetime.utcnow().isoformat()
+            txn.data[lecture_id] = {
+                **txn.data[lecture_id],
+                **updates,
+                'updated_at': datetime.utcnow().isoformat()
+            }
+            txn.mark(lecture_id)
 
-        self._write_json(self.storage_paths['lectures'], lectures)
         return True
     
     # ==================== ENGAGEMENT LOGS ====================
@@ -252,35 +1284,63 @@ class StorageService:
                            session_start: str, events: List[Dict], 
                            engagement_score: float, **kwargs) -> bool:
         """Save engagement log for a lecture session"""
-        logs = self._read_json(self.storage_paths['engagement_logs'])
-        
-        logs[log_id] = {
-            'log_id': log_id,
-            'student_id': student_id,
-            'lecture_id': lecture_id,
-            'session_start': session_start,
-            'session_end': datetime.utcnow().isoformat(),
-            'events': events,
-            'engagement_score': engagement_score,
-            'created_at': datetime.utcnow().isoformat(),
-            **kwargs
-        }
+        course_id = self._course_of_lecture(lecture_id)
+        store = self._engagement_store(course_id)
+        
+        # The aggregates lock also serializes overwrites of the same log_id
+        with _lock_manager.lock(self._shard_path('course_aggregates', course_id)):
+            previous = store.get(log_id)
+            if previous is None and store is not self.engagement_logs:
+                previous = self.engagement_logs.get(log_id)
+            
+            store.append({
+                'log_id': log_id,
+                'student_id': student_id,
+                'lecture_id': lecture_id,
+                'session_start': session_start,
+                'session_end': datetime.utcnow().isoformat(),
+                'events': events,
+                'engagement_score': engagement_score,
+                'created_at': datetime.utcnow().isoformat(),
+                **kwargs
+            })
+            
+            self._apply_aggregate_deltas(
+                self._removed_delta(previous, 'engagement_score',
+                                    previous and previous.get('engagement_score')),
+                (course_id, 'engagement_score', None, engagement_score)
+            )
+        self.changes.record('engagement_logs', [log_id])
         
-        self._write_json(self.storage_paths['engagement_logs'], logs)
         return True
     
     def get_engagement_logs(self, student_id: Optional[str] = None, 
-                           lecture_id: Optional[str] = None) -> List[Dict]:
-        """Get engagement logs filtered by student or lecture"""
-        logs = self._read_json(self.storage_paths['engagement_logs'])
-        
-        filtered = logs.values()
-        if student_id:
-            filtered = [l for l in filtered if l.get('student_id') == student_id]
-        if lecture_id:
-            filtered = [l for l in filtered if l.get('lecture_id') == lecture_id]
-        
-        return list(filtered)
+                           lecture_id: Optional[str] = None,
+                           include_archive: bool = False,
+                           archive_since: Optional[str] = None) -> List[Dict]:
+        """
+        Get engagement logs filtered by student or lecture, optionally with
+        archived sessions timestamped at or after archive_since
+        """
+        course_id = self._course_of_lecture(lecture_id) if self.shard_by_course else None
+        stores = self._engagement_stores(course_id)
+        parts = self._fan_out(
+            lambda store: store.query(student_id=student_id, lecture_id=lecture_id), stores)
+        if len(parts) == 1:
+            sessions = parts[0]
+        else:
+            # Sessions rewritten since sharding began shadow their shared-log copy
+            merged = {record['log_id']: record for record in parts[0]
+                      if not any(record['log_id'] in store for store in stores[1:])}
+            for part in parts[1:]:
+                for record in part:
+                    merged[record['log_id']] = record
+            sessions = list(merged.values())
+        
+        if include_archive:
+            return self._with_archive('engagement_logs', sessions, archive_since,
+                                      student_id=student_id, lecture_id=lecture_id)
+        return sessions
     
     # ==================== FEEDBACK ====================
     
@@ -288,20 +1348,22 @@ class StorageService:
                      text: str, rating: int, sentiment: Optional[Dict] = None, 
                      **kwargs) -> bool:
         """Save student feedback for a lecture (legacy method)"""
-        feedback_data = self._read_json(self.storage_paths['feedback'])
-        
-        feedback_data[feedback_id] = {
-            'feedback_id': feedback_id,
-            'student_id': student_id,
-            'lecture_id': lecture_id,
-            'text': text,
-            'rating': rating,
-            'sentiment': sentiment or {},
-            'created_at': datetime.utcnow().isoformat(),
-            **kwargs
-        }
+        file_path = self._shard_path('feedback', self._course_of_lecture(lecture_id))
+        with self._transaction('feedback', file_path) as txn:
+            previous = self._previous_record('feedback', txn, feedback_id)
+            txn.data[feedback_id] = {
+                'feedback_id': feedback_id,
+                'student_id': student_id,
+                'lecture_id': lecture_id,
+                'text': text,
+                'rating': rating,
+                'sentiment': sentiment or {},
+                'created_at': datetime.utcnow().isoformat(),
+                **kwargs
+            }
+            txn.mark(feedback_id)
+            self._update_feedback_aggregates(previous, txn.data[feedback_id])
         
-        self._write_json(self.storage_paths['feedback'], feedback_data)
         return True
     
     def save_detailed_feedback(self, feedback_id: str, student_id: str, lecture_id: str,
@@ -314,81 +1376,72 @@ class StorageService:
                               sentiment: Dict, keywords: List[str], themes: List[str],
                               combined_text: str, **kwargs) -> bool:
         """Save comprehensive student feedback with NLP analysis"""
-        feedback_data = self._read_json(self.storage_paths['feedback'])
-        
-        feedback_data[feedback_id] = {
-            'feedback_id': feedback_id,
-            'student_id': student_id,
-            'lecture_id': lecture_id,
-            'course_id': course_id,
-            # Rating categories
-            'ratings': {
-                'overall': overall_rating,
-                'content_quality': content_quality,
-                'clarity': clarity_rating,
-                'pace': pace_rating,
-                'engagement': engagement_rating,
-                'visual_aids': visual_aids_rating,
-                'composite_score': composite_score
-            },
-            # Written feedback
-            'written_feedback': {
-                'strengths': strengths,
-                'improvements': improvements,
-                'additional_comments': additional_comments,
-                'combined_text': combined_text
-            },
-            # Metadata
-            'metadata': {
-                'difficulty_level': difficulty_level,
-                'would_recommend': would_recommend,
-                'had_technical_issues': had_technical_issues,
-                'technical_details': technical_details
-            },
-            # NLP Analysis
-            'nlp_analysis': {
-                'sentiment': sentiment,
-                'keywords': keywords,
-                'themes': themes
-            },
-            'created_at': datetime.utcnow().isoformat(),
-            'updated_at': datetime.utcnow().isoformat(),
-            **kwargs
-        }
+        file_path = self._shard_path('feedback', self._course_of_lecture(lecture_id) or course_id)
+        with self._transaction('feedback', file_path) as txn:
+            previous = self._previous_record('feedback', txn, feedback_id)
+            txn.data[feedback_id] = {
+                'feedback_id': feedback_id,
+                'student_id': student_id,
+                'lecture_id': lecture_id,
+                'course_id': course_id,
+                # Rating categories
+                'ratings': {
+                    'overall': overall_rating,
+                    'content_quality': content_quality,
+                    'clarity': clarity_rating,
+                    'pace': pace_rating,
+                    'engagement': engagement_rating,
+                    'visual_aids': visual_aids_rating,
+                    'composite_score': composite_score
+                },
+                # Written feedback
+                'written_feedback': {
+                    'strengths': strengths,
+                    'improvements': improvements,
+                    'additional_comments': additional_comments,
+                    'combined_text': combined_text
+                },
+                # Metadata
+                'metadata': {
+                    'difficulty_level': difficulty_level,
+                    'would_recommend': would_recommend,
+                    'had_technical_issues': had_technical_issues,
+                    'technical_details': technical_details
+                },
+                # NLP Analysis
+                'nlp_analysis': {
+                    'sentiment': sentiment,
+                    'keywords': keywords,
+                    'themes': themes
+                },
+                'created_at': datetime.utcnow().isoformat(),
+                'updated_at': datetime.utcnow().isoformat(),
+                **kwargs
+            }
+            txn.mark(feedback_id)
+            self._update_feedback_aggregates(previous, txn.data[feedback_id])
         
-        self._write_json(self.storage_paths['feedback'], feedback_data)
         return True
     
     def get_feedback(self, lecture_id: Optional[str] = None, 
                     student_id: Optional[str] = None) -> List[Dict]:
         """Get feedback filtered by lecture or student"""
-        feedback_data = self._read_json(self.storage_paths['feedback'])
-        
-        filtered = feedback_data.values()
-        if lecture_id:
-            filtered = [f for f in filtered if f.get('lecture_id') == lecture_id]
-        if student_id:
-            filtered = [f for f in filtered if f.get('student_id') == student_id]
-        
-        return list(filtered)
+        return list(self._query('feedback', lecture_id=lecture_id, student_id=student_id).values())
+    
+    def get_feedback_ids(self, lecture_id: Optional[str] = None,
+                        course_id: Optional[str] = None) -> List[str]:
+        """Get ids of feedback for a lecture and/or course (served from the feedback indexes)"""
+        if not lecture_id and not course_id:
+            return []
+        return list(self._query('feedback', lecture_id=lecture_id, course_id=course_id))
     
     def get_teacher_feedback(self, teacher_id: str) -> List[Dict]:
         """Get all feedback for a teacher's lectures"""
-        feedback_data = self._read_json(self.storage_paths['feedback'])
-        lectures_data = self._read_json(self.storage_paths['lectures'])
-        courses_data = self._read_json(self.storage_paths['courses'])
-        
-        # Get teacher's courses
-        teacher_courses = [cid for cid, c in courses_data.items() 
-                          if c.get('teacher_id') == teacher_id]
-        
-        # Get teacher's lectures
-        teacher_lectures = [lid for lid, l in lectures_data.items() 
-                           if l.get('course_id') in teacher_courses]
-        
-        # Filter feedback for teacher's lectures
-        teacher_feedback = [f for f in feedback_data.values() 
-                           if f.get('lecture_id') in teacher_lectures]
+        # Walk teacher -> courses -> lectures -> feedback through the indexes
+        teacher_feedback = []
+        for course_id in self._query('courses', teacher_id=teacher_id):
+            for lecture_id in self._query('lectures', course_id=course_id):
+                teacher_feedback.extend(self._query('feedback', lecture_id=lecture_id).values())
         
         return teacher_feedback
     
@@ -396,76 +1449,13 @@ class StorageService:
                                   course_id: str, feedback_id: str,
                                   ratings: Dict, sentiment: Dict) -> bool:
         """Update teacher evaluation metrics"""
-        evaluation_data = self._read_json(self.storage_paths['evaluation'])
-        
-        if teacher_id not in evaluation_data:
-            evaluation_data[teacher_id] = {
-                'teacher_id': teacher_id,
-                'total_feedback_count': 0,
-                'average_ratings': {
-                    'overall': 0.0,
-                    'content_quality': 0.0,
-                    'clarity': 0.0,
-                    'pace': 0.0,
-                    'engagement': 0.0,
-                    'visual_aids': 0.0,
-                    'composite': 0.0
-                },
-                'sentiment_distribution': {
-                    'positive': 0,
-                    'neutral': 0,
-                    'negative': 0
-                },
-                'feedback_by_course': {},
-                'feedback_by_lecture': {},
-                'last_updated': datetime.utcnow().isoformat()
-            }
-        
-        teacher_eval = evaluation_data[teacher_id]
-        
-        # Update feedback count
-        teacher_eval['total_feedback_count'] += 1
-        count = teacher_eval['total_feedback_count']
-        
-        # Update average ratings (running average)
-        for key, value in ratings.items():
-            current_avg = teacher_eval['average_ratings'].get(key, 0.0)
-            teacher_eval['average_ratings'][key] = ((current_avg * (count - 1)) + value) / count
-        
-        # Update sentiment distribution
-        sentiment_label = sentiment.get('label', 'neutral')
-        teacher_eval['sentiment_distribution'][sentiment_label] = \
-            teacher_eval['sentiment_distribution'].get(sentiment_label, 0) + 1
-        
-        # Track by course
-        if course_id not in teacher_eval['feedback_by_course']:
-            teacher_eval['feedback_by_course'][course_id] = {
-                'count': 0,
-                'avg_composite': 0.0,
-                'feedback_ids': []
-            }
-        course_eval = teacher_eval['feedback_by_course'][course_id]
-        course_eval['count'] += 1
-        course_eval['feedback_ids'].append(feedback_id)
-        course_eval['avg_composite'] = ((course_eval['avg_composite'] * (course_eval['count'] - 1)) + 
-                                        ratings['composite']) / course_eval['count']
-        
-        # Track by lecture
-        if lecture_id not in teacher_eval['feedback_by_lecture']:
-            teacher_eval['feedback_by_lecture'][lecture_id] = {
-                'count': 0,
-                'avg_composite': 0.0,
-                'feedback_ids': []
-            }
-        lecture_eval = teacher_eval['feedback_by_lecture'][lecture_id]
-        lecture_eval['count'] += 1
-        lecture_eval['feedback_ids'].append(feedback_id)
-        lecture_eval['avg_composite'] = ((lecture_eval['avg_composite'] * (lecture_eval['count'] - 1)) + 
-                                         ratings['composite']) / lecture_eval['count']
-        
-        teacher_eval['last_updated'] = datetime.utcnow().isoformat()
+        with self._transaction('evaluation') as txn:
+            txn.data[teacher_id] = apply_feedback_to_evaluation(
+                copy.deepcopy(txn.data.get(teacher_id)), teacher_id, lecture_id,
+                course_id, feedback_id, ratings, sentiment
+            )
+            txn.mark(teacher_id)
         
-        self._write_json(self.storage_paths['evaluation'], evaluation_data)
         return True
     
     def get_teacher_evaluation(self, teacher_id: str) -> Optional[Dict]:
@@ -480,11 +1470,6 @@ class StorageService:
                   assessment_type: str, assessment_id: str,
                   score: float, max_score: float, **kwargs) -> bool:
         """Save quiz or assignment grade"""
-        grades = self._read_json(self.storage_paths['grades'])
-        
-        if student_id not in grades:
-            grades[student_id] = {'quizzes': [], 'assignments': []}
-        
         grade_entry = {
             'course_id': course_id,
             'assessment_id': assessment_id,
@@ -495,17 +1480,31 @@ class StorageService:
             **kwargs
         }
         
-        if assessment_type == 'quiz':
-            grades[student_id]['quizzes'].append(grade_entry)
-        elif assessment_type == 'assignment':
-            grades[student_id]['assignments'].append(grade_entry)
+        with self._transaction('grades', self._shard_path('grades', course_id)) as txn:
+            student_grades = dict(txn.data.get(student_id) or {'quizzes': [], 'assignments': []})
+            
+            if assessment_type == 'quiz':
+                student_grades['quizzes'] = student_grades['quizzes'] + [grade_entry]
+            elif assessment_type == 'assignment':
+                student_grades['assignments'] = student_grades['assignments'] + [grade_entry]
+            
+            txn.data[student_id] = student_grades
+            txn.mark(student_id)
+            
+            if assessment_type in ('quiz', 'assignment'):
+                self._apply_aggregate_deltas(
+                    (course_id, f"{assessment_type}_percentage", None, grade_entry['percentage']))
         
-        self._write_json(self.storage_paths['grades'], grades)
         return True
     
+    def save_grades_bulk(self, grades: List[Dict]) -> int:
+        """Save many grades (save_grade keyword dicts) with a single write"""
+        with self.batch():
+            return sum(1 for grade in grades if self.save_grade(**grade))
+    
     def get_student_grades(self, student_id: str) -> Dict:
         """Get all grades for a student"""
-        grades = self._read_json(self.storage_paths['grades'])
+        grades = self._read_merged('grades')
         return grades.get(student_id, {'quizzes': [], 'assignments': []})
     
     # ==================== TEACHER EVALUATION ====================
@@ -513,20 +1512,24 @@ class StorageService:
     def save_evaluation(self, teacher_id: str, score: float, features: Dict,
                        shap_values: Optional[Dict] = None, **kwargs) -> bool:
         """Save teacher evaluation results"""
-        evaluations = self._read_json(self.storage_paths['evaluation'])
-        
-        evaluations[teacher_id] = {
-            'teacher_id': teacher_id,
-            'score': score,
-            'features': features,
-            'shap_values': shap_values or {},
-            'evaluated_at': datetime.utcnow().isoformat(),
-            **kwargs
-        }
+        with self._transaction('evaluation') as txn:
+            txn.data[teacher_id] = {
+                'teacher_id': teacher_id,
+                'score': score,
+                'features': features,
+                'shap_values': shap_values or {},
+                'evaluated_at': datetime.utcnow().isoformat(),
+                **kwargs
+            }
+            txn.mark(teacher_id)
         
-        self._write_json(self.storage_paths['evaluation'], evaluations)
         return True
     
+    def save_evaluations_bulk(self, evaluations: List[Dict]) -> int:
+        """Save many evaluation results (save_evaluation keyword dicts) with a single write"""
+        with self.batch():
+            return sum(1 for evaluation in evaluations if self.save_evaluation(**evaluation))
+    
     def get_evaluation(self, teacher_id: str) -> Optional[Dict]:
         """Get teacher evaluation"""
         evaluations = self._read_json(self.storage_paths['evaluation'])
@@ -534,7 +1537,7 @@ class StorageService:
     
     def get_all_evaluations(self) -> Dict:
         """Get all teacher evaluations"""
-        return self._read_json(self.storage_paths['evaluation'])
+        return dict(self._read_json(self.storage_paths['evaluation']))
     
     # ==================== ATTENDANCE ====================
     
@@ -542,72 +1545,169 @@ class StorageService:
                        presence_percentage: float, detection_logs: List[Dict],
                        **kwargs) -> bool:
         """Save attendance record"""
-        attendance = self._read_json(self.storage_paths['attendance'])
-        
-        attendance[attendance_id] = {
-            'attendance_id': attendance_id,
-            'student_id': student_id,
-            'lecture_id': lecture_id,
-            'presence_percentage': presence_percentage,
-            'status': 'present' if presence_percentage >= 75 else 'absent',
-            'detection_logs': detection_logs,
-            'recorded_at': datetime.utcnow().isoformat(),
-            **kwargs
-        }
+        course_id = self._course_of_lecture(lecture_id)
+        with self._transaction('attendance', self._shard_path('attendance', course_id)) as txn:
+            previous = self._previous_record('attendance', txn, attendance_id)
+            txn.data[attendance_id] = {
+                'attendance_id': attendance_id,
+                'student_id': student_id,
+                'lecture_id': lecture_id,
+                'presence_percentage': presence_percentage,
+                'status': 'present' if presence_percentage >= 75 else 'absent',
+                'detection_logs': detection_logs,
+                'recorded_at': datetime.utcnow().isoformat(),
+                **kwargs
+            }
+            txn.mark(attendance_id)
+            
+            self._apply_aggregate_deltas(
+                self._removed_delta(previous, 'attendance_percentage',
+                                    previous and previous.get('presence_percentage')),
+                (course_id, 'attendance_percentage', None, presence_percentage)
+            )
         
-        self._write_json(self.storage_paths['attendance'], attendance)
         return True
     
     def get_attendance(self, student_id: Optional[str] = None,
-                      lecture_id: Optional[str] = None) -> List[Dict]:
-        """Get attendance records"""
-        attendance = self._read_json(self.storage_paths['attendance'])
-        
-        filtered = attendance.values()
-        if student_id:
-            filtered = [a for a in filtered if a.get('student_id') == student_id]
-        if lecture_id:
-            filtered = [a for a in filtered if a.get('lecture_id') == lecture_id]
-        
-        return list(filtered)
+                      lecture_id: Optional[str] = None,
+                      include_archive: bool = False,
+                      archive_since: Optional[str] = None) -> List[Dict]:
+        """Get attendance records (optionally with archived ones recorded since archive_since)"""
+        records = list(self._query('attendance', student_id=student_id,
+                                   lecture_id=lecture_id).values())
+        if include_archive:
+            return self._with_archive('attendance', records, archive_since,
+                                      student_id=student_id, lecture_id=lecture_id)
+        return records
+    
+    # ==================== COURSE AGGREGATES ====================
+    # Lock order: the record's own collection first, course_aggregates last
+    
+    def _removed_delta(self, previous: Optional[Dict], metric: str,
+                       value: Optional[float]) -> tuple:
+        """Delta taking an overwritten record's value back out of its course"""
+        if previous is None:
+            return (None, metric, None, None)
+        return (self._course_of_lecture(previous.get('lecture_id')), metric, value, None)
+    
+    def _apply_aggregate_deltas(self, *deltas: tuple):
+        """
+        Apply (course_id, metric, removed, added) value changes, with one
+        course_aggregates transaction per file they land in
+        """
+        by_path: Dict[str, List[tuple]] = {}
+        for course_id, metric, removed, added in deltas:
+            if course_id and (removed is not None or added is not None):
+                by_path.setdefault(self._shard_path('course_aggregates', course_id), []).append(
+                    (course_id, metric, removed, added))
+        
+        for file_path, changes in sorted(by_path.items()):
+            with self._transaction('course_aggregates', file_path) as txn:
+                for course_id, metric, removed, added in changes:
+                    txn.data[course_id] = apply_aggregate_delta(txn.data.get(course_id), course_id,
+                                                                metric, removed, added)
+                    txn.mark(course_id)
+    
+    def _update_feedback_aggregates(self, previous: Optional[Dict], feedback: Dict):
+        """Swap an overwritten feedback record's rating for the new one"""
+        self._apply_aggregate_deltas(
+            self._removed_delta(previous, 'feedback_rating',
+                                previous and feedback_rating(previous)),
+            (self._course_of_lecture(feedback.get('lecture_id')), 'feedback_rating', None,
+             feedback_rating(feedback))
+        )
+    
+    def get_course_aggregates(self, course_id: str) -> Dict:
+        """Get running sums/counts for a course"""
+        aggregates = self._read_json(self._shard_path('course_aggregates', course_id))
+        return aggregates.get(course_id) or empty_course_aggregate(course_id)
+    
+    def get_teacher_aggregates(self, teacher_id: str) -> Optional[Dict]:
+        """Get a teacher's aggregates folded over their courses (None if no courses)"""
+        courses = self.get_all_courses(teacher_id=teacher_id)
+        if not courses:
+            return None
+        aggregates = {course_id: self.get_course_aggregates(course_id) for course_id in courses}
+        summary = fold_course_aggregates(courses, aggregates)
+        summary['teacher_id'] = teacher_id
+        return summary
+    
+    def rebuild_course_aggregates(self) -> int:
+        """Recompute all course aggregates from the stored records; returns course count"""
+        lectures = self._read_json(self.storage_paths['lectures'])
+        lecture_courses = {lid: lecture.get('course_id') for lid, lecture in lectures.items()}
+        
+        def iter_grades():
+            for student_grades in self._read_merged('grades').values():
+                for bucket, assessment_type in (('quizzes', 'quiz'), ('assignments', 'assignment')):
+                    for entry in student_grades.get(bucket, []):
+                        yield assessment_type, entry
+        
+        file_path = self.storage_paths['course_aggregates']
+        with _lock_manager.lock(file_path):
+            # Archived records still count until they expire
+            aggregates = build_course_aggregates(
+                lecture_courses,
+                chain(self._iter_engagement_logs(), self._archived_only('engagement_logs')),
+                self._read_merged('feedback').values(),
+                iter_grades(),
+                chain(self._read_merged('attendance').values(), self._archived_only('attendance'))
+            )
+            if not self.shard_by_course:
+                self._write_json(file_path, aggregates)
+            else:
+                shard_paths = {
+                    self._shard_path('course_aggregates', course_id): {course_id: aggregate}
+                    for course_id, aggregate in aggregates.items()
+                }
+                for shard_path in shard_files(self.shards_dir, 'course_aggregates'):
+                    shard_paths.setdefault(shard_path, {})  # Course no longer has any records
+                for shard_path, shard in shard_paths.items():
+                    with _lock_manager.lock(shard_path):
+                        self._write_json(shard_path, shard)
+                self._write_json(file_path, {})
+            self.changes.record('course_aggregates', None)
+        
+        return len(aggregates)
     
     # ==================== TEACHER ACTIVITY ====================
     
     def log_teacher_activity(self, activity_id: str, teacher_id: str,
                             action: str, details: Dict, **kwargs) -> bool:
         """Log teacher activity"""
-        activities = self._read_json(self.storage_paths['teacher_activity'])
-        
-        if teacher_id not in activities:
-            activities[teacher_id] = []
-        
-        activities[teacher_id].append({
+        self.teacher_activity.append(teacher_id, {
             'activity_id': activity_id,
             'action': action,
             'details': details,
             'timestamp': datetime.utcnow().isoformat(),
             **kwargs
         })
+        self.changes.record('teacher_activity', [teacher_id])
         
-        self._write_json(self.storage_paths['teacher_activity'], activities)
         return True
     
     def get_teacher_activity(self, teacher_id: str, 
-                            days: Optional[int] = None) -> List[Dict]:
-        """Get teacher activity logs"""
-        activities = self._read_json(self.storage_paths['teacher_activity'])
-        teacher_logs = activities.get(teacher_id, [])
-        
-        if days:
-            # Filter by date range
-            from datetime import timedelta
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
-            teacher_logs = [
-                log for log in teacher_logs
-                if datetime.fromisoformat(log['timestamp']) >= cutoff_date
-            ]
-        
-        return teacher_logs
+                            days: Optional[int] = None,
+                            since: Optional[datetime] = None,
+                            until: Optional[datetime] = None) -> List[Dict]:
+        """
+        Get teacher activity logs, oldest first.
+        
+        Args:
+            teacher_id: Teacher ID
+            days: Only the last N days (ignored when since is given)
+            since: Inclusive start (naive UTC)
+            until: Exclusive end (naive UTC)
+        """
+        if since is not None:
+            since_ts = to_epoch(since.isoformat())
+        elif days:
+            since_ts = time.time() - days * 86400
+        else:
+            since_ts = None
+        until_ts = to_epoch(until.isoformat()) if until is not None else None
+        
+        return self.teacher_activity.query(teacher_id, since=since_ts, until=until_ts)
     
     # ==================== PROGRESS TRACKING ====================
     
@@ -615,26 +1715,26 @@ class StorageService:
                      completed_lectures: List[str], quiz_scores: List[float],
                      engagement_trend: List[float], **kwargs) -> bool:
         """Save student progress"""
-        progress = self._read_json(self.storage_paths['progress'])
-        
-        if student_id not in progress:
-            progress[student_id] = {}
-        
-        progress[student_id][course_id] = {
-            'completed_lectures': completed_lectures,
-            'quiz_scores': quiz_scores,
-            'engagement_trend': engagement_trend,
-            'completion_percentage': len(completed_lectures) / kwargs.get('total_lectures', 1) * 100,
-            'updated_at': datetime.utcnow().isoformat(),
-            **kwargs
-        }
+        with self._transaction('progress', self._shard_path('progress', course_id)) as txn:
+            txn.data[student_id] = {
+                **txn.data.get(student_id, {}),
+                course_id: {
+                    'completed_lectures': completed_lectures,
+                    'quiz_scores': quiz_scores,
+                    'engagement_trend': engagement_trend,
+                    'completion_percentage': (len(completed_lectures)
+                                              / kwargs.get('total_lectures', 1) * 100),
+                    'updated_at': datetime.utcnow().isoformat(),
+                    **kwargs
+                }
+            }
+            txn.mark(student_id)
         
-        self._write_json(self.storage_paths['progress'], progress)
         return True
     
     def get_progress(self, student_id: str, course_id: Optional[str] = None) -> Dict:
         """Get student progress"""
-        progress = self._read_json(self.storage_paths['progress'])
+        progress = self._read_merged('progress', course_id)
         student_progress = progress.get(student_id, {})
         
         if course_id:
@@ -644,69 +1744,77 @@ class StorageService:
     # Enrollment Request Methods
     def create_enrollment_request(self, request_id: str, student_id: str, course_id: str, **kwargs) -> bool:
         """Create an enrollment request"""
-        requests = self._read_json(self.storage_paths.get('enrollment_requests', './storage/enrollment_requests.json'))
-        
-        requests[request_id] = {
-            'request_id': request_id,
-            'student_id': student_id,
-            'course_id': course_id,
-            'status': 'pending',  # pending, approved, rejected
-            'requested_at': datetime.utcnow().isoformat(),
-            'processed_at': None,
-            'processed_by': None,
-            **kwargs
-        }
+        with self._transaction('enrollment_requests') as txn:
+            txn.data[request_id] = {
+                'request_id': request_id,
+                'student_id': student_id,
+                'course_id': course_id,
+                'status': 'pending',  # pending, approved, rejected
+                'requested_at': datetime.utcnow().isoformat(),
+                'processed_at': None,
+                'processed_by': None,
+                **kwargs
+            }
+            txn.mark(request_id)
         
-        self._write_json(self.storage_paths.get('enrollment_requests', './storage/enrollment_requests.json'), requests)
         return True
     
     def get_enrollment_requests(self, course_id: Optional[str] = None, student_id: Optional[str] = None, 
                                 status: Optional[str] = None) -> Dict:
         """Get enrollment requests with optional filters"""
-        requests = self._read_json(self.storage_paths.get('enrollment_requests', './storage/enrollment_requests.json'))
-        
-        filtered_requests = requests
-        
-        if course_id:
-            filtered_requests = {rid: r for rid, r in filtered_requests.items() if r.get('course_id') == course_id}
-        
-        if student_id:
-            filtered_requests = {rid: r for rid, r in filtered_requests.items() if r.get('student_id') == student_id}
-        
-        if status:
-            filtered_requests = {rid: r for rid, r in filtered_requests.items() if r.get('status') == status}
-        
-        return filtered_requests
+        return self._query('enrollment_requests', course_id=course_id,
+                           student_id=student_id, status=status)
     
     def update_enrollment_request(self, request_id: str, status: str, processed_by: str) -> bool:
         """Update enrollment request status"""
-        requests = self._read_json(self.storage_paths.get('enrollment_requests', './storage/enrollment_requests.json'))
-        
-        if request_id not in requests:
-            return False
-        
-        requests[request_id]['status'] = status
-        requests[request_id]['processed_at'] = datetime.utcnow().isoformat()
-        requests[request_id]['processed_by'] = processed_by
-        
-        # If approved, add student to course
-        if status == 'approved':
-            course_id = requests[request_id]['course_id']
-            student_id = requests[request_id]['student_id']
+        # Lock order: enrollment_requests, then courses
+        with self._transaction('enrollment_requests') as txn:
+            request = txn.data.get(request_id)
+            if request is None:
+                return False
+            
+            txn.data[request_id] = {
+                **request,
+                'status': status,
+                'processed_at': datetime.utcnow().isoformat(),
+                'processed_by': processed_by
+            }
+            txn.mark(request_id)
             
-            courses = self._read_json(self.storage_paths['courses'])
-            if course_id in courses:
-                enrolled_students = courses[course_id].get('enrolled_students', [])
-                if student_id not in enrolled_students:
-                    enrolled_students.append(student_id)
-                    courses[course_id]['enrolled_students'] = enrolled_students
-                    courses[course_id]['updated_at'] = datetime.utcnow().isoformat()
-                    self._write_json(self.storage_paths['courses'], courses)
-        
-        self._write_json(self.storage_paths.get('enrollment_requests', './storage/enrollment_requests.json'), requests)
+            # If approved, add student to course
+            if status == 'approved':
+                course_id = request['course_id']
+                student_id = request['student_id']
+                
+                with self._transaction('courses') as courses_txn:
+                    course = courses_txn.data.get(course_id)
+                    if course is not None:
+                        enrolled_students = course.get('enrolled_students', [])
+                        if student_id not in enrolled_students:
+                            courses_txn.data[course_id] = {
+                                **course,
+                                'enrolled_students': [*enrolled_students, student_id],
+                                'updated_at': datetime.utcnow().isoformat()
+                            }
+                            courses_txn.mark(course_id)
+        
         return True
 
 
+def create_storage_service(config_path: str = "config.yaml") -> StorageService:
+    """
+    Build the storage backend selected in config.yaml.
+    `database.enabled: true` with `database.type: sqlite` selects SqliteStorageService;
+    anything else falls back to the JSON StorageService.
+    """
+    db_config = get_config(config_path).get('database') or {}
+    if db_config.get('enabled') and db_config.get('type') == 'sqlite':
+        from services.storage_sqlite import SqliteStorageService
+        return SqliteStorageService(config_path)
+    
+    return StorageService(config_path)
+
+
 # Singleton instance
 _storage_instance = None
 
@@ -714,5 +1822,5 @@ def get_storage() -> StorageService:
     """Get storage service singleton"""
     global _storage_instance
     if _storage_instance is None:
-        _storage_instance = StorageService()
+        _storage_instance = create_storage_service()
     return _storage_instance
@@ -0,0 +1,1068 @@
+"""
+Smart LMS - SQLite Storage Service
+Drop-in replacement for the JSON StorageService backed by indexed SQLite tables
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Dict, List, Optional, Any
+from pathlib import Path
+
+from services.config import get_config
+from services.storage import (
+    apply_feedback_to_evaluation, apply_aggregate_delta, apply_login_attempt,
+    build_course_aggregates, empty_course_aggregate, feedback_rating, fold_course_aggregates,
+    merge_collection_parts, shard_files, shard_log_dirs, SHARDED_COLLECTIONS, ARCHIVED_COLLECTIONS
+)
+from services.engagement_log_store import EngagementLogStore
+from services.teacher_activity_store import TeacherActivityStore, to_epoch
+from services.archive_store import ArchiveStore
+from services.records import encode_record
+from services.change_feed import ChangeFeed, ChangeSubscription
+
+
+# Keyed collections: table -> (primary key, indexed columns).
+# Every row keeps the full record as JSON in `data`; the extra columns
+# mirror record fields so filtered getters can use indexes.
+KEYED_TABLES = {
+    'users': ('user_id', ['username', 'role']),
+    'courses': ('course_id', ['teacher_id']),
+    'lectures': ('lecture_id', ['course_id']),
+    'engagement_logs': ('log_id', ['student_id', 'lecture_id']),
+    'feedback': ('feedback_id', ['student_id', 'lecture_id', 'course_id']),
+    'evaluation': ('teacher_id', []),
+    'attendance': ('attendance_id', ['student_id', 'lecture_id', 'status']),
+    'enrollment_requests': ('request_id', ['student_id', 'course_id', 'status']),
+    'course_aggregates': ('course_id', []),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS grades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    course_id TEXT,
+    assessment_type TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_grades_student_id ON grades (student_id);
+CREATE INDEX IF NOT EXISTS idx_grades_course_id ON grades (course_id);
+
+CREATE TABLE IF NOT EXISTS teacher_activity (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    teacher_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_teacher_activity_teacher_ts
+    ON teacher_activity (teacher_id, timestamp);
+
+CREATE TABLE IF NOT EXISTS progress (
+    student_id TEXT NOT NULL,
+    course_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (student_id, course_id)
+);
+"""
+
+
+def _keyed_table_schema(table: str) -> str:
+    """Build CREATE statements for a keyed collection table"""
+    key, columns = KEYED_TABLES[table]
+    column_defs = ''.join(f", {col} TEXT" for col in columns)
+    statements = [f"CREATE TABLE IF NOT EXISTS {table} "
+                  f"({key} TEXT PRIMARY KEY{column_defs}, data TEXT NOT NULL);"]
+    for col in columns:
+        statements.append(f"CREATE INDEX IF NOT EXISTS idx_{table}_{col} ON {table} ({col});")
+    return '\n'.join(statements)
+
+
+class SqliteStorageService:
+    """
+    SQLite implementation of the StorageService interface.
+    Writes touch a single row and filtered getters use column indexes.
+    """
+
+    def __init__(self, config_path: str = "config.yaml"):
+        """Initialize SQLite storage with configuration"""
+        self.config = get_config(config_path)
+
+        self.storage_paths = dict(self.config['storage'])
+        db_config = self.config.get('database') or {}
+        self.db_path = (db_config.get('path')
+                        or os.path.join(self.storage_paths['base_path'], 'smart_lms.db'))
+
+        self._local = threading.local()
+        self._ensure_schema()
+
+        # Change feed entries are published when the writing transaction commits
+        self.changes = ChangeFeed(self.storage_paths.get(
+            'changes_dir', f"{self.storage_paths['base_path']}/changes"))
+
+        # Records past the hot window, compressed and read-only
+        self.archive = ArchiveStore(self.storage_paths.get(
+            'archive_dir', f"{self.storage_paths['base_path']}/archive"))
+
+    # ==================== CONNECTION HANDLING ====================
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the calling thread's connection (sqlite3 objects are not thread-safe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            Path(os.path.dirname(os.path.abspath(self.db_path))).mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=OFF")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Serialize a read-modify-write against other writers (nested calls use savepoints)"""
+        conn = self._connection()
+        depth = getattr(self._local, 'depth', 0)
+        if depth:
+            savepoint = f"sp_{depth}"
+            conn.execute(f"SAVEPOINT {savepoint}")
+            self._local.depth = depth + 1
+            pending = len(self._local.pending_changes)
+            try:
+                yield conn
+            except Exception:
+                conn.execute(f"ROLLBACK TO {savepoint}")
+                conn.execute(f"RELEASE {savepoint}")
+                del self._local.pending_changes[pending:]
+                raise
+            else:
+                conn.execute(f"RELEASE {savepoint}")
+            finally:
+                self._local.depth = depth
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        self._local.pending_changes = []
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+            self._publish_changes(self._local.pending_changes)
+        finally:
+            self._local.depth = 0
+            self._local.pending_changes = []
+
+    def _changed(self, collection: str, ids: Optional[List[str]]):
+        """Record changed ids (None: whole collection) once the current write commits"""
+        if getattr(self._local, 'depth', 0):
+            self._local.pending_changes.append((collection, ids))
+        else:
+            self.changes.record(collection, ids)
+
+    def _publish_changes(self, pending: List[tuple]):
+        """Publish a committed transaction's changes: one version per collection"""
+        grouped: Dict[str, Optional[Dict]] = {}
+        for collection, ids in pending:
+            if ids is None:
+                grouped[collection] = None
+            elif grouped.setdefault(collection, {}) is not None:
+                grouped[collection].update(dict.fromkeys(ids))
+        for collection, ids in grouped.items():
+            self.changes.record(collection, None if ids is None else list(ids))
+
+    @contextmanager
+    def batch(self):
+        """Run many mutations in one database transaction (see StorageService.batch)"""
+        with self._transaction():
+            yield self
+
+    def _ensure_schema(self):
+        """Create tables and indexes if they don't exist"""
+        conn = self._connection()
+        script = SCHEMA + '\n'.join(_keyed_table_schema(t) for t in KEYED_TABLES)
+        conn.executescript(script)
+
+    # ==================== ROW HELPERS ====================
+
+    @staticmethod
+    def _dumps(record: Dict) -> str:
+        return json.dumps(record, ensure_ascii=False, default=encode_record)
+
+    def _get(self, table: str, key_value: str,
+             conn: Optional[sqlite3.Connection] = None) -> Optional[Dict]:
+        """Fetch one record by primary key"""
+        key, _ = KEYED_TABLES[table]
+        conn = conn or self._connection()
+        row = conn.execute(f"SELECT data FROM {table} WHERE {key} = ?", (key_value,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, table: str, record: Dict, conn: Optional[sqlite3.Connection] = None):
+        """Insert or replace one record, keeping its original row position"""
+        key, columns = KEYED_TABLES[table]
+        conn = conn or self._connection()
+        names = [key] + columns + ['data']
+        values = [record.get(key)] + [record.get(col) for col in columns] + [self._dumps(record)]
+        updates = ', '.join(f"{name} = excluded.{name}" for name in names[1:])
+        conn.execute(
+            f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+            f"ON CONFLICT({key}) DO UPDATE SET {updates}",
+            values
+        )
+        self._changed(table, [record.get(key)])
+
+    def _insert_new(self, table: str, record: Dict) -> bool:
+        """Insert a record only if its key is free"""
+        key, columns = KEYED_TABLES[table]
+        names = [key] + columns + ['data']
+        values = [record.get(key)] + [record.get(col) for col in columns] + [self._dumps(record)]
+        cursor = self._connection().execute(
+            f"INSERT OR IGNORE INTO {table} ({', '.join(names)}) "
+            f"VALUES ({', '.join('?' * len(names))})",
+            values
+        )
+        if cursor.rowcount != 1:
+            return False
+        self._changed(table, [record.get(key)])
+        return True
+
+    def _select(self, table: str, **filters) -> List[Dict]:
+        """Fetch records matching indexed column filters, in insertion order"""
+        clauses = [f"{col} = ?" for col, value in filters.items() if value]
+        params = [value for value in filters.values() if value]
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connection().execute(f"SELECT data FROM {table}{where} ORDER BY rowid", params)
+        return [json.loads(row[0]) for row in rows]
+
+    def _select_keyed(self, table: str, **filters) -> Dict:
+        """Like _select but returns {primary_key: record}"""
+        key, _ = KEYED_TABLES[table]
+        return {record[key]: record for record in self._select(table, **filters)}
+
+    def _update(self, table: str, key_value: str, updates: Dict, stamp: bool = True) -> bool:
+        """Merge updates into an existing record atomically"""
+        with self._transaction() as conn:
+            record = self._get(table, key_value, conn)
+            if record is None:
+                return False
+            record.update(updates)
+            if stamp:
+                record['updated_at'] = datetime.utcnow().isoformat()
+            self._put(table, record, conn)
+        return True
+
+    # ==================== USER MANAGEMENT ====================
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        """Get user by ID"""
+        return self._get('users', user_id)
+
+    def get_user_by_username(self, username: str) -> Optional[Dict]:
+        """Get user by username (served from the username index)"""
+        if not username:
+            return None
+        row = self._connection().execute(
+            "SELECT user_id, data FROM users WHERE username = ? ORDER BY rowid LIMIT 1", (username,)
+        ).fetchone()
+        if not row:
+            return None
+        user = json.loads(row[1])
+        user.setdefault('user_id', row[0])  # Legacy records imported without it
+        return user
+
+    def get_all_users(self, role: Optional[str] = None) -> Dict:
+        """Get all users, optionally filtered by role"""
+        return self._select_keyed('users', role=role)
+
+    def create_user(self, user_id: str, username: str, password_hash: str,
+                   role: str, email: Optional[str] = None, **kwargs) -> bool:
+        """Create new user"""
+        return self._insert_new('users', {
+            'user_id': user_id,
+            'username': username,
+            'password_hash': password_hash,
+            'role': role,
+            'email': email,
+            'created_at': datetime.utcnow().isoformat(),
+            'last_login': None,
+            'is_active': True,
+            **kwargs
+        })
+
+    def create_users_bulk(self, users: List[Dict]) -> int:
+        """Create many users in one transaction; returns how many were new"""
+        with self.batch():
+            return sum(1 for user in users if self.create_user(**user))
+
+    def update_user(self, user_id: str, updates: Dict) -> bool:
+        """Update user information"""
+        return self._update('users', user_id, updates)
+
+    def record_login_attempt(self, user_id: str, success: bool,
+                             max_failed_attempts: int) -> Optional[Dict]:
+        """Apply login bookkeeping (see StorageService.record_login_attempt) in one write"""
+        with self._transaction() as conn:
+            user = self._get('users', user_id, conn)
+            if user is None:
+                return None
+            user = apply_login_attempt(user, success, max_failed_attempts)
+            self._put('users', user, conn)
+        return user
+
+    def delete_user(self, user_id: str) -> bool:
+        """Delete user (GDPR compliance)"""
+        cursor = self._connection().execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+        if cursor.rowcount == 0:
+            return False
+        self._changed('users', [user_id])
+        return True
+
+    # ==================== COURSE MANAGEMENT ====================
+
+    def get_course(self, course_id: str) -> Optional[Dict]:
+        """Get course by ID"""
+        return self._get('courses', course_id)
+
+    def get_all_courses(self, teacher_id: Optional[str] = None) -> Dict:
+        """Get all courses, optionally filtered by teacher"""
+        return self._select_keyed('courses', teacher_id=teacher_id)
+
+    def create_course(self, course_id: str, name: str, teacher_id: str,
+                     description: str = "", **kwargs) -> bool:
+        """Create new course"""
+        return self._insert_new('courses', {
+            'course_id': course_id,
+            'name': name,
+            'teacher_id': teacher_id,
+            'description': description,
+            'lectures': [],
+            'enrolled_students': [],
+            'created_at': datetime.utcnow().isoformat(),
+            'is_active': True,
+            **kwargs
+        })
+
+    def update_course(self, course_id: str, updates: Dict) -> bool:
+        """Update course information"""
+        return self._update('courses', course_id, updates)
+
+    def enroll_student(self, course_id: str, student_id: str) -> bool:
+        """Enroll student in course"""
+        with self._transaction() as conn:
+            course = self._get('courses', course_id, conn)
+            if course is None:
+                return False
+            if student_id not in course['enrolled_students']:
+                course['enrolled_students'].append(student_id)
+                self._put('courses', course, conn)
+        return True
+
+    # ==================== LECTURE MANAGEMENT ====================
+
+    def get_lecture(self, lecture_id: str) -> Optional[Dict]:
+        """Get lecture by ID"""
+        return self._get('lectures', lecture_id)
+
+    def get_course_lectures(self, course_id: str) -> List[Dict]:
+        """Get all lectures for a course"""
+        return self._select('lectures', course_id=course_id)
+
+    def create_lecture(self, lecture_id: str, title: str, course_id: str,
+                      video_path: str, duration: int = 0, **kwargs) -> bool:
+        """Create new lecture"""
+        with self._transaction() as conn:
+            if self._get('lectures', lecture_id, conn) is not None:
+                return False
+
+            self._put('lectures', {
+                'lecture_id': lecture_id,
+                'title': title,
+                'course_id': course_id,
+                'video_path': video_path,
+                'duration': duration,
+                'materials': [],
+                'created_at': datetime.utcnow().isoformat(),
+                'is_active': True,
+                **kwargs
+            }, conn)
+
+            # Add lecture to course
+            course = self._get('courses', course_id, conn)
+            if course is not None and lecture_id not in course['lectures']:
+                course['lectures'].append(lecture_id)
+                self._put('courses', course, conn)
+
+        return True
+
+    def update_lecture(self, lecture_id: str, updates: Dict) -> bool:
+        """Update lecture information"""
+        return self._update('lectures', lecture_id, updates)
+
+    # ==================== ENGAGEMENT LOGS ====================
+
+    def save_engagement_log(self, log_id: str, student_id: str, lecture_id: str,
+                           session_start: str, events: List[Dict],
+                           engagement_score: float, **kwargs) -> bool:
+        """Save engagement log for a lecture session"""
+        with self._transaction() as conn:
+            previous = self._get('engagement_logs', log_id, conn)
+            self._put('engagement_logs', {
+                'log_id': log_id,
+                'student_id': student_id,
+                'lecture_id': lecture_id,
+                'session_start': session_start,
+                'session_end': datetime.utcnow().isoformat(),
+                'events': events,
+                'engagement_score': engagement_score,
+                'created_at': datetime.utcnow().isoformat(),
+                **kwargs
+            }, conn)
+            if previous is not None:
+                self._apply_aggregate_delta(conn, previous.get('lecture_id'), 'engagement_score',
+                                            removed=previous.get('engagement_score'))
+            self._apply_aggregate_delta(conn, lecture_id, 'engagement_score',
+                                        added=engagement_score)
+        return True
+
+    def get_engagement_logs(self, student_id: Optional[str] = None,
+                           lecture_id: Optional[str] = None,
+                           include_archive: bool = False,
+                           archive_since: Optional[str] = None) -> List[Dict]:
+        """
+        Get engagement logs filtered by student or lecture, optionally with
+        archived sessions timestamped at or after archive_since
+        """
+        sessions = self._select('engagement_logs', student_id=student_id, lecture_id=lecture_id)
+        if include_archive:
+            return self._with_archive('engagement_logs', sessions, archive_since,
+                                      student_id=student_id, lecture_id=lecture_id)
+        return sessions
+
+    # ==================== FEEDBACK ====================
+
+    def save_feedback(self, feedback_id: str, student_id: str, lecture_id: str,
+                     text: str, rating: int, sentiment: Optional[Dict] = None,
+                     **kwargs) -> bool:
+        """Save student feedback for a lecture (legacy method)"""
+        self._save_feedback_record({
+            'feedback_id': feedback_id,
+            'student_id': student_id,
+            'lecture_id': lecture_id,
+            'text': text,
+            'rating': rating,
+            'sentiment': sentiment or {},
+            'created_at': datetime.utcnow().isoformat(),
+            **kwargs
+        })
+        return True
+
+    def save_detailed_feedback(self, feedback_id: str, student_id: str, lecture_id: str,
+                              course_id: str, overall_rating: int, content_quality: int,
+                              clarity_rating: int, pace_rating: int, engagement_rating: int,
+                              visual_aids_rating: int, composite_score: float,
+                              strengths: str, improvements: str, additional_comments: str,
+                              difficulty_level: str, would_recommend: bool,
+                              had_technical_issues: bool, technical_details: str,
+                              sentiment: Dict, keywords: List[str], themes: List[str],
+                              combined_text: str, **kwargs) -> bool:
+        """Save comprehensive student feedback with NLP analysis"""
+        self._save_feedback_record({
+            'feedback_id': feedback_id,
+            'student_id': student_id,
+            'lecture_id': lecture_id,
+            'course_id': course_id,
+            'ratings': {
+                'overall': overall_rating,
+                'content_quality': content_quality,
+                'clarity': clarity_rating,
+                'pace': pace_rating,
+                'engagement': engagement_rating,
+                'visual_aids': visual_aids_rating,
+                'composite_score': composite_score
+            },
+            'written_feedback': {
+                'strengths': strengths,
+                'improvements': improvements,
+                'additional_comments': additional_comments,
+                'combined_text': combined_text
+            },
+            'metadata': {
+                'difficulty_level': difficulty_level,
+                'would_recommend': would_recommend,
+                'had_technical_issues': had_technical_issues,
+                'technical_details': technical_details
+            },
+            'nlp_analysis': {
+                'sentiment': sentiment,
+                'keywords': keywords,
+                'themes': themes
+            },
+            'created_at': datetime.utcnow().isoformat(),
+            'updated_at': datetime.utcnow().isoformat(),
+            **kwargs
+        })
+        return True
+
+    def _save_feedback_record(self, record: Dict):
+        """Upsert a feedback record and swap its rating in the course aggregates"""
+        with self._transaction() as conn:
+            previous = self._get('feedback', record['feedback_id'], conn)
+            self._put('feedback', record, conn)
+            if previous is not None:
+                self._apply_aggregate_delta(conn, previous.get('lecture_id'), 'feedback_rating',
+                                            removed=feedback_rating(previous))
+            self._apply_aggregate_delta(conn, record.get('lecture_id'), 'feedback_rating',
+                                        added=feedback_rating(record))
+
+    def get_feedback(self, lecture_id: Optional[str] = None,
+                    student_id: Optional[str] = None) -> List[Dict]:
+        """Get feedback filtered by lecture or student"""
+        return self._select('feedback', lecture_id=lecture_id, student_id=student_id)
+
+    def get_feedback_ids(self, lecture_id: Optional[str] = None,
+                        course_id: Optional[str] = None) -> List[str]:
+        """Get ids of feedback for a lecture and/or course (served from the feedback indexes)"""
+        filters = {'lecture_id': lecture_id, 'course_id': course_id}
+        clauses = [f"{col} = ?" for col, value in filters.items() if value]
+        if not clauses:
+            return []
+        rows = self._connection().execute(
+            f"SELECT feedback_id FROM feedback WHERE {' AND '.join(clauses)} ORDER BY rowid",
+            [value for value in filters.values() if value]
+        )
+        return [row[0] for row in rows]
+
+    def get_teacher_feedback(self, teacher_id: str) -> List[Dict]:
+        """Get all feedback for a teacher's lectures"""
+        rows = self._connection().execute(
+            "SELECT f.data FROM feedback f "
+            "JOIN lectures l ON l.lecture_id = f.lecture_id "
+            "JOIN courses c ON c.course_id = l.course_id "
+            "WHERE c.teacher_id = ? ORDER BY f.rowid",
+            (teacher_id,)
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def update_teacher_evaluation(self, teacher_id: str, lecture_id: str,
+                                  course_id: str, feedback_id: str,
+                                  ratings: Dict, sentiment: Dict) -> bool:
+        """Update teacher evaluation metrics"""
+        with self._transaction() as conn:
+            teacher_eval = apply_feedback_to_evaluation(
+                self._get('evaluation', teacher_id, conn), teacher_id, lecture_id,
+                course_id, feedback_id, ratings, sentiment
+            )
+            self._put('evaluation', teacher_eval, conn)
+        return True
+
+    def get_teacher_evaluation(self, teacher_id: str) -> Optional[Dict]:
+        """Get teacher evaluation metrics"""
+        return self._get('evaluation', teacher_id)
+
+    # ==================== GRADES ====================
+
+    def save_grade(self, student_id: str, course_id: str,
+                  assessment_type: str, assessment_id: str,
+                  score: float, max_score: float, **kwargs) -> bool:
+        """Save quiz or assignment grade"""
+        if assessment_type not in ('quiz', 'assignment'):
+            return True
+
+        grade_entry = {
+            'course_id': course_id,
+            'assessment_id': assessment_id,
+            'score': score,
+            'max_score': max_score,
+            'percentage': (score / max_score * 100) if max_score > 0 else 0,
+            'timestamp': datetime.utcnow().isoformat(),
+            **kwargs
+        }
+
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO grades (student_id, course_id, assessment_type, data) "
+                "VALUES (?, ?, ?, ?)",
+                (student_id, course_id, assessment_type, self._dumps(grade_entry))
+            )
+            self._changed('grades', [student_id])
+            existing = self._get('course_aggregates', course_id, conn)
+            aggregate = apply_aggregate_delta(existing, course_id,
+                                              f"{assessment_type}_percentage", None,
+                                              grade_entry['percentage'])
+            self._put('course_aggregates', aggregate, conn)
+        return True
+
+    def save_grades_bulk(self, grades: List[Dict]) -> int:
+        """Save many grades (save_grade keyword dicts) in one transaction"""
+        with self.batch():
+            return sum(1 for grade in grades if self.save_grade(**grade))
+
+    def get_student_grades(self, student_id: str) -> Dict:
+        """Get all grades for a student"""
+        grades = {'quizzes': [], 'assignments': []}
+        rows = self._connection().execute(
+            "SELECT assessment_type, data FROM grades WHERE student_id = ? ORDER BY id",
+            (student_id,)
+        )
+        for assessment_type, data in rows:
+            bucket = 'quizzes' if assessment_type == 'quiz' else 'assignments'
+            grades[bucket].append(json.loads(data))
+        return grades
+
+    # ==================== TEACHER EVALUATION ====================
+
+    def save_evaluation(self, teacher_id: str, score: float, features: Dict,
+                       shap_values: Optional[Dict] = None, **kwargs) -> bool:
+        """Save teacher evaluation results"""
+        self._put('evaluation', {
+            'teacher_id': teacher_id,
+            'score': score,
+            'features': features,
+            'shap_values': shap_values or {},
+            'evaluated_at': datetime.utcnow().isoformat(),
+            **kwargs
+        })
+        return True
+
+    def save_evaluations_bulk(self, evaluations: List[Dict]) -> int:
+        """Save many evaluation results (save_evaluation keyword dicts) in one transaction"""
+        with self.batch():
+            return sum(1 for evaluation in evaluations if self.save_evaluation(**evaluation))
+
+    def get_evaluation(self, teacher_id: str) -> Optional[Dict]:
+        """Get teacher evaluation"""
+        return self._get('evaluation', teacher_id)
+
+    def get_all_evaluations(self) -> Dict:
+        """Get all teacher evaluations"""
+        return self._select_keyed('evaluation')
+
+    # ==================== ATTENDANCE ====================
+
+    def save_attendance(self, attendance_id: str, student_id: str, lecture_id: str,
+                       presence_percentage: float, detection_logs: List[Dict],
+                       **kwargs) -> bool:
+        """Save attendance record"""
+        with self._transaction() as conn:
+            previous = self._get('attendance', attendance_id, conn)
+            self._put('attendance', {
+                'attendance_id': attendance_id,
+                'student_id': student_id,
+                'lecture_id': lecture_id,
+                'presence_percentage': presence_percentage,
+                'status': 'present' if presence_percentage >= 75 else 'absent',
+                'detection_logs': detection_logs,
+                'recorded_at': datetime.utcnow().isoformat(),
+                **kwargs
+            }, conn)
+            if previous is not None:
+                self._apply_aggregate_delta(conn, previous.get('lecture_id'),
+                                            'attendance_percentage',
+                                            removed=previous.get('presence_percentage'))
+            self._apply_aggregate_delta(conn, lecture_id, 'attendance_percentage',
+                                        added=presence_percentage)
+        return True
+
+    def get_attendance(self, student_id: Optional[str] = None,
+                      lecture_id: Optional[str] = None,
+                      include_archive: bool = False,
+                      archive_since: Optional[str] = None) -> List[Dict]:
+        """Get attendance records (optionally with archived ones recorded since archive_since)"""
+        records = self._select('attendance', student_id=student_id, lecture_id=lecture_id)
+        if include_archive:
+            return self._with_archive('attendance', records, archive_since,
+                                      student_id=student_id, lecture_id=lecture_id)
+        return records
+
+    # ==================== COURSE AGGREGATES ====================
+
+    def _apply_aggregate_delta(self, conn: sqlite3.Connection, lecture_id: Optional[str],
+                               metric: str, removed: Optional[float] = None,
+                               added: Optional[float] = None):
+        """Apply one value change for a lecture's course (caller holds the transaction)"""
+        lecture = self._get('lectures', lecture_id, conn) if lecture_id else None
+        course_id = lecture.get('course_id') if lecture else None
+        if not course_id or (removed is None and added is None):
+            return
+        self._put('course_aggregates', apply_aggregate_delta(
+            self._get('course_aggregates', course_id, conn), course_id, metric, removed, added
+        ), conn)
+
+    def get_course_aggregates(self, course_id: str) -> Dict:
+        """Get running sums/counts for a course"""
+        return self._get('course_aggregates', course_id) or empty_course_aggregate(course_id)
+
+    def get_teacher_aggregates(self, teacher_id: str) -> Optional[Dict]:
+        """Get a teacher's aggregates folded over their courses (None if no courses)"""
+        courses = self.get_all_courses(teacher_id=teacher_id)
+        if not courses:
+            return None
+        placeholders = ', '.join('?' * len(courses))
+        rows = self._connection().execute(
+            f"SELECT course_id, data FROM course_aggregates WHERE course_id IN ({placeholders})",
+            list(courses)
+        )
+        summary = fold_course_aggregates(courses, {cid: json.loads(data) for cid, data in rows})
+        summary['teacher_id'] = teacher_id
+        return summary
+
+    def rebuild_course_aggregates(self) -> int:
+        """Recompute all course aggregates from the stored records; returns course count"""
+        with self._transaction() as conn:
+            lecture_courses = dict(
+                conn.execute("SELECT lecture_id, course_id FROM lectures").fetchall())
+
+            def records(table: str):
+                for (data,) in conn.execute(f"SELECT data FROM {table}"):
+                    yield json.loads(data)
+
+            def grades():
+                rows = conn.execute("SELECT assessment_type, data FROM grades")
+                for assessment_type, data in rows:
+                    yield assessment_type, json.loads(data)
+
+            # Archived records still count until they expire
+            aggregates = build_course_aggregates(
+                lecture_courses,
+                chain(records('engagement_logs'), self._archived_only('engagement_logs', conn)),
+                records('feedback'), grades(),
+                chain(records('attendance'), self._archived_only('attendance', conn))
+            )
+            conn.execute("DELETE FROM course_aggregates")
+            for aggregate in aggregates.values():
+                self._put('course_aggregates', aggregate, conn)
+            self._changed('course_aggregates', None)
+        return len(aggregates)
+
+    # ==================== TEACHER ACTIVITY ====================
+
+    def log_teacher_activity(self, activity_id: str, teacher_id: str,
+                            action: str, details: Dict, **kwargs) -> bool:
+        """Log teacher activity"""
+        entry = {
+            'activity_id': activity_id,
+            'action': action,
+            'details': details,
+            'timestamp': datetime.utcnow().isoformat(),
+            **kwargs
+        }
+        self._connection().execute(
+            "INSERT INTO teacher_activity (teacher_id, timestamp, data) VALUES (?, ?, ?)",
+            (teacher_id, entry['timestamp'], self._dumps(entry))
+        )
+        self._changed('teacher_activity', [teacher_id])
+        return True
+
+    def get_teacher_activity(self, teacher_id: str,
+                            days: Optional[int] = None,
+                            since: Optional[datetime] = None,
+                            until: Optional[datetime] = None) -> List[Dict]:
+        """Get teacher activity logs, oldest first (see StorageService)"""
+        if since is None and days:
+            since = datetime.utcnow() - timedelta(days=days)
+
+        # ISO timestamps sort lexicographically, so the range uses the index
+        sql = "SELECT data FROM teacher_activity WHERE teacher_id = ?"
+        params = [teacher_id]
+        if since is not None:
+            sql += " AND timestamp >= ?"
+            params.append(since.isoformat())
+        if until is not None:
+            sql += " AND timestamp < ?"
+            params.append(until.isoformat())
+        rows = self._connection().execute(sql + " ORDER BY timestamp, id", params)
+        return [json.loads(row[0]) for row in rows]
+
+    # ==================== PROGRESS TRACKING ====================
+
+    def save_progress(self, student_id: str, course_id: str,
+                     completed_lectures: List[str], quiz_scores: List[float],
+                     engagement_trend: List[float], **kwargs) -> bool:
+        """Save student progress"""
+        entry = {
+            'completed_lectures': completed_lectures,
+            'quiz_scores': quiz_scores,
+            'engagement_trend': engagement_trend,
+            'completion_percentage': (len(completed_lectures)
+                                      / kwargs.get('total_lectures', 1) * 100),
+            'updated_at': datetime.utcnow().isoformat(),
+            **kwargs
+        }
+        self._connection().execute(
+            "INSERT INTO progress (student_id, course_id, data) VALUES (?, ?, ?) "
+            "ON CONFLICT(student_id, course_id) DO UPDATE SET data = excluded.data",
+            (student_id, course_id, self._dumps(entry))
+        )
+        self._changed('progress', [student_id])
+        return True
+
+    def get_progress(self, student_id: str, course_id: Optional[str] = None) -> Dict:
+        """Get student progress"""
+        if course_id:
+            row = self._connection().execute(
+                "SELECT data FROM progress WHERE student_id = ? AND course_id = ?",
+                (student_id, course_id)
+            ).fetchone()
+            return json.loads(row[0]) if row else {}
+
+        rows = self._connection().execute(
+            "SELECT course_id, data FROM progress WHERE student_id = ? ORDER BY rowid",
+            (student_id,)
+        )
+        return {cid: json.loads(data) for cid, data in rows}
+
+    # Enrollment Request Methods
+    def create_enrollment_request(self, request_id: str, student_id: str, course_id: str,
+                                  **kwargs) -> bool:
+        """Create an enrollment request"""
+        self._put('enrollment_requests', {
+            'request_id': request_id,
+            'student_id': student_id,
+            'course_id': course_id,
+            'status': 'pending',  # pending, approved, rejected
+            'requested_at': datetime.utcnow().isoformat(),
+            'processed_at': None,
+            'processed_by': None,
+            **kwargs
+        })
+        return True
+
+    def get_enrollment_requests(self, course_id: Optional[str] = None,
+                                student_id: Optional[str] = None,
+                                status: Optional[str] = None) -> Dict:
+        """Get enrollment requests with optional filters"""
+        return self._select_keyed('enrollment_requests', course_id=course_id,
+                                  student_id=student_id, status=status)
+
+    def update_enrollment_request(self, request_id: str, status: str, processed_by: str) -> bool:
+        """Update enrollment request status"""
+        with self._transaction() as conn:
+            request = self._get('enrollment_requests', request_id, conn)
+            if request is None:
+                return False
+
+            request['status'] = status
+            request['processed_at'] = datetime.utcnow().isoformat()
+            request['processed_by'] = processed_by
+            self._put('enrollment_requests', request, conn)
+
+            # If approved, add student to course
+            if status == 'approved':
+                course = self._get('courses', request['course_id'], conn)
+                if course is not None:
+                    enrolled_students = course.get('enrolled_students', [])
+                    if request['student_id'] not in enrolled_students:
+                        enrolled_students.append(request['student_id'])
+                        course['enrolled_students'] = enrolled_students
+                        course['updated_at'] = datetime.utcnow().isoformat()
+                        self._put('courses', course, conn)
+
+        return True
+
+    # ==================== CHANGE FEED ====================
+
+    def get_collection_version(self, collection: str) -> int:
+        """Get a collection's version: it increases with every committed write"""
+        return self.changes.version(collection)
+
+    def get_collection_versions(self, *collections: str) -> tuple:
+        """Get the versions of several collections, e.g. as a cache key for a derived view"""
+        return tuple(self.changes.version(collection) for collection in collections)
+
+    def get_changes(self, collection: str, since_version: int) -> tuple:
+        """
+        Get (current version, ids of records changed after since_version).
+        The ids are None when they are no longer known: reload the collection.
+        """
+        return self.changes.changes_since(collection, since_version)
+
+    def iter_changes(self, collection: str, since_version: int):
+        """Iterate over (version, changed ids) committed after since_version (see get_changes)"""
+        return self.changes.iter_changes(collection, since_version)
+
+    def subscribe(self, *collections: str) -> ChangeSubscription:
+        """Follow collections from their current versions; poll() returns what changed since"""
+        return self.changes.subscribe(*collections)
+
+    # ==================== ARCHIVE TIER ====================
+
+    def _hot_ids(self, table: str, conn: Optional[sqlite3.Connection] = None) -> set:
+        """Record ids still in the hot table"""
+        key, _ = KEYED_TABLES[table]
+        conn = conn or self._connection()
+        return {row[0] for row in conn.execute(f"SELECT {key} FROM {table}")}
+
+    def _with_archive(self, table: str, hot_records: List[Dict], since: Optional[str] = None,
+                      **filters) -> List[Dict]:
+        """Hot records plus matching archived ones (a hot copy shadows its archived one)"""
+        key = ARCHIVED_COLLECTIONS[table][0]
+        hot_ids = {record[key] for record in hot_records}
+        archived = self.query_archive(table, since=since, **filters)
+        return hot_records + [record for record in archived if record[key] not in hot_ids]
+
+    def _archived_only(self, table: str, conn: Optional[sqlite3.Connection] = None) -> List[Dict]:
+        """Archived records that are not also still hot (left by an interrupted run)"""
+        key = ARCHIVED_COLLECTIONS[table][0]
+        hot_ids = self._hot_ids(table, conn)
+        return [record for record in self.query_archive(table) if record[key] not in hot_ids]
+
+    def archive_records(self, collection: str, before: str) -> int:
+        """
+        Move records with a timestamp before `before` (naive-UTC ISO) from the
+        hot table into archive segments; returns the number moved. Segments
+        are written before the rows are deleted, so an interruption leaves a
+        duplicate (the hot copy wins), never a loss.
+        """
+        key, timestamp_field, _, _ = ARCHIVED_COLLECTIONS[collection]
+        with self._transaction() as conn:
+            old = [record for record in (json.loads(data) for (data,) in
+                                         conn.execute(f"SELECT data FROM {collection}"))
+                   if (record.get(timestamp_field) or before) < before]
+            if not old:
+                return 0
+            self.archive.append(collection, old, timestamp_field)
+
+            ids = [record[key] for record in old]
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                conn.execute(f"DELETE FROM {collection} WHERE {key} IN ({placeholders})", chunk)
+            self._changed(collection, ids)
+        return len(old)
+
+    def anonymize_archived(self, collection: str, before: str) -> int:
+        """Anonymize archived months that ended before `before`; returns records anonymized"""
+        return self.archive.anonymize_before(collection, to_epoch(before))
+
+    def expire_archived(self, collection: str, before: str) -> int:
+        """Delete archived months that ended before `before` and drop them from course aggregates"""
+        key, _, metric, value_field = ARCHIVED_COLLECTIONS[collection]
+        removed = self.archive.expire_before(collection, to_epoch(before))
+        if removed:
+            with self._transaction() as conn:
+                hot_ids = self._hot_ids(collection, conn)
+                for record in removed:
+                    if record[key] not in hot_ids:
+                        self._apply_aggregate_delta(conn, record.get('lecture_id'), metric,
+                                                    removed=record.get(value_field))
+        return len(removed)
+
+    def query_archive(self, collection: str, since: Optional[str] = None,
+                      until: Optional[str] = None, **filters) -> List[Dict]:
+        """
+        Get archived records with since <= timestamp < until matching the
+        field filters. Anonymized records no longer match a student_id.
+        """
+        key, timestamp_field, _, _ = ARCHIVED_COLLECTIONS[collection]
+        return self.archive.query(collection, key, timestamp_field, since, until, **filters)
+
+    # ==================== MIGRATION ====================
+
+    def migrate_from_json(self, storage_paths: Optional[Dict] = None) -> Dict[str, int]:
+        """
+        One-shot import of the JSON storage files into SQLite.
+        Safe to re-run: existing rows are overwritten by key.
+
+        Returns:
+            Dictionary mapping collection name to number of rows imported
+        """
+        storage_paths = storage_paths or self.storage_paths
+
+        shards_dir = f"{storage_paths['base_path']}/courses"
+
+        def load_file(path: Optional[str]) -> Dict:
+            if not path or not os.path.exists(path):
+                return {}
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        def load(name: str) -> Dict:
+            # Collections may also be split into per-course shards
+            parts = [load_file(storage_paths.get(name))]
+            if name in SHARDED_COLLECTIONS:
+                parts += [load_file(path) for path in shard_files(shards_dir, name)]
+            return merge_collection_parts(name, parts)
+
+        def load_engagement_logs() -> Dict:
+            # The JSON backend keeps sessions in append-only segment logs
+            log_dir = storage_paths.get('engagement_logs_dir',
+                                        f"{storage_paths['base_path']}/engagement_logs")
+            log_dirs = [log_dir] + shard_log_dirs(shards_dir)
+            log_dirs = [d for d in log_dirs
+                        if os.path.exists(os.path.join(d, EngagementLogStore.INDEX_FILE))]
+            if log_dirs:
+                return {r['log_id']: r for d in log_dirs for r in EngagementLogStore(d).iter_all()}
+            return load('engagement_logs')
+
+        def load_teacher_activity() -> Dict:
+            # The JSON backend partitions activity per teacher per month
+            activity_dir = storage_paths.get('teacher_activity_dir',
+                                             f"{storage_paths['base_path']}/teacher_activity")
+            if os.path.isdir(activity_dir):
+                activities = {}
+                for teacher_id, entry in TeacherActivityStore(activity_dir).iter_all():
+                    activities.setdefault(teacher_id, []).append(entry)
+                if activities:
+                    return activities
+            return load('teacher_activity')
+
+        counts = {}
+        with self._transaction() as conn:
+            for table, (key, _) in KEYED_TABLES.items():
+                records = load_engagement_logs() if table == 'engagement_logs' else load(table)
+                for key_value, record in records.items():
+                    record.setdefault(key, key_value)
+                    self._put(table, record, conn)
+                counts[table] = len(records)
+
+            # Grades: {student_id: {'quizzes': [...], 'assignments': [...]}}
+            conn.execute("DELETE FROM grades")
+            count = 0
+            for student_id, student_grades in load('grades').items():
+                for bucket, assessment_type in (('quizzes', 'quiz'), ('assignments', 'assignment')):
+                    for entry in student_grades.get(bucket, []):
+                        conn.execute(
+                            "INSERT INTO grades (student_id, course_id, assessment_type, data) "
+                            "VALUES (?, ?, ?, ?)",
+                            (student_id, entry.get('course_id'), assessment_type,
+                             self._dumps(entry))
+                        )
+                        count += 1
+            counts['grades'] = count
+
+            # Teacher activity: {teacher_id: [entries]}
+            conn.execute("DELETE FROM teacher_activity")
+            count = 0
+            for teacher_id, entries in load_teacher_activity().items():
+                for entry in entries:
+                    conn.execute(
+                        "INSERT INTO teacher_activity (teacher_id, timestamp, data) "
+                        "VALUES (?, ?, ?)",
+                        (teacher_id, entry.get('timestamp', ''), self._dumps(entry))
+                    )
+                    count += 1
+            counts['teacher_activity'] = count
+
+            # Progress: {student_id: {course_id: entry}}
+            count = 0
+            for student_id, courses in load('progress').items():
+                for course_id, entry in courses.items():
+                    conn.execute(
+                        "INSERT INTO progress (student_id, course_id, data) VALUES (?, ?, ?) "
+                        "ON CONFLICT(student_id, course_id) DO UPDATE SET data = excluded.data",
+                        (student_id, course_id, self._dumps(entry))
+                    )
+                    count += 1
+            counts['progress'] = count
+
+            for collection in counts:
+                self._changed(collection, None)
+
+        counts['course_aggregates'] = self.rebuild_course_aggregates()
+        return counts
@@ -0,0 +1,226 @@
+"""
+Smart LMS - Teacher Activity Store
+Time-partitioned, append-only storage for teacher activity with range queries
+"""
+
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+from services.file_locks import get_lock_manager
+
+
+def to_epoch(timestamp: str) -> float:
+    """Convert a naive-UTC ISO timestamp (as written by storage) to epoch seconds"""
+    return datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+
+
+def _partition_key(epoch: float) -> str:
+    """Monthly partition name for an epoch timestamp"""
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime('%Y-%m')
+
+
+class _Partition:
+    """Parsed contents of one partition file, kept sorted by timestamp"""
+
+    __slots__ = ('inode', 'offset', 'timestamps', 'records')
+
+    def __init__(self):
+        self.inode = None
+        self.offset = 0
+        self.timestamps: List[float] = []
+        self.records: List[Dict] = []
+
+    def add(self, record: Dict):
+        ts = record['ts']
+        if not self.timestamps or ts >= self.timestamps[-1]:
+            self.timestamps.append(ts)
+            self.records.append(record)
+        else:
+            # Clocks of concurrent writers can be slightly out of order
+            position = bisect_right(self.timestamps, ts)
+            self.timestamps.insert(position, ts)
+            self.records.insert(position, record)
+
+
+class TeacherActivityStore:
+    """
+    Append-only activity log partitioned by teacher and month.
+
+    Layout of the store directory:
+        <teacher_id>/2024-01.jsonl   one JSON record per line, with a
+                                     pre-parsed epoch 'ts' next to the ISO
+                                     'timestamp'
+
+    Logging an activity appends one line to one small file. A range query
+    only opens the partitions overlapping the range and binary-searches
+    the parsed timestamps inside them; the most recently used parsed
+    partitions (at most `max_cached_partitions`, in practice the current
+    months) are cached and tailed incrementally when another process
+    appends to them. Older partitions are re-read when queried.
+    """
+
+    PARTITION_SUFFIX = ".jsonl"
+
+    def __init__(self, directory: str, legacy_json_path: Optional[str] = None,
+                 max_cached_partitions: int = 64):
+        """
+        Args:
+            directory: Directory holding one sub-directory per teacher
+            legacy_json_path: Old teacher_activity.json, imported once if present
+            max_cached_partitions: Parsed partitions kept in memory (LRU)
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._file_locks = get_lock_manager()
+        self.max_cached_partitions = max(1, max_cached_partitions)
+        self._partitions: 'OrderedDict[str, _Partition]' = OrderedDict()
+
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            with self._file_locks.lock(legacy_json_path):
+                if os.path.exists(legacy_json_path):
+                    self._import_legacy_json(legacy_json_path)
+
+    # ==================== PARTITIONS ====================
+
+    def _teacher_dir(self, teacher_id: str) -> Path:
+        return self.directory / quote(str(teacher_id), safe='')
+
+    def _partition_path(self, teacher_id: str, key: str) -> Path:
+        return self._teacher_dir(teacher_id) / f"{key}{self.PARTITION_SUFFIX}"
+
+    def _partition_keys(self, teacher_id: str) -> List[str]:
+        """List a teacher's partition names ('YYYY-MM') in ascending order"""
+        try:
+            names = os.listdir(self._teacher_dir(teacher_id))
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len(self.PARTITION_SUFFIX)] for name in names
+                      if name.endswith(self.PARTITION_SUFFIX))
+
+    def _load_partition(self, path: Path) -> _Partition:
+        """Return the cached partition, reading only lines appended since last time"""
+        key = str(path)
+        partition = self._partitions.get(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._partitions.pop(key, None)
+            return _Partition()
+
+        if partition is None or partition.inode != stat.st_ino or stat.st_size < partition.offset:
+            partition = self._partitions[key] = _Partition()
+            partition.inode = stat.st_ino
+        self._partitions.move_to_end(key)
+        while len(self._partitions) > self.max_cached_partitions:
+            self._partitions.popitem(last=False)
+
+        if stat.st_size > partition.offset:
+            with open(path, 'rb') as f:
+                f.seek(partition.offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Partially written tail; picked up next time
+                    partition.offset += len(line)
+                    try:
+                        record = json.loads(line)
+                        record.setdefault('ts', to_epoch(record['timestamp']))
+                    except (ValueError, TypeError, KeyError):
+                        continue
+                    partition.add(record)
+        return partition
+
+    @staticmethod
+    def _encode(record: Dict) -> bytes:
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        return (line + '\n').encode('utf-8')
+
+    def _write_records(self, teacher_id: str, records: List[Dict]):
+        """Append records to their monthly partitions, one write per partition"""
+        by_partition: Dict[str, List[bytes]] = {}
+        for record in records:
+            by_partition.setdefault(_partition_key(record['ts']), []).append(self._encode(record))
+
+        self._teacher_dir(teacher_id).mkdir(parents=True, exist_ok=True)
+        for key, lines in by_partition.items():
+            path = self._partition_path(teacher_id, key)
+            with self._file_locks.lock(str(path)):
+                with open(path, 'ab') as f:
+                    f.write(b''.join(lines))
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    # ==================== PUBLIC API ====================
+
+    def append(self, teacher_id: str, record: Dict):
+        """Log one activity; 'timestamp' defaults to now (naive UTC ISO)"""
+        record = dict(record)
+        if 'timestamp' not in record:
+            record['timestamp'] = datetime.utcnow().isoformat()
+        record['ts'] = to_epoch(record['timestamp'])
+        self._write_records(teacher_id, [record])
+
+    def query(self, teacher_id: str, since: Optional[float] = None,
+              until: Optional[float] = None) -> List[Dict]:
+        """
+        Get a teacher's activities with since <= ts < until, oldest first.
+
+        Args:
+            teacher_id: Teacher to query
+            since: Start of the range in epoch seconds (None for unbounded)
+            until: End of the range in epoch seconds (None for unbounded)
+        """
+        first = _partition_key(since) if since is not None else None
+        last = _partition_key(until) if until is not None else None
+
+        results = []
+        with self._lock:
+            for key in self._partition_keys(teacher_id):
+                if (first and key < first) or (last and key > last):
+                    continue
+                partition = self._load_partition(self._partition_path(teacher_id, key))
+                start = bisect_left(partition.timestamps, since) if since is not None else 0
+                end = (bisect_left(partition.timestamps, until) if until is not None
+                       else len(partition.timestamps))
+                results.extend(partition.records[start:end])
+        return results
+
+    def teachers(self) -> List[str]:
+        """List teachers that have logged activity"""
+        return [unquote(path.name) for path in self.directory.iterdir() if path.is_dir()]
+
+    def iter_all(self) -> Iterator[Tuple[str, Dict]]:
+        """Iterate over (teacher_id, activity) for every logged activity"""
+        for teacher_id in self.teachers():
+            for record in self.query(teacher_id):
+                yield teacher_id, record
+
+    # ==================== MIGRATION ====================
+
+    def _import_legacy_json(self, legacy_json_path: str):
+        """Import the old whole-file teacher_activity.json once"""
+        try:
+            with open(legacy_json_path, 'r', encoding='utf-8') as f:
+                activities = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+
+        for teacher_id, entries in activities.items():
+            records = []
+            for entry in entries:
+                try:
+                    records.append({**entry, 'ts': to_epoch(entry['timestamp'])})
+                except (ValueError, TypeError, KeyError):
+                    continue
+            if records:
+                self._write_records(teacher_id, records)
+
+        os.replace(legacy_json_path, f"{legacy_json_path}.migrated")
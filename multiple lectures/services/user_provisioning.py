@@ -0,0 +1,186 @@
+"""
+Smart LMS - Bulk User Provisioning
+Parallel bcrypt hashing with a resumable checkpoint and a single storage commit
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import bcrypt
+
+
+def _hash_password(args: Tuple[str, int]) -> str:
+    """Hash one password (runs in a worker process, so keep imports light)"""
+    password, rounds = args
+    salt = bcrypt.gensalt(rounds=rounds)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+
+def _roster_fingerprint(users: List[Dict], rounds: int) -> str:
+    """
+    Digest of every (user_id, password) pair and the work factor.
+
+    Checkpoint entries carry it so a resumed run only reuses hashes made
+    from the same input; a per-row digest would be a fast hash of each
+    password sitting next to its bcrypt hash.
+    """
+    digest = hashlib.sha256(str(rounds).encode('utf-8'))
+    for user in sorted(users, key=lambda user: user['user_id']):
+        digest.update(json.dumps([user['user_id'], user['password']]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class UserProvisioner:
+    """
+    Create many accounts at once.
+
+    Passwords are hashed across a process pool (bcrypt is CPU-bound and
+    holds the GIL) and every finished hash is appended to a checkpoint
+    file, so an interrupted run resumes where it stopped. Entries are
+    tagged with a fingerprint of the roster; if the input changed since the
+    interruption, the stale hashes are ignored and everyone is re-hashed.
+    All accounts are then created in one storage batch and the checkpoint
+    is removed.
+    """
+
+    def __init__(self, storage=None, workers: Optional[int] = None,
+                 rounds: Optional[int] = None, checkpoint_path: Optional[str] = None):
+        """
+        Args:
+            storage: Storage service (defaults to get_storage())
+            workers: Hashing processes (defaults to CPU count)
+            rounds: bcrypt work factor (defaults to AuthService's)
+            checkpoint_path: JSON-lines file of finished hashes for resuming
+        """
+        if storage is None:
+            from services.storage import get_storage
+            storage = get_storage()
+        if rounds is None:
+            from services.auth import BCRYPT_ROUNDS
+            rounds = BCRYPT_ROUNDS
+
+        self.storage = storage
+        self.workers = workers or os.cpu_count() or 1
+        self.rounds = rounds
+        self.checkpoint_path = checkpoint_path
+
+    # ==================== CHECKPOINT ====================
+
+    def _load_checkpoint(self, fingerprint: str) -> Dict[str, str]:
+        """Read {user_id: password_hash} saved by an interrupted run on the same roster"""
+        hashes = {}
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return hashes
+
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    if entry.get('roster') == fingerprint:
+                        hashes[entry['user_id']] = entry['password_hash']
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    continue  # Torn last line from the interruption
+        return hashes
+
+    def _open_checkpoint(self, fresh: bool):
+        """Open the checkpoint (owner read/write only: it holds hashes)"""
+        if not self.checkpoint_path:
+            return None
+        # A checkpoint with nothing reusable is from another roster: start it over
+        mode = os.O_TRUNC if fresh else os.O_APPEND
+        fd = os.open(self.checkpoint_path, os.O_WRONLY | os.O_CREAT | mode, 0o600)
+        return os.fdopen(fd, 'a', encoding='utf-8')
+
+    # ==================== PROVISIONING ====================
+
+    def _hash_all(self, pending: List[Dict], hashes: Dict[str, str], fingerprint: str,
+                  progress: Optional[Callable[[int, int], None]], done: int, total: int):
+        """Hash pending users' passwords, recording each one in hashes and the checkpoint"""
+        jobs = [(user['password'], self.rounds) for user in pending]
+        checkpoint = self._open_checkpoint(fresh=not hashes)
+
+        try:
+            if self.workers > 1 and len(jobs) > 1:
+                executor = ProcessPoolExecutor(max_workers=self.workers)
+                chunksize = max(1, len(jobs) // (self.workers * 8))
+                results = executor.map(_hash_password, jobs, chunksize=chunksize)
+            else:
+                executor = None
+                results = map(_hash_password, jobs)
+
+            try:
+                for user, password_hash in zip(pending, results):
+                    hashes[user['user_id']] = password_hash
+                    if checkpoint is not None:
+                        checkpoint.write(json.dumps({
+                            'user_id': user['user_id'],
+                            'password_hash': password_hash,
+                            'roster': fingerprint
+                        }) + '\n')
+                        checkpoint.flush()
+                    done += 1
+                    if progress:
+                        progress(done, total)
+            finally:
+                if executor is not None:
+                    executor.shutdown(cancel_futures=True)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+
+    def provision(self, users: List[Dict],
+                  progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        Hash and create accounts.
+
+        Args:
+            users: create_user keyword dicts with a plaintext 'password'
+                   instead of 'password_hash'
+            progress: Called as progress(done, total) while hashing
+
+        Returns:
+            Counts: total, existing (skipped), resumed, hashed, created
+        """
+        # Accounts that already exist (or repeat in the input) are skipped
+        new_users = []
+        seen_ids, seen_usernames = set(), set()
+        for user in users:
+            if (user['user_id'] in seen_ids or user['username'] in seen_usernames
+                    or self.storage.get_user(user['user_id'])
+                    or self.storage.get_user_by_username(user['username'])):
+                continue
+            seen_ids.add(user['user_id'])
+            seen_usernames.add(user['username'])
+            new_users.append(user)
+
+        fingerprint = _roster_fingerprint(new_users, self.rounds)
+        hashes = self._load_checkpoint(fingerprint)
+        pending = [user for user in new_users if user['user_id'] not in hashes]
+        resumed = len(new_users) - len(pending)
+
+        if progress:
+            progress(resumed, len(new_users))
+        self._hash_all(pending, hashes, fingerprint, progress, resumed, len(new_users))
+
+        records = []
+        for user in new_users:
+            record = {key: value for key, value in user.items() if key != 'password'}
+            record['password_hash'] = hashes[user['user_id']]
+            records.append(record)
+
+        # One storage transaction for every account
+        created = self.storage.create_users_bulk(records)
+
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        return {
+            'total': len(users),
+            'existing': len(users) - len(new_users),
+            'resumed': resumed,
+            'hashed': len(pending),
+            'created': created
+        }